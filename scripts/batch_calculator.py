@@ -1,17 +1,250 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
+import json
 import time
+import heapq
+import shutil
+import hashlib
+import threading
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
 from pathlib import Path
 from loguru import logger
 import argparse
 
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时自适应批次不做内存校正
+    psutil = None
+
 # 添加当前目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 from qlib_indicators import QlibIndicatorsEnhancedCalculator
+from indicator_manifest import ChecksumWriter, OutputManifest
+from indicator_sharding import shard_output_path
+
+
+def _fsync_file(path):
+    """将文件内容刷到磁盘"""
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+class BatchJournal:
+    """
+    批处理检查点
+    
+    工作目录结构:
+        plan.json       本次运行的股票范围（含股票列表哈希）和批次大小
+        journal.jsonl   已完成的批次，每完成一个批次追加一行并 fsync
+        batch_*.arrow   批次结果，先写临时文件、fsync 后原子替换，再写入日志
+    
+    批次只有在结果文件完整落盘并记录到日志之后才算完成，
+    崩溃时写了一半的批次不会被计为完成，恢复时会重新计算。
+    """
+    
+    PLAN_FILE = "plan.json"
+    JOURNAL_FILE = "journal.jsonl"
+    
+    def __init__(self, work_dir):
+        self.work_dir = Path(work_dir)
+        self.plan_path = self.work_dir / self.PLAN_FILE
+        self.journal_path = self.work_dir / self.JOURNAL_FILE
+    
+    @staticmethod
+    def universe_hash(stocks) -> str:
+        return hashlib.sha1("\n".join(stocks).encode("utf-8")).hexdigest()
+    
+    def reset(self):
+        """清空工作目录，开始新的运行"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+    
+    def write_plan(self, stocks, batch_size: int):
+        plan = {
+            "universe_hash": self.universe_hash(stocks),
+            "total_stocks": len(stocks),
+            "batch_size": batch_size,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        tmp_path = self.plan_path.with_name(self.PLAN_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.plan_path)
+    
+    def load_plan(self):
+        try:
+            with open(self.plan_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def completed(self):
+        """已完成的批次（结果文件存在的日志记录）"""
+        entries = []
+        if not self.journal_path.exists():
+            return entries
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 崩溃时未写完的最后一行
+                    continue
+                if (self.work_dir / entry["file"]).exists():
+                    entries.append(entry)
+        return entries
+    
+    def batch_path(self, batch_num: int) -> Path:
+        return self.work_dir / f"batch_{batch_num:05d}.arrow"
+    
+    def record(self, batch_num: int, batch_file: Path, symbols, rows: int):
+        """记录批次完成（追加并 fsync）"""
+        entry = {
+            "batch": batch_num,
+            "file": Path(batch_file).name,
+            "symbols": list(symbols),
+            "rows": rows,
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with open(self.journal_path, "a+b") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # 崩溃时未写完的最后一行没有换行符，先补上换行，避免新记录与其连成一行而无法解析
+                    line = "\n" + line
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def cleanup(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class RSSMonitor:
+    """后台线程定期采样进程RSS，记录区间内的峰值"""
+    
+    def __init__(self, interval: float = 0.1, enabled: bool = True):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process() if enabled and psutil is not None else None
+    
+    def _rss(self) -> int:
+        return self._process.memory_info().rss
+    
+    @staticmethod
+    def current_rss() -> int:
+        """当前进程RSS，未安装psutil时返回0"""
+        return psutil.Process().memory_info().rss if psutil is not None else 0
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+    
+    def __enter__(self):
+        if self._process is not None:
+            self.peak = self._rss()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, self._rss())
+        return False
+
+
+class AdaptiveBatchPlanner:
+    """
+    按内存预算打包批次
+    
+    每只股票的内存开销按数据行数（bin文件大小 / 4字节）估计，按股票顺序贪心装入批次直到达到预算；
+    每个批次结束后用实测RSS峰值（相对运行开始时的RSS）与估计值之比更新校正系数（指数移动平均），
+    下一批次据此自动缩小或放大。
+    
+    批次之间释放的内存通常不会还给操作系统，峰值没有明显超过此前最高水位时
+    说明批次在已保留的内存中完成，实测值只是上界，此时只允许校正系数减小。
+    """
+    
+    # 每行结果的估计内存：约700个指标列（float64），计算中间结果按4倍估计
+    BYTES_PER_ROW = 700 * 8 * 4
+    # 校正系数的平滑因子和取值范围
+    SMOOTHING = 0.5
+    MIN_CORRECTION = 0.05
+    MAX_CORRECTION = 20.0
+    # 峰值超过最高水位的幅度（占预算比例）达到该值才视为有效测量
+    HIGH_WATER_TOLERANCE = 0.1
+    
+    def __init__(self, calculator, budget_bytes: int, max_batch_size: int = None):
+        self.calculator = calculator
+        self.budget_bytes = budget_bytes
+        self.max_batch_size = max_batch_size
+        self.correction = 1.0
+        self._estimates = {}
+        # 预算以运行开始时的进程内存为基准
+        self.baseline_rss = RSSMonitor.current_rss()
+        self.high_water_rss = self.baseline_rss
+    
+    def estimate(self, symbol: str) -> int:
+        """估计单只股票计算时的内存开销（字节）"""
+        if symbol not in self._estimates:
+            sizes = [path.stat().st_size for path in self.calculator._get_bin_files(symbol).values() if path.exists()]
+            rows = min(sizes) // 4 if sizes else 0
+            self._estimates[symbol] = max(rows, 1) * self.BYTES_PER_ROW
+        return self._estimates[symbol]
+    
+    def next_batch(self, remaining) -> list:
+        """从剩余股票中按顺序取出不超过预算的一批（至少一只）"""
+        batch = []
+        used = 0
+        for symbol in remaining:
+            cost = self.estimate(symbol) * self.correction
+            if batch and (used + cost > self.budget_bytes
+                          or (self.max_batch_size and len(batch) >= self.max_batch_size)):
+                break
+            batch.append(symbol)
+            used += cost
+        return batch
+    
+    def iter_batches(self, stocks):
+        """逐批生成；每批在上一批的实测结果反馈之后才确定"""
+        remaining = list(stocks)
+        while remaining:
+            batch = self.next_batch(remaining)
+            remaining = remaining[len(batch):]
+            yield batch
+    
+    def estimate_batch_count(self, stocks) -> int:
+        total = sum(self.estimate(symbol) for symbol in stocks) * self.correction
+        return max(1, int(-(-total // self.budget_bytes))) if stocks else 0
+    
+    def observe(self, batch, peak_rss: int):
+        """根据批次实测的RSS峰值更新校正系数"""
+        estimated = sum(self.estimate(symbol) for symbol in batch)
+        used = peak_rss - self.baseline_rss
+        if estimated <= 0 or peak_rss <= 0 or used <= 0:
+            return
+        ratio = used / estimated
+        new_high = peak_rss > self.high_water_rss + self.HIGH_WATER_TOLERANCE * self.budget_bytes
+        self.high_water_rss = max(self.high_water_rss, peak_rss)
+        if new_high or ratio < self.correction:
+            correction = self.SMOOTHING * ratio + (1 - self.SMOOTHING) * self.correction
+            self.correction = min(self.MAX_CORRECTION, max(self.MIN_CORRECTION, correction))
+        logger.info(f"🧠 批次内存: 估计 {estimated / 1024 ** 2:.0f}MB, 实测峰值 {used / 1024 ** 2:.0f}MB, "
+                    f"校正系数 -> {self.correction:.2f}")
+
 
 class BatchIndicatorCalculator:
     """
@@ -19,31 +252,65 @@ class BatchIndicatorCalculator:
     将大量股票分批处理，避免内存溢出和索引冲突
     """
     
-    def __init__(self, data_dir: str = None, batch_size: int = 20, max_workers: int = 8):
+    # 去重键：同一股票同一日期只保留一行
+    KEY_COLUMNS = ['Symbol', 'Date']
+    
+    # 未指定内存预算时的默认值（无法获取可用内存时）
+    DEFAULT_MEMORY_BUDGET_MB = 2048
+    
+    def __init__(self, data_dir: str = None, batch_size: int = 20, max_workers: int = 8,
+                 adaptive_batch: bool = False, memory_budget_mb: float = None,
+                 shard_index: int = None, num_shards: int = None):
         self.batch_size = batch_size
         self.max_workers = max_workers
+        self.adaptive_batch = adaptive_batch
+        self.memory_budget_mb = memory_budget_mb
         
         # 创建计算器
         if data_dir:
             self.calculator = QlibIndicatorsEnhancedCalculator(
                 data_dir=data_dir,
                 enable_parallel=True,
-                max_workers=max_workers
+                max_workers=max_workers,
+                shard_index=shard_index,
+                num_shards=num_shards
             )
         else:
             self.calculator = QlibIndicatorsEnhancedCalculator(
                 enable_parallel=True,
-                max_workers=max_workers
+                max_workers=max_workers,
+                shard_index=shard_index,
+                num_shards=num_shards
             )
         
-        logger.info(f"批处理配置: 批次大小={batch_size}, 线程数={max_workers}")
+        self.planner = None
+        if adaptive_batch:
+            if memory_budget_mb is None:
+                # 默认使用当前可用内存的一半
+                if psutil is not None:
+                    memory_budget_mb = psutil.virtual_memory().available / 1024 ** 2 / 2
+                else:
+                    memory_budget_mb = self.DEFAULT_MEMORY_BUDGET_MB
+                self.memory_budget_mb = memory_budget_mb
+            if psutil is None:
+                logger.warning("⚠️ 未安装psutil，自适应批次只按文件大小估计，不根据实测内存校正")
+            self.planner = AdaptiveBatchPlanner(self.calculator, int(memory_budget_mb * 1024 ** 2))
+            logger.info(f"批处理配置: 自适应批次 (内存预算={memory_budget_mb:.0f}MB), 线程数={max_workers}")
+        else:
+            logger.info(f"批处理配置: 批次大小={batch_size}, 线程数={max_workers}")
     
-    def get_stock_batches(self, max_stocks: int = None):
-        """将股票分批"""
+    def get_stocks(self, max_stocks: int = None):
+        """获取需要处理的股票列表"""
         stocks = self.calculator.get_available_stocks()
         
         if max_stocks:
             stocks = stocks[:max_stocks]
+        return stocks
+    
+    def get_stock_batches(self, max_stocks: int = None, stocks=None):
+        """将股票分批"""
+        if stocks is None:
+            stocks = self.get_stocks(max_stocks)
         
         # 分批
         batches = []
@@ -84,99 +351,223 @@ class BatchIndicatorCalculator:
             logger.error(f"❌ 批次 {batch_num} 处理失败: {e}")
             return None
     
-    def merge_batch_results(self, batch_results):
-        """安全合并批次结果"""
-        logger.info(f"开始合并 {len(batch_results)} 个批次结果...")
+    @staticmethod
+    def _to_arrow_table(df: pd.DataFrame) -> pa.Table:
+        """转换为Arrow表，无法转换的混合类型列按字符串保存"""
+        try:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            df = df.copy()
+            for col in df.columns:
+                if df[col].dtype == object:
+                    try:
+                        pa.array(df[col])
+                    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            return pa.Table.from_pandas(df, preserve_index=False)
+    
+    def spill_batch(self, result: pd.DataFrame, batch_file: Path) -> Path:
+        """
+        将批次结果写入列式文件（Arrow IPC），每只股票一个 record batch，按股票代码排序
+        先写临时文件并 fsync，再原子替换，保证批次文件要么完整要么不存在
         
-        if not batch_results:
-            logger.error("没有有效的批次结果可以合并")
-            return pd.DataFrame()
+        Returns:
+        --------
+        Path: 批次文件路径
+        """
+        result = result.reset_index(drop=True)
+        result['Symbol'] = result['Symbol'].astype(str)
         
+        batch_file = Path(batch_file)
+        tmp_file = batch_file.with_name(batch_file.name + '.tmp')
+        table = self._to_arrow_table(result)
+        with pa.OSFile(str(tmp_file), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                # 按股票切片写入（零拷贝），合并时可以逐只股票读取
+                for symbol, positions in sorted(result.groupby('Symbol', sort=False).indices.items()):
+                    start, stop = positions.min(), positions.max() + 1
+                    if stop - start == len(positions):
+                        symbol_table = table.slice(start, stop - start)
+                    else:
+                        symbol_table = table.take(pa.array(positions))
+                    writer.write_batch(symbol_table.combine_chunks().to_batches()[0])
+        _fsync_file(tmp_file)
+        os.replace(tmp_file, batch_file)
+        return batch_file
+    
+    def merge_spilled_batches(self, batch_files, output_file: str, symbols=None) -> dict:
+        """
+        流式 k 路归并批次文件并写出CSV，任何时刻只在内存中保留一只股票的数据
+        
+        同一股票出现在多个批次中时按 Symbol+Date 去重（先处理的批次优先）
+        symbols 不为 None 时只输出其中的股票（如恢复时的当前股票范围）
+        
+        Returns:
+        --------
+        dict: {rows, symbols, columns, duplicates}
+        """
+        # 内存映射必须在删除工作目录前关闭（Windows 上无法删除仍被映射的文件）
+        sources = []
         try:
-            # 最安全的逐个合并方式
-            combined_df = None
-            total_rows = 0
+            for path in batch_files:
+                sources.append(pa.memory_map(str(path), 'r'))
+            readers = [pa.ipc.open_file(source) for source in sources]
+            return self._merge_readers(readers, output_file, symbols)
+        finally:
+            for source in sources:
+                source.close()
+    
+    def _merge_readers(self, readers, output_file: str, symbols=None) -> dict:
+        """merge_spilled_batches 的归并过程，readers 为各批次文件的 Arrow 读取器"""
+        # 输出列：多个批次时取所有批次列的并集并排序（与原逐批合并的列顺序一致）
+        if len(readers) > 1:
+            columns = sorted(set().union(*(reader.schema.names for reader in readers)))
+        else:
+            columns = list(readers[0].schema.names)
+        
+        # 堆中元素: (股票代码, 批次序号, record batch 序号)
+        heap = []
+        for file_idx, reader in enumerate(readers):
+            if reader.num_record_batches > 0:
+                symbol = reader.get_batch(0).column(self.KEY_COLUMNS[0])[0].as_py()
+                heap.append((symbol, file_idx, 0))
+        heapq.heapify(heap)
+        
+        stats = {'rows': 0, 'symbols': 0, 'columns': len(columns), 'duplicates': 0}
+        output_path = Path(output_file)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        manifest = OutputManifest(output_path, columns, header_rows=1)
+        manifest.shard = self.calculator.shard_info
+        checksum_writer = ChecksumWriter()
+        
+        with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+            checksum_writer.stream = f
+            checksum_writer.write(pd.DataFrame(columns=columns).to_csv(index=False))
             
-            for i, batch_df in enumerate(batch_results):
-                if batch_df is None or batch_df.empty:
+            while heap:
+                symbol = heap[0][0]
+                parts = []
+                # 取出所有批次中该股票的数据
+                while heap and heap[0][0] == symbol:
+                    _, file_idx, batch_idx = heapq.heappop(heap)
+                    reader = readers[file_idx]
+                    parts.append(reader.get_batch(batch_idx).to_pandas())
+                    if batch_idx + 1 < reader.num_record_batches:
+                        next_symbol = reader.get_batch(batch_idx + 1).column(self.KEY_COLUMNS[0])[0].as_py()
+                        heapq.heappush(heap, (next_symbol, file_idx, batch_idx + 1))
+                if symbols is not None and symbol not in symbols:
                     continue
                 
-                # 彻底清理DataFrame
-                clean_df = batch_df.copy()
-                clean_df = clean_df.reset_index(drop=True)
-                
-                # 确保列名一致
-                if combined_df is not None:
-                    # 统一列结构
-                    all_cols = sorted(set(combined_df.columns) | set(clean_df.columns))
-                    
-                    # 为缺失的列添加NaN
-                    for col in all_cols:
-                        if col not in combined_df.columns:
-                            combined_df[col] = pd.NA
-                        if col not in clean_df.columns:
-                            clean_df[col] = pd.NA
-                    
-                    # 重新排序列
-                    combined_df = combined_df[all_cols]
-                    clean_df = clean_df[all_cols]
+                symbol_df = pd.concat(parts, ignore_index=True, sort=False) if len(parts) > 1 else parts[0]
+                initial_rows = len(symbol_df)
+                symbol_df = symbol_df.drop_duplicates(subset=self.KEY_COLUMNS)
+                stats['duplicates'] += initial_rows - len(symbol_df)
                 
-                if combined_df is None:
-                    combined_df = clean_df
-                else:
-                    # 使用最基本的append方式
-                    combined_df = pd.concat([combined_df, clean_df], ignore_index=True, sort=False)
-                
-                total_rows += len(clean_df)
-                logger.info(f"合并批次 {i+1}: +{len(clean_df)} 行 (总计: {total_rows} 行)")
-            
-            if combined_df is not None and not combined_df.empty:
-                # 去重
-                initial_rows = len(combined_df)
-                combined_df = combined_df.drop_duplicates()
-                final_rows = len(combined_df)
-                
-                if initial_rows != final_rows:
-                    logger.info(f"去重: {initial_rows} -> {final_rows} 行")
-                
-                logger.info(f"✅ 合并完成: {final_rows} 行, {len(combined_df.columns)-1} 个指标")
-                return combined_df
-            else:
-                logger.error("合并后结果为空")
-                return pd.DataFrame()
-                
-        except Exception as e:
-            logger.error(f"合并批次结果失败: {e}")
-            return pd.DataFrame()
+                symbol_df = symbol_df.reindex(columns=columns)
+                checksum_writer.write(symbol_df.to_csv(index=False, header=False))
+                manifest.add_frame(symbol_df)
+                stats['rows'] += len(symbol_df)
+                stats['symbols'] += 1
+        
+        os.replace(tmp_path, output_path)
+        manifest.save(checksum_writer.hexdigest())
+        return stats
     
-    def run_batch_calculation(self, max_stocks: int = None, output_file: str = "batch_indicators.csv"):
-        """运行批处理计算"""
+    def run_batch_calculation(self, max_stocks: int = None, output_file: str = "batch_indicators.csv",
+                              resume: bool = False, work_dir: str = None, keep_batches: bool = False):
+        """
+        运行批处理计算
+        
+        Parameters:
+        -----------
+        max_stocks : int
+            最大股票数量
+        output_file : str
+            输出文件
+        resume : bool
+            是否从检查点恢复，跳过已完成批次中的股票
+        work_dir : str
+            检查点工作目录，默认为 <output>.batches
+        keep_batches : bool
+            完成后是否保留批次文件和检查点
+        """
         logger.info("🚀 开始批处理指标计算")
         logger.info("=" * 60)
         
         start_time = time.time()
         
-        # 获取股票批次
-        batches = self.get_stock_batches(max_stocks)
+        output_path = Path(output_file)
+        journal = BatchJournal(work_dir or output_path.with_name(output_path.name + ".batches"))
+        stocks = self.get_stocks(max_stocks)
         
-        if not batches:
+        # 读取检查点
+        completed = []
+        if resume:
+            plan = journal.load_plan()
+            if plan is None:
+                logger.warning(f"没有找到可恢复的检查点: {journal.work_dir}，重新开始")
+            else:
+                completed = journal.completed()
+                if plan.get("universe_hash") != BatchJournal.universe_hash(stocks):
+                    logger.warning("⚠️ 股票范围与检查点不一致，保留当前范围内已完成的股票，其余股票重新分批")
+        elif journal.journal_path.exists():
+            logger.warning(f"⚠️ 检测到未完成的检查点 {journal.work_dir}，未指定 --resume，将重新开始")
+        
+        if not completed:
+            journal.reset()
+        journal.write_plan(stocks, self.batch_size)
+        
+        done_symbols = {symbol for entry in completed for symbol in entry["symbols"]}
+        remaining = [symbol for symbol in stocks if symbol not in done_symbols]
+        # 不在当前股票范围内的已完成股票不写入结果
+        excluded = done_symbols.difference(stocks)
+        if excluded:
+            logger.info(f"已完成批次中有 {len(excluded)} 只股票不在当前股票范围内，不写入结果")
+        if completed:
+            logger.info(f"♻️ 从检查点恢复: 已完成 {len(completed)} 个批次 ({len(done_symbols)} 只股票)，剩余 {len(remaining)} 只股票")
+        
+        if not remaining and not completed:
             logger.error("没有股票需要处理")
             return False
         
-        # 处理各个批次
-        batch_results = []
-        successful_batches = 0
+        # 获取股票批次（自适应模式下每批根据上一批的实测内存逐批确定）
+        if self.planner is not None:
+            batches = self.planner.iter_batches(remaining)
+            planned_batches = self.planner.estimate_batch_count(remaining)
+            logger.info(f"总股票数: {len(remaining)}, 预计 {planned_batches} 个批次")
+        else:
+            batches = self.get_stock_batches(stocks=remaining)
+            planned_batches = len(batches)
+        
+        # 处理各个批次，完成的批次立即写入批次文件并记录检查点，不在内存中累积
+        batch_files = [journal.work_dir / entry["file"] for entry in completed]
+        successful_batches = len(completed)
+        first_batch_num = max((entry["batch"] for entry in completed), default=0) + 1
+        scheduled = 0
+        total_batches = len(completed) + planned_batches
         
-        for i, batch in enumerate(batches, 1):
+        for i, batch in enumerate(batches, first_batch_num):
+            scheduled += len(batch)
+            if self.planner is not None:
+                # 本批及之前的批次 + 剩余股票按当前校正系数估计的批次数
+                planned_batches = (i - first_batch_num + 1) + self.planner.estimate_batch_count(remaining[scheduled:])
+            total_batches = len(completed) + planned_batches
             try:
-                result = self.process_single_batch(batch, i, len(batches))
+                with RSSMonitor(enabled=self.planner is not None) as monitor:
+                    result = self.process_single_batch(batch, i, first_batch_num + planned_batches - 1)
+                if self.planner is not None:
+                    self.planner.observe(batch, monitor.peak)
                 if result is not None and not result.empty:
-                    batch_results.append(result)
+                    batch_file = self.spill_batch(result, journal.batch_path(i))
+                    journal.record(i, batch_file, batch, len(result))
+                    batch_files.append(batch_file)
                     successful_batches += 1
+                    del result
                     
                     # 显示进度
-                    progress = i / len(batches) * 100
-                    logger.info(f"📊 整体进度: {progress:.1f}% ({i}/{len(batches)} 批次)")
+                    done = len(completed) + (i - first_batch_num + 1)
+                    progress = done / total_batches * 100
+                    logger.info(f"📊 整体进度: {progress:.1f}% ({done}/{total_batches} 批次)")
                     
                 else:
                     logger.warning(f"批次 {i} 无有效结果")
@@ -185,39 +576,43 @@ class BatchIndicatorCalculator:
                 logger.error(f"批次 {i} 处理异常: {e}")
                 continue
         
-        # 合并所有批次结果
-        if batch_results:
-            final_result = self.merge_batch_results(batch_results)
-            
-            if not final_result.empty:
-                # 保存结果
-                try:
-                    output_path = Path(output_file)
-                    final_result.to_csv(output_path, index=False, encoding='utf-8-sig')
-                    
-                    total_time = time.time() - start_time
-                    
-                    logger.info("=" * 60)
-                    logger.info("🎉 批处理完成！")
-                    logger.info(f"✅ 成功批次: {successful_batches}/{len(batches)}")
-                    logger.info(f"📊 总股票数: {final_result['Symbol'].nunique()}")
-                    logger.info(f"📈 总指标数: {len(final_result.columns)-1}")
-                    logger.info(f"📋 总数据行数: {len(final_result)}")
-                    logger.info(f"⏱️ 总耗时: {total_time:.2f} 秒")
-                    logger.info(f"💾 结果保存至: {output_path.absolute()}")
-                    logger.info("=" * 60)
-                    
-                    return True
-                    
-                except Exception as e:
-                    logger.error(f"保存结果失败: {e}")
-                    return False
-            else:
-                logger.error("最终合并结果为空")
-                return False
-        else:
+        # 归并所有批次结果
+        if not batch_files:
             logger.error("没有成功的批次结果")
             return False
+        
+        try:
+            logger.info(f"开始归并 {len(batch_files)} 个批次结果...")
+            stats = self.merge_spilled_batches(batch_files, output_path, symbols=set(stocks) if excluded else None)
+        except Exception as e:
+            logger.error(f"保存结果失败: {e}")
+            return False
+        
+        if stats['rows'] == 0:
+            logger.error("最终合并结果为空")
+            return False
+        
+        if stats['duplicates']:
+            logger.info(f"去重: 删除 {stats['duplicates']} 行重复的 Symbol+Date 记录")
+        
+        if keep_batches:
+            logger.info(f"📁 保留批次文件: {journal.work_dir}")
+        else:
+            journal.cleanup()
+        
+        total_time = time.time() - start_time
+        
+        logger.info("=" * 60)
+        logger.info("🎉 批处理完成！")
+        logger.info(f"✅ 成功批次: {successful_batches}/{total_batches}")
+        logger.info(f"📊 总股票数: {stats['symbols']}")
+        logger.info(f"📈 总指标数: {stats['columns']-1}")
+        logger.info(f"📋 总数据行数: {stats['rows']}")
+        logger.info(f"⏱️ 总耗时: {total_time:.2f} 秒")
+        logger.info(f"💾 结果保存至: {output_path.absolute()}")
+        logger.info("=" * 60)
+        
+        return True
 
 def main():
     """主函数"""
@@ -237,6 +632,15 @@ def main():
   
   # 小批次处理（内存受限环境）
   python batch_calculator.py --batch-size 5 --max-workers 2
+  
+  # 按内存预算自适应分批（根据数据长度估计，并按实测内存校正）
+  python batch_calculator.py --adaptive-batch --memory-budget-mb 4096
+  
+  # 多机分片：每台机器计算一个分片，完成后用 qlib_indicators.py --merge-shards 合并清单
+  python batch_calculator.py --num-shards 4 --shard-index 0 --output batch_indicators.csv
+  
+  # 中断后从检查点继续（跳过已完成的批次）
+  python batch_calculator.py --output batch_indicators.csv --resume
         '''
     )
     
@@ -245,6 +649,13 @@ def main():
     parser.add_argument('--batch-size', type=int, default=20, help='每批处理的股票数量 (默认: 20)')
     parser.add_argument('--max-workers', type=int, default=8, help='最大线程数 (默认: 8)')
     parser.add_argument('--output', default='batch_indicators.csv', help='输出文件名')
+    parser.add_argument('--adaptive-batch', action='store_true', help='按内存预算自适应确定每批股票数')
+    parser.add_argument('--memory-budget-mb', type=float, help='自适应批次的内存预算MB (默认: 可用内存的一半)')
+    parser.add_argument('--shard-index', type=int, help='本机计算的分片序号 (从0开始)')
+    parser.add_argument('--num-shards', type=int, help='分片总数 (按数据量均衡分配股票)')
+    parser.add_argument('--resume', action='store_true', help='从检查点恢复，跳过已完成的批次')
+    parser.add_argument('--work-dir', help='检查点和批次文件目录 (默认: <output>.batches)')
+    parser.add_argument('--keep-batches', action='store_true', help='完成后保留批次文件和检查点')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], 
                        default='INFO', help='日志级别')
     
@@ -263,13 +674,25 @@ def main():
         batch_calc = BatchIndicatorCalculator(
             data_dir=args.data_dir,
             batch_size=args.batch_size,
-            max_workers=args.max_workers
+            max_workers=args.max_workers,
+            adaptive_batch=args.adaptive_batch,
+            memory_budget_mb=args.memory_budget_mb,
+            shard_index=args.shard_index,
+            num_shards=args.num_shards
         )
         
+        # 分片运行时每个分片写自己的输出文件（及清单、检查点目录）
+        output_file = args.output
+        if args.num_shards and args.num_shards > 1:
+            output_file = shard_output_path(args.output, args.shard_index or 0, args.num_shards)
+        
         # 运行计算
         success = batch_calc.run_batch_calculation(
             max_stocks=args.max_stocks,
-            output_file=args.output
+            output_file=output_file,
+            resume=args.resume,
+            work_dir=args.work_dir,
+            keep_batches=args.keep_batches
         )
         
         if success:
@@ -2,23 +2,40 @@
 # Licensed under the MIT License.
 
 from pathlib import Path
+from collections import defaultdict
 from concurrent.futures import ProcessPoolExecutor
 
-import qlib
-from qlib.data import D
-
 import fire
-import datacompy
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from loguru import logger
 
+from dump_bin import DumpManifest
+
+# calendar of the worker processes (int64 ns), set by the pool initializer of CheckBin.check
+_WORKER_CALENDAR = None
+
+
+def _init_worker_calendar(calendar: np.ndarray):
+    global _WORKER_CALENDAR
+    _WORKER_CALENDAR = calendar
+
 
 class CheckBin:
+    """
+    Compare the bins of a dump with its source files
+
+    The bins are memory-mapped and aligned to the calendar with numpy, qlib is not initialized.
+    Values match when ``|bin - source| <= 1e-8 + 1e-5 * |source|``, or both are NaN.
+    """
+
     NOT_IN_FEATURES = "not in features"
     COMPARE_FALSE = "compare False"
     COMPARE_TRUE = "compare True"
     COMPARE_ERROR = "compare error"
+    ABS_TOL = 1e-08
+    REL_TOL = 1e-05
 
     def __init__(
         self,
@@ -54,13 +71,7 @@ class CheckBin:
         """
         self.qlib_dir = Path(qlib_dir).expanduser()
         bin_path_list = list(self.qlib_dir.joinpath("features").iterdir())
-        self.qlib_symbols = sorted(map(lambda x: x.name.lower(), bin_path_list))
-        qlib.init(
-            provider_uri=str(self.qlib_dir.resolve()),
-            mount_path=str(self.qlib_dir.resolve()),
-            auto_mount=False,
-            redis_port=-1,
-        )
+        self.qlib_symbols = set(map(lambda x: x.name.lower(), bin_path_list))
         csv_path = Path(csv_path).expanduser()
         self.csv_files = sorted(csv_path.glob(f"*{file_suffix}") if csv_path.is_dir() else [csv_path])
 
@@ -69,43 +80,78 @@ class CheckBin:
         else:
             check_fields = check_fields.split(",") if isinstance(check_fields, str) else check_fields
         self.check_fields = list(map(lambda x: x.strip(), check_fields))
-        self.qlib_fields = list(map(lambda x: f"${x}", self.check_fields))
         self.max_workers = max_workers
         self.symbol_field_name = symbol_field_name
         self.date_field_name = date_field_name
         self.freq = freq
         self.file_suffix = file_suffix
 
+    def _get_symbol(self, file_path: Path) -> str:
+        return file_path.name[: -len(self.file_suffix)]
+
+    def _read_calendar(self) -> np.ndarray:
+        calendar_path = self.qlib_dir.joinpath("calendars", f"{self.freq}.txt")
+        calendar = pd.read_csv(calendar_path, header=None).loc[:, 0]
+        return pd.to_datetime(calendar).values.astype("datetime64[ns]").astype(np.int64)
+
+    def _read_source(self, file_path: Path) -> pd.DataFrame:
+        columns = {self.date_field_name, *self.check_fields}
+        if self.file_suffix == ".parquet":
+            df = pd.read_parquet(file_path)
+        elif self.file_suffix in (".feather", ".arrow"):
+            df = pd.read_feather(file_path)
+        else:
+            return pd.read_csv(file_path, usecols=lambda x: x in columns)
+        return df.loc[:, [_c for _c in df.columns if _c in columns]]
+
+    @staticmethod
+    def _read_bin(bin_path: Path):
+        """(start index, values) of a bin file, the values are memory-mapped"""
+        data = np.memmap(bin_path, dtype="<f", mode="r")
+        return int(data[0]), data[1:]
+
     def _compare(self, file_path: Path):
-        symbol = file_path.name.strip(self.file_suffix)
+        """(result, {field: (number of mismatches, first mismatch date, number of rows missing in bin)}) of a source file"""
+        symbol = self._get_symbol(file_path)
+        features_dir = self.qlib_dir.joinpath("features", symbol.lower())
         if symbol.lower() not in self.qlib_symbols:
-            return self.NOT_IN_FEATURES
-        # qlib data
-        qlib_df = D.features([symbol], self.qlib_fields, freq=self.freq)
-        qlib_df.rename(columns={_c: _c.strip("$") for _c in qlib_df.columns}, inplace=True)
-        # csv data
-        origin_df = pd.read_csv(file_path)
-        origin_df[self.date_field_name] = pd.to_datetime(origin_df[self.date_field_name])
-        if self.symbol_field_name not in origin_df.columns:
-            origin_df[self.symbol_field_name] = symbol
-        origin_df.set_index([self.symbol_field_name, self.date_field_name], inplace=True)
-        origin_df.index.names = qlib_df.index.names
-        origin_df = origin_df.reindex(qlib_df.index)
+            return self.NOT_IN_FEATURES, {}
+        calendar = _WORKER_CALENDAR
         try:
-            compare = datacompy.Compare(
-                origin_df,
-                qlib_df,
-                on_index=True,
-                abs_tol=1e-08,  # Optional, defaults to 0
-                rel_tol=1e-05,  # Optional, defaults to 0
-                df1_name="Original",  # Optional, defaults to 'df1'
-                df2_name="New",  # Optional, defaults to 'df2'
-            )
-            _r = compare.matches(ignore_extra_columns=True)
-            return self.COMPARE_TRUE if _r else self.COMPARE_FALSE
+            origin_df = self._read_source(file_path)
+            # dump_bin keeps the first row of a date
+            origin_df = origin_df.drop_duplicates(self.date_field_name)
+            dates = pd.to_datetime(origin_df[self.date_field_name]).values.astype("datetime64[ns]").astype(np.int64)
+            index = np.searchsorted(calendar, dates).clip(max=len(calendar) - 1)
+            in_calendar = calendar[index] == dates
+
+            mismatches = {}
+            for field in self.check_fields:
+                bin_path = features_dir.joinpath(f"{field}.{self.freq}.bin")
+                if field not in origin_df.columns or not bin_path.exists():
+                    continue
+                start, values = self._read_bin(bin_path)
+                # source values on the calendar window of the bin, NaN for the missing dates
+                expected = np.full(len(values), np.nan)
+                position = index - start
+                mask = in_calendar & (position >= 0) & (position < len(values))
+                expected[position[mask]] = pd.to_numeric(origin_df[field], errors="coerce").values[mask]
+                _diff = ~np.isclose(values, expected, rtol=self.REL_TOL, atol=self.ABS_TOL, equal_nan=True)
+                # source rows outside the calendar window of the bin, e.g. a truncated bin
+                missing = in_calendar & ~mask
+                if _diff.any() or missing.any():
+                    first_dates = [dates[missing].min()] if missing.any() else []
+                    if _diff.any():
+                        first_dates.append(calendar[start + int(_diff.argmax())])
+                    mismatches[field] = (
+                        int(_diff.sum() + missing.sum()),
+                        str(pd.Timestamp(min(first_dates))),
+                        int(missing.sum()),
+                    )
+            return (self.COMPARE_FALSE if mismatches else self.COMPARE_TRUE), mismatches
         except Exception as e:
             logger.warning(f"{symbol} compare error: {e}")
-            return self.COMPARE_ERROR
+            return self.COMPARE_ERROR, {}
 
     def check(self):
         """Check whether the bin file after ``dump_bin.py`` is executed is consistent with the original csv file data"""
@@ -114,16 +160,32 @@ class CheckBin:
         error_list = []
         not_in_features = []
         compare_false = []
+        # field -> [number of mismatched values, number of symbols, (symbol, first mismatch date), number missing in bin]
+        field_mismatches = defaultdict(lambda: [0, 0, None, 0])
         with tqdm(total=len(self.csv_files)) as p_bar:
-            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-                for file_path, _check_res in zip(self.csv_files, executor.map(self._compare, self.csv_files)):
-                    symbol = file_path.name.strip(self.file_suffix)
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker_calendar, initargs=(self._read_calendar(),)
+            ) as executor:
+                for file_path, (_check_res, _mismatches) in zip(
+                    self.csv_files, executor.map(self._compare, self.csv_files, chunksize=16)
+                ):
+                    symbol = self._get_symbol(file_path)
                     if _check_res == self.NOT_IN_FEATURES:
                         not_in_features.append(symbol)
                     elif _check_res == self.COMPARE_ERROR:
                         error_list.append(symbol)
                     elif _check_res == self.COMPARE_FALSE:
                         compare_false.append(symbol)
+                        for _field, (_count, _date, _missing) in _mismatches.items():
+                            _stat = field_mismatches[_field]
+                            _stat[0] += _count
+                            _stat[1] += 1
+                            if _stat[2] is None or _date < _stat[2][1]:
+                                _stat[2] = (symbol, _date)
+                            _stat[3] += _missing
+                            logger.debug(
+                                f"{symbol} {_field}: {_count} mismatches ({_missing} missing in bin), first at {_date}"
+                            )
                     p_bar.update()
 
         logger.info("end of check......")
@@ -133,10 +195,54 @@ class CheckBin:
             logger.warning(f"not in features: {not_in_features}")
         if compare_false:
             logger.warning(f"compare False: {compare_false}")
+        for _field, (_count, _symbols, (_symbol, _date), _missing) in sorted(field_mismatches.items()):
+            logger.warning(
+                f"{_field}: {_count} mismatches ({_missing} missing in bin) in {_symbols} symbols,"
+                f" first at {_date} ({_symbol})"
+            )
         logger.info(
             f"total {len(self.csv_files)}, {len(error_list)} errors, {len(not_in_features)} not in features, {len(compare_false)} compare false"
         )
 
+    def check_manifest(self):
+        """Check the bin files and the source files against the manifest written by ``dump_bin.py``
+
+        Compares sizes and checksums instead of data, the bins are not loaded.
+        """
+        manifest = DumpManifest.load(self.qlib_dir, self.freq)
+        if not manifest.symbols:
+            logger.warning(f"no manifest of {self.freq} in {self.qlib_dir}, use `check` instead")
+            return
+        logger.info("start check manifest......")
+        result = manifest.verify(
+            self.qlib_dir.joinpath("features"), self.qlib_dir.joinpath("calendars", f"{self.freq}.txt")
+        )
+
+        source_changed = []
+        not_in_manifest = []
+        for file_path in self.csv_files:
+            symbol = self._get_symbol(file_path)
+            entry = manifest.symbols.get(symbol.upper())
+            if entry is None:
+                not_in_manifest.append(symbol)
+            elif entry["source"] is not None and not DumpManifest.same_source(
+                DumpManifest.source_fingerprint(file_path, entry["source"]), entry["source"]
+            ):
+                source_changed.append(symbol)
+
+        logger.info("end of check manifest......")
+        for _name, _files in result.items():
+            if _files:
+                logger.warning(f"{_name} mismatch: {_files}")
+        if not_in_manifest:
+            logger.warning(f"not in manifest: {not_in_manifest}")
+        if source_changed:
+            logger.warning(f"source changed since the dump: {source_changed}")
+        logger.info(
+            f"total {len(manifest.symbols)} symbols, {sum(map(len, result.values()))} mismatched files, "
+            f"{len(not_in_manifest)} not in manifest, {len(source_changed)} source changed"
+        )
+
 
 if __name__ == "__main__":
     fire.Fire(CheckBin)
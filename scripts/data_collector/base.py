@@ -4,10 +4,13 @@
 
 import abc
 import time
+import shutil
 import datetime
+import tempfile
 import importlib
 from pathlib import Path
 from typing import Type, Iterable
+from functools import partial
 from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
@@ -16,6 +19,16 @@ from loguru import logger
 from joblib import Parallel, delayed
 from qlib.utils import code_to_fname
 
+from dump_bin import DumpDataAll, DumpDataUpdate
+
+# normalize object of the worker processes, set by the pool initializer of Normalize
+_WORKER_NORMALIZE = None
+
+
+def _init_worker_normalize(normalize_obj):
+    global _WORKER_NORMALIZE
+    _WORKER_NORMALIZE = normalize_obj
+
 
 class BaseCollector(abc.ABC):
     CACHE_FLAG = "CACHED"
@@ -285,7 +298,18 @@ class Normalize:
             date_field_name=date_field_name, symbol_field_name=symbol_field_name, **kwargs
         )
 
-    def _executor(self, file_path: Path):
+    def __getstate__(self):
+        # the normalize object (e.g. with the old qlib data of YahooNormalize1dExtend) is sent
+        # to the workers once by the pool initializer, not with every file
+        state = self.__dict__.copy()
+        state.pop("_normalize_obj", None)
+        return state
+
+    def _get_normalize_obj(self) -> BaseNormalize:
+        return self.__dict__.get("_normalize_obj", _WORKER_NORMALIZE)
+
+    def _normalize_file(self, file_path: Path) -> [pd.DataFrame, None]:
+        """normalized data of a source file, None if the normalized data is empty"""
         file_path = Path(file_path)
 
         # some symbol_field values such as TRUE, NA are decoded as True(bool), NaN(np.float) by pandas default csv parsing.
@@ -302,22 +326,81 @@ class Normalize:
         )
 
         # NOTE: It has been reported that there may be some problems here, and the specific issues will be dealt with when they are identified.
-        df = self._normalize_obj.normalize(df)
-        if df is not None and not df.empty:
-            if self._end_date is not None:
-                _mask = pd.to_datetime(df[self._date_field_name]) <= pd.Timestamp(self._end_date)
-                df = df[_mask]
-            df.to_csv(self._target_dir.joinpath(file_path.name), index=False)
+        df = self._get_normalize_obj().normalize(df)
+        if df is None or df.empty:
+            return None
+        if self._end_date is not None:
+            _mask = pd.to_datetime(df[self._date_field_name]) <= pd.Timestamp(self._end_date)
+            df = df[_mask]
+        return df
 
-    def normalize(self):
-        logger.info("normalize data......")
+    def _executor(self, file_path: Path):
+        file_path = Path(file_path)
+        df = self._normalize_file(file_path)
+        if df is not None:
+            df.to_csv(self._target_dir.joinpath(file_path.name), index=False)
 
-        with ProcessPoolExecutor(max_workers=self._max_workers) as worker:
-            file_list = list(self._source_dir.glob("*.csv"))
+    def _bin_source_executor(self, file_path: Path, bin_source_dir: Path, keep_csv: bool = False):
+        file_path = Path(file_path)
+        df = self._normalize_file(file_path)
+        if df is None:
+            return
+        if keep_csv:
+            df.to_csv(self._target_dir.joinpath(file_path.name), index=False)
+        if not df.empty:
+            df.reset_index(drop=True).to_feather(bin_source_dir.joinpath(f"{file_path.stem}.feather"))
+
+    def _map_files(self, func, desc: str):
+        logger.info(f"{desc}......")
+        file_list = list(self._source_dir.glob("*.csv"))
+        with ProcessPoolExecutor(
+            max_workers=self._max_workers, initializer=_init_worker_normalize, initargs=(self._normalize_obj,)
+        ) as worker:
             with tqdm(total=len(file_list)) as p_bar:
-                for _ in worker.map(self._executor, file_list):
+                for _ in worker.map(func, file_list):
                     p_bar.update()
 
+    def normalize(self):
+        self._map_files(self._executor, "normalize data")
+
+    def normalize_to_bin(self, qlib_dir: [str, Path], update: bool = False, keep_csv: bool = True, **dump_kwargs):
+        """normalize the source data and dump it to qlib_dir, without writing and re-parsing normalized csv files
+
+        The bins can only be written once the calendar (the union of the dates of all symbols) is known,
+        so the normalized data is handed to the dump as Arrow (feather) files in a temporary directory
+        of target_dir; the dump reads them without text parsing.
+
+        Parameters
+        ----------
+        qlib_dir: str or Path
+            qlib data directory
+        update: bool
+            append to the existing qlib data (DumpDataUpdate), by default False (DumpDataAll)
+        keep_csv: bool
+            also write the normalized csv files to target_dir, by default True;
+            False skips the csv files, for when nothing else reads target_dir
+        dump_kwargs:
+            parameters of DumpDataAll/DumpDataUpdate, e.g. freq, exclude_fields
+        """
+        bin_source_dir = Path(tempfile.mkdtemp(prefix=".bin_source_", dir=self._target_dir))
+        try:
+            self._map_files(
+                partial(self._bin_source_executor, bin_source_dir=bin_source_dir, keep_csv=keep_csv),
+                "normalize data to bin",
+            )
+            dump_kwargs.setdefault("max_workers", self._max_workers)
+            _dump_class = DumpDataUpdate if update else DumpDataAll
+            _dump_class(
+                csv_path=bin_source_dir,
+                qlib_dir=qlib_dir,
+                file_suffix=".feather",
+                date_field_name=self._date_field_name,
+                symbol_field_name=self._symbol_field_name,
+                **dump_kwargs,
+            ).dump()
+        finally:
+            shutil.rmtree(bin_source_dir, ignore_errors=True)
+
 
 class BaseRun(abc.ABC):
     def __init__(self, source_dir=None, normalize_dir=None, max_workers=1, interval="1d"):
@@ -437,3 +520,53 @@ class BaseRun(abc.ABC):
             **kwargs,
         )
         yc.normalize()
+
+    def normalize_data_to_bin(
+        self,
+        qlib_dir: str,
+        update: bool = False,
+        keep_csv: bool = True,
+        date_field_name: str = "date",
+        symbol_field_name: str = "symbol",
+        exclude_fields: str = "symbol,date",
+        **kwargs,
+    ):
+        """normalize data and dump it to bin in one step, the normalized csv files are not re-parsed
+
+        Parameters
+        ----------
+        qlib_dir: str
+            qlib data directory
+        update: bool
+            append to the existing qlib data in qlib_dir (dump_update), by default False (dump_all)
+        keep_csv: bool
+            also write the normalized csv files to normalize_dir, by default True;
+            False skips the csv files, for when nothing else reads normalize_dir
+        date_field_name: str
+            date field name, default date
+        symbol_field_name: str
+            symbol field name, default symbol
+        exclude_fields: str
+            fields not dumped, default "symbol,date"
+
+        Examples
+        ---------
+            $ python collector.py normalize_data_to_bin --source_dir ~/.qlib/instrument_data/source --qlib_dir ~/.qlib/qlib_data/my_data --region CN --interval 1d
+        """
+        _class = getattr(self._cur_module, self.normalize_class_name)
+        yc = Normalize(
+            source_dir=self.source_dir,
+            target_dir=self.normalize_dir,
+            normalize_class=_class,
+            max_workers=self.max_workers,
+            date_field_name=date_field_name,
+            symbol_field_name=symbol_field_name,
+            **kwargs,
+        )
+        yc.normalize_to_bin(
+            qlib_dir,
+            update=update,
+            keep_csv=keep_csv,
+            freq="day" if self.interval == "1d" else self.interval,
+            exclude_fields=exclude_fields,
+        )
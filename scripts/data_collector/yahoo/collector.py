@@ -29,7 +29,6 @@ from qlib.constant import REG_CN as REGION_CN
 CUR_DIR = Path(__file__).resolve().parent
 sys.path.append(str(CUR_DIR.parent.parent))
 
-from dump_bin import DumpDataUpdate
 from data_collector.base import BaseCollector, BaseNormalize, BaseRun, Normalize
 from data_collector.utils import (
     deco_retry,
@@ -873,8 +872,13 @@ class Run(BaseRun):
         ---------
             $ python collector.py normalize_data_1d_extend --old_qlib_dir ~/.qlib/qlib_data/cn_data --source_dir ~/.qlib/stock_data/source --normalize_dir ~/.qlib/stock_data/normalize --region CN --interval 1d
         """
+        self._get_normalize_1d_extend(old_qlib_data_dir, date_field_name, symbol_field_name).normalize()
+
+    def _get_normalize_1d_extend(
+        self, old_qlib_data_dir, date_field_name: str = "date", symbol_field_name: str = "symbol"
+    ) -> Normalize:
         _class = getattr(self._cur_module, f"{self.normalize_class_name}Extend")
-        yc = Normalize(
+        return Normalize(
             source_dir=self.source_dir,
             target_dir=self.normalize_dir,
             normalize_class=_class,
@@ -883,7 +887,6 @@ class Run(BaseRun):
             symbol_field_name=symbol_field_name,
             old_qlib_data_dir=old_qlib_data_dir,
         )
-        yc.normalize()
 
     def download_today_data(
         self,
@@ -941,6 +944,7 @@ class Run(BaseRun):
         check_data_length: int = None,
         delay: float = 1,
         exists_skip: bool = False,
+        keep_normalize_csv: bool = True,
     ):
         """update yahoo data to bin
 
@@ -957,6 +961,9 @@ class Run(BaseRun):
             time.sleep(delay), default 1
         exists_skip: bool
             exists skip, by default False
+        keep_normalize_csv: bool
+            also write the normalized csv files to normalize_dir, by default True;
+            False hands the normalized data to the dump without csv files
         Notes
         -----
             If the data in qlib_data_dir is incomplete, np.nan will be populated to trading_date for the previous trading day
@@ -992,17 +999,14 @@ class Run(BaseRun):
             if self.max_workers is None or self.max_workers <= 1
             else self.max_workers
         )
-        # normalize data
-        self.normalize_data_1d_extend(qlib_data_1d_dir)
-
-        # dump bin
-        _dump = DumpDataUpdate(
-            csv_path=self.normalize_dir,
-            qlib_dir=qlib_data_1d_dir,
+        # normalize data and dump bin
+        self._get_normalize_1d_extend(qlib_data_1d_dir).normalize_to_bin(
+            qlib_data_1d_dir,
+            update=True,
+            keep_csv=keep_normalize_csv,
             exclude_fields="symbol,date",
             max_workers=self.max_workers,
         )
-        _dump.dump()
 
         # parse index
         _region = self.region.lower()
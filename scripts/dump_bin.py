@@ -2,12 +2,17 @@
 # Licensed under the MIT License.
 
 import abc
+import hashlib
+import json
+import os
 import shutil
+import tempfile
 import traceback
+from collections import defaultdict
 from pathlib import Path
-from typing import Iterable, List, Union
+from typing import Dict, Iterable, List, Union
 from functools import partial
-from concurrent.futures import ThreadPoolExecutor, as_completed, ProcessPoolExecutor
+from concurrent.futures import as_completed, ProcessPoolExecutor
 
 import fire
 import numpy as np
@@ -16,6 +21,310 @@ from tqdm import tqdm
 from loguru import logger
 from qlib.utils import fname_to_code, code_to_fname
 
+try:
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.feather as feather
+except ImportError:
+    # without pyarrow, DumpDataAll reads only the date column in the first pass instead of caching parsed files,
+    # and parquet/feather source files are not supported
+    pa_dataset = None
+    feather = None
+
+
+# calendar of the DumpDataUpdate worker processes, set once per process by the pool initializer
+_WORKER_CALENDAR = None
+
+
+def _init_worker_calendar(calendar: np.ndarray):
+    global _WORKER_CALENDAR
+    _WORKER_CALENDAR = calendar
+
+
+def _write_atomic(path: Path, write_func):
+    """write `path` through a temporary file in the same directory and rename it into place"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write_func(str(tmp_path))
+        # the data must be on disk before the rename, otherwise a crash can leave an empty file in place
+        with open(tmp_path, "rb+") as fp:
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class DumpJournal:
+    """
+    Journal of a dump_update run, used to roll back an interrupted update
+
+    Before a bin file is appended to (or created), its size is recorded in the journal and fsynced;
+    the calendar and instruments files are backed up when the journal begins. The update writes
+    features, then the calendar, then the instruments, and finally commits the journal.
+
+    If the process dies before the commit, the next dump finds the journal and rolls back:
+    appended bins are truncated to their recorded sizes, created bins are removed and the calendar
+    and instruments are restored, so the update can simply be run again.
+
+    Layout:
+        <qlib_dir>/.dump_journal/<pid>.jsonl    {"path": <relative bin path>, "size": <size before the dump, -1 if new>}
+        <qlib_dir>/.dump_journal/backup/...     calendar and instruments before the dump
+        <qlib_dir>/.dump_journal/COMMITTED      written once the dump is complete
+    """
+
+    JOURNAL_DIR_NAME = ".dump_journal"
+    BACKUP_DIR_NAME = "backup"
+    BACKUP_LIST_FILE = "backup.json"
+    COMMITTED_FILE = "COMMITTED"
+    NEW_FILE = -1
+
+    def __init__(self, qlib_dir: Union[str, Path]):
+        self.qlib_dir = Path(qlib_dir)
+        self.journal_dir = self.qlib_dir.joinpath(self.JOURNAL_DIR_NAME)
+        self._fp = None
+
+    def __getstate__(self):
+        # each worker process writes its own journal file
+        state = self.__dict__.copy()
+        state["_fp"] = None
+        return state
+
+    @staticmethod
+    def _fsync_write(path: Path, text: str):
+        with path.open("w", encoding="utf-8") as fp:
+            fp.write(text)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def exists(self) -> bool:
+        return self.journal_dir.exists()
+
+    def begin(self, files: Iterable[Path]):
+        """start the journal, backing up `files` (calendar, instruments) so that they can be restored"""
+        backup_dir = self.journal_dir.joinpath(self.BACKUP_DIR_NAME)
+        backup_dir.mkdir(parents=True, exist_ok=True)
+        backups = {}
+        for file_path in files:
+            relative = str(Path(file_path).relative_to(self.qlib_dir))
+            if Path(file_path).exists():
+                backup_path = backup_dir.joinpath(relative)
+                backup_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(file_path, backup_path)
+                backups[relative] = True
+            else:
+                backups[relative] = False
+        self._fsync_write(self.journal_dir.joinpath(self.BACKUP_LIST_FILE), json.dumps(backups))
+
+    def record(self, paths: Iterable[Path]):
+        """record the current sizes of `paths` before they are appended to or created"""
+        if self._fp is None:
+            self._fp = self.journal_dir.joinpath(f"{os.getpid()}.jsonl").open("a", encoding="utf-8")
+        for path in paths:
+            size = path.stat().st_size if path.exists() else self.NEW_FILE
+            self._fp.write(json.dumps({"path": str(path.relative_to(self.qlib_dir)), "size": size}) + "\n")
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+
+    def commit(self):
+        self._fsync_write(self.journal_dir.joinpath(self.COMMITTED_FILE), "")
+        shutil.rmtree(self.journal_dir)
+
+    def rollback(self):
+        sizes = {}
+        for journal_file in self.journal_dir.glob("*.jsonl"):
+            with journal_file.open("r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a torn last line: the bin was not touched yet
+                        continue
+                    sizes[record["path"]] = min(record["size"], sizes.get(record["path"], record["size"]))
+        for relative, size in sizes.items():
+            bin_path = self.qlib_dir.joinpath(relative)
+            if size == self.NEW_FILE:
+                bin_path.unlink(missing_ok=True)
+                # features directory of a new stock
+                if bin_path.parent.exists() and not any(bin_path.parent.iterdir()):
+                    bin_path.parent.rmdir()
+            elif bin_path.exists():
+                with bin_path.open("r+b") as fp:
+                    fp.truncate(size)
+
+        backup_list = self.journal_dir.joinpath(self.BACKUP_LIST_FILE)
+        backups = json.loads(backup_list.read_text(encoding="utf-8")) if backup_list.exists() else {}
+        for relative, existed in backups.items():
+            target = self.qlib_dir.joinpath(relative)
+            if existed:
+                _write_atomic(
+                    target,
+                    partial(shutil.copy2, self.journal_dir.joinpath(self.BACKUP_DIR_NAME, relative)),
+                )
+            else:
+                target.unlink(missing_ok=True)
+        shutil.rmtree(self.journal_dir)
+        logger.warning(f"rolled back the interrupted dump: {len(sizes)} bin files, {len(backups)} meta files")
+
+    def recover(self):
+        """finish a committed journal or roll back an interrupted dump"""
+        if not self.exists():
+            return
+        if self.journal_dir.joinpath(self.COMMITTED_FILE).exists():
+            shutil.rmtree(self.journal_dir)
+            return
+        logger.warning(f"found the journal of an interrupted dump in {self.journal_dir}, rolling back......")
+        self.rollback()
+
+
+class DumpManifest:
+    """
+    Checksums of a dump (<qlib_dir>/.dump_manifest.json)
+
+    For every symbol the manifest records the fingerprint of the source file it was dumped from
+    (size, mtime, content hash), the calendar window of its bins and the size and checksum of each bin.
+    dump_all/dump_fix with skip_unchanged=True skip the symbols whose source file and calendar window
+    have not changed, and `CheckBin.check_manifest` verifies a dump by comparing checksums instead of data.
+
+    Layout:
+        {"schema_version": 1, "freqs": {<freq>: {"options": {...}, "calendar": {"count", "checksum"},
+            "symbols": {<SYMBOL>: {"source": {"file", "size", "mtime_ns", "hash"} or None,
+                                   "window": [start, end], "window_checksum": <hash of the calendar window>,
+                                   "bins": {<bin file name>: {"start", "size", "checksum"}}}}}}}
+    """
+
+    FILE_NAME = ".dump_manifest.json"
+    SCHEMA_VERSION = 1
+
+    def __init__(self, qlib_dir: Union[str, Path], freq: str = "day"):
+        self.qlib_dir = Path(qlib_dir)
+        self.freq = freq
+        self.options = {}
+        self.calendar = {}
+        self.symbols = {}
+
+    @property
+    def path(self) -> Path:
+        return self.qlib_dir.joinpath(self.FILE_NAME)
+
+    def _read(self) -> dict:
+        try:
+            with self.path.open("r", encoding="utf-8") as fp:
+                content = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        return content if content.get("schema_version") == self.SCHEMA_VERSION else {}
+
+    @classmethod
+    def load(cls, qlib_dir: Union[str, Path], freq: str = "day") -> "DumpManifest":
+        """the manifest of `freq`, empty if the manifest does not exist"""
+        manifest = cls(qlib_dir, freq)
+        section = manifest._read().get("freqs", {}).get(freq, {})
+        manifest.options = section.get("options", {})
+        manifest.calendar = section.get("calendar", {})
+        manifest.symbols = section.get("symbols", {})
+        return manifest
+
+    def save(self):
+        content = self._read() or {"schema_version": self.SCHEMA_VERSION, "freqs": {}}
+        content["freqs"][self.freq] = {"options": self.options, "calendar": self.calendar, "symbols": self.symbols}
+        _write_atomic(self.path, lambda x: Path(x).write_text(json.dumps(content), encoding="utf-8"))
+
+    @staticmethod
+    def hash_file(file_path: Path, chunk_size: int = 1 << 20) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        with Path(file_path).open("rb") as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @classmethod
+    def source_fingerprint(cls, file_path: Path, previous: dict = None) -> dict:
+        """size, mtime and content hash of a source file; the hash of `previous` is reused if size and mtime match"""
+        stat = Path(file_path).stat()
+        fingerprint = {"file": Path(file_path).name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if previous and all(previous.get(_k) == fingerprint[_k] for _k in ("file", "size", "mtime_ns")):
+            fingerprint["hash"] = previous["hash"]
+        else:
+            fingerprint["hash"] = cls.hash_file(file_path)
+        return fingerprint
+
+    @staticmethod
+    def same_source(fingerprint: dict, previous: dict) -> bool:
+        return bool(fingerprint and previous) and all(
+            fingerprint.get(_k) == previous.get(_k) for _k in ("file", "size", "hash")
+        )
+
+    @staticmethod
+    def window_checksum(calendar: np.ndarray, start: int, end: int) -> Union[str, None]:
+        """hash of calendar[start: end + 1], None if the window is outside the calendar"""
+        if start < 0 or end >= len(calendar) or start > end:
+            return None
+        return hashlib.blake2b(calendar[start : end + 1].tobytes(), digest_size=16).hexdigest()
+
+    @classmethod
+    def bin_info(cls, bin_path: Path) -> dict:
+        with bin_path.open("rb") as fp:
+            start = int(np.frombuffer(fp.read(4), dtype="<f")[0])
+        return {"start": start, "size": bin_path.stat().st_size, "checksum": cls.hash_file(bin_path)}
+
+    @classmethod
+    def symbol_entry(cls, bin_paths: Iterable[Path], calendar: np.ndarray, source: dict = None) -> dict:
+        """manifest entry of the bins of a symbol"""
+        bins = {bin_path.name: cls.bin_info(bin_path) for bin_path in bin_paths if bin_path.exists()}
+        start = min((_b["start"] for _b in bins.values()), default=0)
+        end = max((_b["start"] + _b["size"] // 4 - 2 for _b in bins.values()), default=-1)
+        return {
+            "source": source,
+            "window": [start, end],
+            "window_checksum": cls.window_checksum(calendar, start, end),
+            "bins": bins,
+        }
+
+    @classmethod
+    def is_unchanged(cls, entry: dict, source: dict, calendar: np.ndarray, features_dir: Path) -> bool:
+        """whether the bins of `entry` are still up to date for `source` and `calendar`"""
+        if not entry or not cls.same_source(source, entry.get("source")) or not entry.get("bins"):
+            return False
+        start, end = entry["window"]
+        if (
+            entry.get("window_checksum") is None
+            or cls.window_checksum(calendar, start, end) != entry["window_checksum"]
+        ):
+            return False
+        for name, info in entry["bins"].items():
+            bin_path = features_dir.joinpath(name)
+            if not bin_path.exists() or bin_path.stat().st_size != info["size"]:
+                return False
+        return True
+
+    def calendar_info(self, calendar_path: Path) -> dict:
+        with calendar_path.open("r", encoding="utf-8") as fp:
+            count = sum(1 for _ in fp)
+        return {"count": count, "checksum": self.hash_file(calendar_path)}
+
+    def verify(self, features_dir: Path, calendar_path: Path) -> Dict[str, list]:
+        """compare the bins and the calendar on disk with the manifest
+
+        Returns
+        -------
+            {"calendar": [...], "missing": [...], "size": [...], "checksum": [...]}, lists of mismatched files
+        """
+        result = {"calendar": [], "missing": [], "size": [], "checksum": []}
+        if not calendar_path.exists() or self.calendar_info(calendar_path) != self.calendar:
+            result["calendar"].append(str(calendar_path))
+        for code, entry in self.symbols.items():
+            symbol_dir = features_dir.joinpath(code_to_fname(code).lower())
+            for name, info in entry["bins"].items():
+                bin_path = symbol_dir.joinpath(name)
+                relative = f"{symbol_dir.name}/{name}"
+                if not bin_path.exists():
+                    result["missing"].append(relative)
+                elif bin_path.stat().st_size != info["size"]:
+                    result["size"].append(relative)
+                elif self.hash_file(bin_path) != info["checksum"]:
+                    result["checksum"].append(relative)
+        return result
+
 
 class DumpDataBase:
     INSTRUMENTS_START_FIELD = "start_datetime"
@@ -28,6 +337,8 @@ class DumpDataBase:
     HIGH_FREQ_FORMAT = "%Y-%m-%d %H:%M:%S"
     INSTRUMENTS_SEP = "\t"
     INSTRUMENTS_FILE_NAME = "all.txt"
+    # source file suffix -> pyarrow dataset format
+    COLUMNAR_FORMATS = {".parquet": "parquet", ".feather": "ipc", ".arrow": "ipc"}
 
     UPDATE_MODE = "update"
     ALL_MODE = "all"
@@ -45,6 +356,9 @@ class DumpDataBase:
         exclude_fields: str = "",
         include_fields: str = "",
         limit_nums: int = None,
+        skip_unchanged: bool = False,
+        chunk_size: int = None,
+        manifest: bool = False,
     ):
         """
 
@@ -63,15 +377,26 @@ class DumpDataBase:
         date_field_name: str, default "date"
             the name of the date field in the csv
         file_suffix: str, default ".csv"
-            file suffix
+            file suffix, ".parquet" and ".feather" files are read with pyarrow
         symbol_field_name: str, default "symbol"
             symbol field name
         include_fields: tuple
-            dump fields
+            dump fields, only these columns (and the date/symbol columns) are read from the source files
         exclude_fields: tuple
             fields not dumped
         limit_nums: int
             Use when debugging, default None
+        skip_unchanged: bool, default False
+            dump_all/dump_fix: keep the bins of symbols whose source file and calendar window are unchanged
+            since the last dump (according to <qlib_dir>/.dump_manifest.json)
+        chunk_size: int, default None
+            process the data of a symbol in chunks of chunk_size rows and write the bins chunk by chunk,
+            so that the memory of a worker does not grow with the history length (e.g. years of 1min data).
+            The source rows should be sorted by date, unsorted files are dumped at once. None: no chunks
+        manifest: bool, default False
+            write the checksums of the source files and bins to <qlib_dir>/.dump_manifest.json,
+            this reads every source file and every dumped bin once more. Implied by skip_unchanged,
+            and a manifest that already exists for freq is always kept up to date
         """
         csv_path = Path(csv_path).expanduser()
         if isinstance(exclude_fields, str):
@@ -86,6 +411,8 @@ class DumpDataBase:
         if limit_nums is not None:
             self.csv_files = self.csv_files[: int(limit_nums)]
         self.qlib_dir = Path(qlib_dir).expanduser()
+        # undo an interrupted dump_update before reading or backing up qlib_dir
+        DumpJournal(self.qlib_dir).recover()
         self.backup_dir = backup_dir if backup_dir is None else Path(backup_dir).expanduser()
         if backup_dir is not None:
             self._backup_qlib_dir(Path(backup_dir).expanduser())
@@ -104,6 +431,32 @@ class DumpDataBase:
 
         self._mode = self.ALL_MODE
         self._kwargs = {}
+        # journal of bin appends, only used by dump_update
+        self._journal = None
+        self._skip_unchanged = skip_unchanged
+        self.chunk_size = None if chunk_size is None else max(int(chunk_size), 1)
+        self._manifest = DumpManifest.load(self.qlib_dir, self.freq)
+        # hashing is only paid for when the manifest is used
+        self._write_manifest = bool(manifest or skip_unchanged or self._manifest.symbols)
+
+    # attributes only used by the main process, not pickled with the tasks sent to the process pool
+    _MAIN_PROCESS_ATTRS = ("csv_files", "_calendars_list", "_kwargs", "_manifest")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in self._MAIN_PROCESS_ATTRS:
+            state.pop(key, None)
+        return state
+
+    @property
+    def manifest_options(self) -> dict:
+        """dump options that change the bins; the manifest can only be reused with the same options"""
+        return {
+            "date_field_name": self.date_field_name,
+            "symbol_field_name": self.symbol_field_name,
+            "include_fields": list(self._include_fields),
+            "exclude_fields": sorted(self._exclude_fields),
+        }
 
     def _backup_qlib_dir(self, target_dir: Path):
         shutil.copytree(str(self.qlib_dir.resolve()), str(target_dir.resolve()))
@@ -112,6 +465,23 @@ class DumpDataBase:
         datetime_d = pd.Timestamp(datetime_d)
         return datetime_d.strftime(self.calendar_format)
 
+    def _format_calendar(self, calendar: np.ndarray) -> np.ndarray:
+        """vectorized `_format_datetime` of an int64 calendar array"""
+        values = calendar.view("datetime64[ns]")
+        if self.calendar_format == self.DAILY_FORMAT:
+            return np.datetime_as_string(values, unit="D")
+        if self.calendar_format == self.HIGH_FREQ_FORMAT:
+            return np.char.replace(np.datetime_as_string(values, unit="s"), "T", " ")
+        return pd.DatetimeIndex(values).strftime(self.calendar_format).values.astype(str)
+
+    @staticmethod
+    def _get_date_array(df: pd.DataFrame, date_field_name: str) -> np.ndarray:
+        """sorted unique dates of df as int64 (datetime64[ns]) values, NaT dropped"""
+        if df.empty or date_field_name not in df.columns:
+            return np.array([], dtype=np.int64)
+        dates = np.unique(df[date_field_name].values.astype("datetime64[ns]").view(np.int64))
+        return dates[dates != np.iinfo(np.int64).min]
+
     def _get_date(
         self, file_or_df: [Path, pd.DataFrame], *, is_begin_end: bool = False, as_set: bool = False
     ) -> Iterable[pd.Timestamp]:
@@ -133,12 +503,76 @@ class DumpDataBase:
         else:
             return _calendars.tolist()
 
-    def _get_source_data(self, file_path: Path) -> pd.DataFrame:
-        df = pd.read_csv(str(file_path.resolve()), low_memory=False)
-        df[self.date_field_name] = df[self.date_field_name].astype(str).astype("datetime64[ns]")
+    @property
+    def is_columnar_source(self) -> bool:
+        return self.file_suffix.lower() in self.COLUMNAR_FORMATS
+
+    def _get_source_columns(self, usecols=None):
+        """callable selecting the columns to read from a source file, None to read all columns"""
+        if usecols is not None:
+            return usecols
+        if not self._include_fields:
+            return None
+        _columns = {self.date_field_name, self.symbol_field_name, *self._include_fields}
+        return lambda x: x in _columns
+
+    def _get_columnar_dataset(self, file_path: Path, usecols=None):
+        """pyarrow dataset of a columnar source file and the columns to read"""
+        if pa_dataset is None:
+            raise ImportError(f"reading {self.file_suffix} files requires pyarrow: pip install pyarrow")
+        dataset = pa_dataset.dataset(str(file_path.resolve()), format=self.COLUMNAR_FORMATS[self.file_suffix.lower()])
+        columns = None if usecols is None else [_name for _name in dataset.schema.names if usecols(_name)]
+        return dataset, columns
+
+    def _read_columnar(self, file_path: Path, usecols=None) -> pd.DataFrame:
+        dataset, columns = self._get_columnar_dataset(file_path, usecols)
+        return dataset.to_table(columns=columns).to_pandas(split_blocks=True)
+
+    def _parse_datetime(self, values: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if getattr(values.dt, "tz", None) is not None:
+                values = values.dt.tz_localize(None)
+            return values.astype("datetime64[ns]")
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            try:
+                return pd.to_datetime(values).astype("datetime64[ns]")
+            except (ValueError, TypeError):
+                pass
+        # e.g. integer dates such as 20200102
+        return values.astype(str).astype("datetime64[ns]")
+
+    def _get_source_data(self, file_path: Path, usecols=None) -> pd.DataFrame:
+        usecols = self._get_source_columns(usecols)
+        if self.is_columnar_source:
+            df = self._read_columnar(file_path, usecols)
+        else:
+            df = pd.read_csv(str(file_path.resolve()), low_memory=False, usecols=usecols)
+        df[self.date_field_name] = self._parse_datetime(df[self.date_field_name])
         # df.drop_duplicates([self.date_field_name], inplace=True)
         return df
 
+    def _iter_source_data(self, file_or_data: [Path, pd.DataFrame], usecols=None) -> Iterable[pd.DataFrame]:
+        """source data in chunks of `chunk_size` rows"""
+        if isinstance(file_or_data, pd.DataFrame):
+            for _start in range(0, len(file_or_data), self.chunk_size):
+                yield file_or_data.iloc[_start : _start + self.chunk_size]
+            return
+        usecols = self._get_source_columns(usecols)
+        if self.is_columnar_source:
+            dataset, columns = self._get_columnar_dataset(file_or_data, usecols)
+            chunks = (
+                _batch.to_pandas()
+                for _batch in dataset.to_batches(columns=columns, batch_size=self.chunk_size)
+                if _batch.num_rows
+            )
+        else:
+            chunks = pd.read_csv(
+                str(file_or_data.resolve()), low_memory=False, usecols=usecols, chunksize=self.chunk_size
+            )
+        for df in chunks:
+            df[self.date_field_name] = self._parse_datetime(df[self.date_field_name])
+            yield df
+
     def get_symbol_from_file(self, file_path: Path) -> str:
         return fname_to_code(file_path.name[: -len(self.file_suffix)].strip().lower())
 
@@ -171,11 +605,12 @@ class DumpDataBase:
 
         return df
 
-    def save_calendars(self, calendars_data: list):
+    def save_calendars(self, calendars_data: Union[list, np.ndarray]):
         self._calendars_dir.mkdir(parents=True, exist_ok=True)
         calendars_path = str(self._calendars_dir.joinpath(f"{self.freq}.txt").expanduser().resolve())
-        result_calendars_list = [self._format_datetime(x) for x in calendars_data]
-        np.savetxt(calendars_path, result_calendars_list, fmt="%s", encoding="utf-8")
+        result_calendars_list = self._format_calendar(self.get_calendar_array(calendars_data))
+        content = "\n".join(result_calendars_list) + "\n" if len(result_calendars_list) else ""
+        _write_atomic(Path(calendars_path), lambda x: Path(x).write_text(content, encoding="utf-8"))
 
     def save_instruments(self, instruments_data: Union[list, pd.DataFrame]):
         self._instruments_dir.mkdir(parents=True, exist_ok=True)
@@ -186,35 +621,66 @@ class DumpDataBase:
             instruments_data[self.symbol_field_name] = instruments_data[self.symbol_field_name].apply(
                 lambda x: fname_to_code(x.lower()).upper()
             )
-            instruments_data.to_csv(instruments_path, header=False, sep=self.INSTRUMENTS_SEP, index=False)
+            _write_atomic(
+                Path(instruments_path),
+                lambda x: instruments_data.to_csv(x, header=False, sep=self.INSTRUMENTS_SEP, index=False),
+            )
         else:
-            np.savetxt(instruments_path, instruments_data, fmt="%s", encoding="utf-8")
-
-    def data_merge_calendar(self, df: pd.DataFrame, calendars_list: List[pd.Timestamp]) -> pd.DataFrame:
-        # calendars
-        calendars_df = pd.DataFrame(data=calendars_list, columns=[self.date_field_name])
-        calendars_df[self.date_field_name] = calendars_df[self.date_field_name].astype("datetime64[ns]")
-        cal_df = calendars_df[
-            (calendars_df[self.date_field_name] >= df[self.date_field_name].min())
-            & (calendars_df[self.date_field_name] <= df[self.date_field_name].max())
-        ]
-        # align index
-        cal_df.set_index(self.date_field_name, inplace=True)
-        df.set_index(self.date_field_name, inplace=True)
-        r_df = df.reindex(cal_df.index)
-        return r_df
+            _write_atomic(Path(instruments_path), lambda x: np.savetxt(x, instruments_data, fmt="%s", encoding="utf-8"))
 
     @staticmethod
-    def get_datetime_index(df: pd.DataFrame, calendar_list: List[pd.Timestamp]) -> int:
-        return calendar_list.index(df.index.min())
+    def get_calendar_array(calendar_list: Union[List[pd.Timestamp], np.ndarray]) -> np.ndarray:
+        """sorted calendar as an int64 array of datetime64[ns] values
+
+        Build it once and pass it to the workers instead of the list of Timestamps:
+        positions are looked up with `np.searchsorted` and the array pickles as a single buffer.
+        """
+        if isinstance(calendar_list, np.ndarray) and calendar_list.dtype == np.int64:
+            return calendar_list
+        if len(calendar_list) == 0:
+            return np.array([], dtype=np.int64)
+        return pd.to_datetime(pd.Series(calendar_list, dtype=object)).values.astype("datetime64[ns]").view(np.int64)
+
+    def data_merge_calendar(
+        self, df: pd.DataFrame, calendars_list: Union[List[pd.Timestamp], np.ndarray]
+    ) -> pd.DataFrame:
+        calendar = self.get_calendar_array(calendars_list)
+        dates = df[self.date_field_name].values.astype("datetime64[ns]").view(np.int64)
+        # calendars between the first and last date of df
+        start = np.searchsorted(calendar, dates.min(), side="left")
+        end = np.searchsorted(calendar, dates.max(), side="right")
+        cal = calendar[start:end]
+        # align index: scatter the rows into their calendar positions, dates not in the calendar are dropped
+        pos = np.searchsorted(cal, dates)
+        matched = pos < len(cal)
+        matched[matched] = cal[pos[matched]] == dates[matched]
+        pos = pos[matched]
+
+        data = {}
+        for column in df.columns.drop(self.date_field_name):
+            values = df[column].values
+            if np.issubdtype(values.dtype, np.number):
+                aligned = np.full(len(cal), np.nan, dtype=np.float64)
+            else:
+                aligned = np.full(len(cal), np.nan, dtype=object)
+            aligned[pos] = values[matched]
+            data[column] = aligned
+        index = pd.DatetimeIndex(cal.view("datetime64[ns]"), name=self.date_field_name)
+        return pd.DataFrame(data, index=index, columns=df.columns.drop(self.date_field_name))
 
-    def _data_to_bin(self, df: pd.DataFrame, calendar_list: List[pd.Timestamp], features_dir: Path):
+    @staticmethod
+    def get_datetime_index(df: pd.DataFrame, calendar_list: Union[List[pd.Timestamp], np.ndarray]) -> int:
+        calendar = DumpDataBase.get_calendar_array(calendar_list)
+        return int(np.searchsorted(calendar, pd.Timestamp(df.index.min()).value))
+
+    def _data_to_bin(self, df: pd.DataFrame, calendar_list: Union[List[pd.Timestamp], np.ndarray], features_dir: Path):
         if df.empty:
             logger.warning(f"{features_dir.name} data is None or empty")
             return
-        if not calendar_list:
+        if len(calendar_list) == 0:
             logger.warning("calendar_list is empty")
             return
+        calendar_list = self.get_calendar_array(calendar_list)
         # align index
         _df = self.data_merge_calendar(df, calendar_list)
         if _df.empty:
@@ -222,20 +688,109 @@ class DumpDataBase:
             return
         # used when creating a bin file
         date_index = self.get_datetime_index(_df, calendar_list)
-        for field in self.get_dump_fields(_df.columns):
-            bin_path = features_dir.joinpath(f"{field.lower()}.{self.freq}{self.DUMP_FILE_SUFFIX}")
-            if field not in _df.columns:
-                continue
+        bin_paths = {
+            field: features_dir.joinpath(f"{field.lower()}.{self.freq}{self.DUMP_FILE_SUFFIX}")
+            for field in self.get_dump_fields(_df.columns)
+            if field in _df.columns
+        }
+        if self._journal is not None:
+            self._journal.record(bin_paths.values())
+        self._write_bins(_df, bin_paths, date_index)
+        return list(bin_paths.values())
+
+    def _write_bins(self, _df: pd.DataFrame, bin_paths: Dict[str, Path], date_index: int):
+        for field, bin_path in bin_paths.items():
             if bin_path.exists() and self._mode == self.UPDATE_MODE:
                 # update
                 with bin_path.open("ab") as fp:
-                    np.array(_df[field]).astype("<f").tofile(fp)
+                    self._align_to_bin_end(bin_path, np.array(_df[field]), date_index).astype("<f").tofile(fp)
             else:
                 # append; self._mode == self.ALL_MODE or not bin_path.exists()
-                np.hstack([date_index, _df[field]]).astype("<f").tofile(str(bin_path.resolve()))
+                data = np.hstack([date_index, _df[field]]).astype("<f")
+                _write_atomic(bin_path.resolve(), data.tofile)
+
+    def _data_chunks_to_bin(
+        self, chunks: Iterable[pd.DataFrame], calendar_list: Union[List[pd.Timestamp], np.ndarray], features_dir: Path
+    ) -> Union[List[Path], None]:
+        """write the bins chunk by chunk, returns None if the chunks are not in date order
 
-    def _dump_bin(self, file_or_data: [Path, pd.DataFrame], calendar_list: List[pd.Timestamp]):
-        if not calendar_list:
+        The first chunk creates the bins (in temporary files that replace the bins at the end, or
+        the existing bins when updating), the next chunks are appended with `_align_to_bin_end`.
+        """
+        calendar = self.get_calendar_array(calendar_list)
+        bin_paths = {}
+        # bin path -> file written to
+        targets = {}
+        last_date = None
+        try:
+            for df in chunks:
+                dates = df[self.date_field_name].values.astype("datetime64[ns]").view(np.int64)
+                if len(dates) == 0:
+                    continue
+                if dates.min() == np.iinfo(np.int64).min or (last_date is not None and dates.min() < last_date):
+                    # NaT or unsorted dates, the symbol can not be written chunk by chunk
+                    return None
+                # keep the first row of a date, as `_dump_bin` does
+                keep = ~df[self.date_field_name].duplicated().values
+                if last_date is not None:
+                    keep &= dates != last_date
+                df = df[keep]
+                last_date = dates.max()
+                _df = self.data_merge_calendar(df, calendar) if not df.empty else df
+                if _df.empty:
+                    continue
+                date_index = self.get_datetime_index(_df, calendar)
+                if not bin_paths:
+                    features_dir.mkdir(parents=True, exist_ok=True)
+                    bin_paths = {
+                        field: features_dir.joinpath(f"{field.lower()}.{self.freq}{self.DUMP_FILE_SUFFIX}")
+                        for field in self.get_dump_fields(_df.columns)
+                        if field in _df.columns
+                    }
+                    if self._journal is not None:
+                        self._journal.record(bin_paths.values())
+                    for field, bin_path in bin_paths.items():
+                        if bin_path.exists() and self._mode == self.UPDATE_MODE:
+                            targets[bin_path] = bin_path
+                            values = self._align_to_bin_end(bin_path, np.array(_df[field]), date_index)
+                            with bin_path.open("ab") as fp:
+                                values.astype("<f").tofile(fp)
+                        else:
+                            targets[bin_path] = bin_path.with_name(f"{bin_path.name}.{os.getpid()}.tmp")
+                            np.hstack([date_index, _df[field]]).astype("<f").tofile(str(targets[bin_path]))
+                    continue
+                for field, bin_path in bin_paths.items():
+                    values = self._align_to_bin_end(targets[bin_path], np.array(_df[field]), date_index)
+                    with targets[bin_path].open("ab") as fp:
+                        values.astype("<f").tofile(fp)
+            for bin_path, target in targets.items():
+                if target != bin_path:
+                    os.replace(target, bin_path)
+            targets = {}
+        finally:
+            for bin_path, target in targets.items():
+                if target != bin_path and target.exists():
+                    target.unlink()
+        if not bin_paths:
+            logger.warning(f"{features_dir.name} data is None or empty")
+        return list(bin_paths.values())
+
+    @staticmethod
+    def _align_to_bin_end(bin_path: Path, values: np.ndarray, date_index: int) -> np.ndarray:
+        """values starting at calendar position `date_index`, re-aligned to start right after the last value of bin_path
+
+        Calendar days between the end of the bin file and the first new value are filled with NaN,
+        values that are already in the bin file are dropped.
+        """
+        with bin_path.open("rb") as fp:
+            start_index = int(np.frombuffer(fp.read(4), dtype="<f")[0])
+        next_index = start_index + bin_path.stat().st_size // 4 - 1
+        if next_index >= date_index:
+            return values[next_index - date_index :]
+        return np.concatenate([np.full(date_index - next_index, np.nan), values])
+
+    def _dump_bin(self, file_or_data: [Path, pd.DataFrame], calendar_list: Union[List[pd.Timestamp], np.ndarray]):
+        if len(calendar_list) == 0:
             logger.warning("calendar_list is empty")
             return
         if isinstance(file_or_data, pd.DataFrame):
@@ -245,9 +800,23 @@ class DumpDataBase:
             df = file_or_data
         elif isinstance(file_or_data, Path):
             code = self.get_symbol_from_file(file_or_data)
-            df = self._get_source_data(file_or_data)
+            df = None if self.chunk_size else self._get_source_data(file_or_data)
         else:
             raise ValueError(f"not support {type(file_or_data)}")
+        # features save dir
+        features_dir = self._features_dir.joinpath(code_to_fname(code).lower())
+        if self.chunk_size and (df is None or df[self.date_field_name].notna().all()):
+            if df is not None:
+                # a stable sort keeps the first row of a date first
+                df = df.sort_values(self.date_field_name, kind="stable")
+            bin_paths = self._data_chunks_to_bin(
+                self._iter_source_data(file_or_data if df is None else df), calendar_list, features_dir
+            )
+            if bin_paths is not None:
+                return bin_paths
+            logger.warning(f"{code} dates are not sorted, dumped without chunks")
+            if df is None:
+                df = self._get_source_data(file_or_data)
         if df is None or df.empty:
             logger.warning(f"{code} data is None or empty")
             return
@@ -255,10 +824,8 @@ class DumpDataBase:
         # try to remove dup rows or it will cause exception when reindex.
         df = df.drop_duplicates(self.date_field_name)
 
-        # features save dir
-        features_dir = self._features_dir.joinpath(code_to_fname(code).lower())
         features_dir.mkdir(parents=True, exist_ok=True)
-        self._data_to_bin(df, calendar_list, features_dir)
+        return self._data_to_bin(df, calendar_list, features_dir)
 
     @abc.abstractmethod
     def dump(self):
@@ -269,17 +836,83 @@ class DumpDataBase:
 
 
 class DumpDataAll(DumpDataBase):
+    # number of pending file dates merged into the calendar at once
+    DATE_MERGE_SIZE = 1 << 20
+    INTERMEDIATE_DIR_PREFIX = ".dump_intermediate_"
+    INTERMEDIATE_SUFFIX = ".feather"
+
+    # directory of the parsed source files cached by `_get_all_date`, reused by `_dump_features`
+    _intermediate_dir = None
+
+    def _get_intermediate_path(self, file_path: Path) -> Union[Path, None]:
+        if self._intermediate_dir is None:
+            return None
+        return self._intermediate_dir.joinpath(f"{file_path.name}{self.INTERMEDIATE_SUFFIX}")
+
+    def _save_intermediate(self, file_path: Path, df: pd.DataFrame):
+        """cache the parsed date column and dump fields of a source file in a compact columnar file"""
+        columns = [self.date_field_name] + [
+            _field
+            for _field in self.get_dump_fields(df.columns)
+            if _field in df.columns and _field != self.date_field_name
+        ]
+        intermediate_path = self._get_intermediate_path(file_path)
+        try:
+            feather.write_feather(
+                df.loc[:, columns].reset_index(drop=True), str(intermediate_path), compression="uncompressed"
+            )
+        except Exception as e:
+            # e.g. object columns with mixed types; the feature pass parses the source file again
+            logger.warning(f"{file_path.name}: failed to cache parsed data, {e}")
+            intermediate_path.unlink(missing_ok=True)
+
+    def _get_source_data(self, file_path: Path, usecols=None) -> pd.DataFrame:
+        intermediate_path = self._get_intermediate_path(file_path)
+        if usecols is None and intermediate_path is not None and intermediate_path.exists():
+            return feather.read_feather(str(intermediate_path), memory_map=True)
+        return super()._get_source_data(file_path, usecols)
+
+    def _get_file_date(self, file_path: Path, cache: bool = True):
+        """(begin, end), sorted unique int64 dates of a source file; the parsed file is cached for the feature pass"""
+        if self.chunk_size:
+            _chunks = self._iter_source_data(file_path, usecols=lambda x: x == self.date_field_name)
+            _dates = [self._get_date_array(_df, self.date_field_name) for _df in _chunks]
+            dates = np.unique(np.concatenate([np.array([], dtype=np.int64)] + _dates))
+            if len(dates) == 0:
+                return (None, None), dates
+            return (pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])), dates
+        if self._intermediate_dir is None or not cache:
+            df = self._get_source_data(file_path, usecols=lambda x: x == self.date_field_name)
+        else:
+            df = self._get_source_data(file_path)
+            self._save_intermediate(file_path, df)
+        return self._get_date(df, is_begin_end=True), self._get_date_array(df, self.date_field_name)
+
     def _get_all_date(self):
         logger.info("start get all date......")
-        all_datetime = set()
+        # the dates of the files are merged in batches: np.unique of the concatenation is a
+        # sort of the batch, and the merged calendar is never re-sorted per file
+        all_datetime = np.array([], dtype=np.int64)
+        pending = []
+        pending_size = 0
         date_range_list = []
-        _fun = partial(self._get_date, as_set=True, is_begin_end=True)
+        # chunked dumps stream the source files, the first pass only reads the date column
+        if feather is not None and not self.is_columnar_source and not self.chunk_size:
+            self.qlib_dir.mkdir(parents=True, exist_ok=True)
+            self._intermediate_dir = Path(tempfile.mkdtemp(prefix=self.INTERMEDIATE_DIR_PREFIX, dir=self.qlib_dir))
+        _fun = self._get_file_date
+        # files that will probably be skipped are not cached
+        _cache = [not self._probably_unchanged(file_path) for file_path in self.csv_files]
         with tqdm(total=len(self.csv_files)) as p_bar:
             with ProcessPoolExecutor(max_workers=self.works) as executor:
-                for file_path, ((_begin_time, _end_time), _set_calendars) in zip(
-                    self.csv_files, executor.map(_fun, self.csv_files)
+                for file_path, ((_begin_time, _end_time), _file_dates) in zip(
+                    self.csv_files, executor.map(_fun, self.csv_files, _cache)
                 ):
-                    all_datetime = all_datetime | _set_calendars
+                    pending.append(_file_dates)
+                    pending_size += len(_file_dates)
+                    if pending_size > max(len(all_datetime), self.DATE_MERGE_SIZE):
+                        all_datetime = np.unique(np.concatenate([all_datetime] + pending))
+                        pending, pending_size = [], 0
                     if isinstance(_begin_time, pd.Timestamp) and isinstance(_end_time, pd.Timestamp):
                         _begin_time = self._format_datetime(_begin_time)
                         _end_time = self._format_datetime(_end_time)
@@ -287,13 +920,13 @@ class DumpDataAll(DumpDataBase):
                         _inst_fields = [symbol.upper(), _begin_time, _end_time]
                         date_range_list.append(f"{self.INSTRUMENTS_SEP.join(_inst_fields)}")
                     p_bar.update()
-        self._kwargs["all_datetime_set"] = all_datetime
+        self._kwargs["all_datetime"] = np.unique(np.concatenate([all_datetime] + pending))
         self._kwargs["date_range_list"] = date_range_list
         logger.info("end of get all date.\n")
 
     def _dump_calendars(self):
         logger.info("start dump calendars......")
-        self._calendars_list = sorted(map(pd.Timestamp, self._kwargs["all_datetime_set"]))
+        self._calendars_list = self._kwargs["all_datetime"]
         self.save_calendars(self._calendars_list)
         logger.info("end of calendars dump.\n")
 
@@ -302,24 +935,89 @@ class DumpDataAll(DumpDataBase):
         self.save_instruments(self._kwargs["date_range_list"])
         logger.info("end of instruments dump.\n")
 
+    def _get_previous_entry(self, file_path: Path) -> Union[dict, None]:
+        if not self._skip_unchanged or self._manifest.options != self.manifest_options:
+            return None
+        return self._manifest.symbols.get(self.get_symbol_from_file(file_path).upper())
+
+    def _probably_unchanged(self, file_path: Path) -> bool:
+        """size and mtime of the source file match the manifest"""
+        previous = self._get_previous_entry(file_path)
+        if previous is None or not previous.get("source"):
+            return False
+        stat = file_path.stat()
+        return previous["source"].get("size") == stat.st_size and previous["source"].get("mtime_ns") == stat.st_mtime_ns
+
+    def _dump_file(self, file_path: Path, previous: dict = None):
+        """dump a source file, returns (code, manifest entry, skipped)"""
+        code = self.get_symbol_from_file(file_path)
+        if not self._write_manifest:
+            self._dump_bin(file_path, _WORKER_CALENDAR)
+            return code.upper(), None, False
+        source = DumpManifest.source_fingerprint(file_path, previous and previous.get("source"))
+        features_dir = self._features_dir.joinpath(code_to_fname(code).lower())
+        if previous is not None and DumpManifest.is_unchanged(previous, source, _WORKER_CALENDAR, features_dir):
+            return code.upper(), previous, True
+        bin_paths = self._dump_bin(file_path, _WORKER_CALENDAR)
+        if not bin_paths:
+            return code.upper(), None, False
+        return code.upper(), DumpManifest.symbol_entry(bin_paths, _WORKER_CALENDAR, source), False
+
+    def _new_manifest_symbols(self) -> dict:
+        # dump_all rewrites the whole dump
+        return {}
+
     def _dump_features(self):
         logger.info("start dump features......")
-        _dump_func = partial(self._dump_bin, calendar_list=self._calendars_list)
+        calendar = self.get_calendar_array(self._calendars_list)
+        previous = [self._get_previous_entry(file_path) for file_path in self.csv_files]
+        symbols = self._new_manifest_symbols()
+        skipped = 0
         with tqdm(total=len(self.csv_files)) as p_bar:
-            with ProcessPoolExecutor(max_workers=self.works) as executor:
-                for _ in executor.map(_dump_func, self.csv_files):
+            with ProcessPoolExecutor(
+                max_workers=self.works, initializer=_init_worker_calendar, initargs=(calendar,)
+            ) as executor:
+                for _code, _entry, _skipped in executor.map(self._dump_file, self.csv_files, previous):
+                    if _entry is not None:
+                        symbols[_code] = _entry
+                    skipped += _skipped
                     p_bar.update()
+        if self._skip_unchanged:
+            logger.info(f"{skipped} unchanged symbols skipped")
+        if not self._write_manifest:
+            logger.info("end of features dump.\n")
+            return
 
+        self._manifest.options = self.manifest_options
+        self._manifest.calendar = self._manifest.calendar_info(self._calendars_dir.joinpath(f"{self.freq}.txt"))
+        self._manifest.symbols = symbols
+        self._manifest.save()
         logger.info("end of features dump.\n")
 
+    def _remove_intermediate(self):
+        if self._intermediate_dir is not None:
+            shutil.rmtree(self._intermediate_dir, ignore_errors=True)
+            self._intermediate_dir = None
+
     def dump(self):
-        self._get_all_date()
-        self._dump_calendars()
-        self._dump_instruments()
-        self._dump_features()
+        try:
+            self._get_all_date()
+            self._dump_calendars()
+            self._dump_instruments()
+            self._dump_features()
+        finally:
+            self._remove_intermediate()
 
 
 class DumpDataFix(DumpDataAll):
+    _MAIN_PROCESS_ATTRS = DumpDataAll._MAIN_PROCESS_ATTRS + ("_old_instruments",)
+
+    def _new_manifest_symbols(self) -> dict:
+        # dump_fix only rewrites the symbols of its source files
+        if self._manifest.options != self.manifest_options:
+            return {}
+        return dict(self._manifest.symbols)
+
     def _dump_instruments(self):
         logger.info("start dump instruments......")
         _fun = partial(self._get_date, is_begin_end=True)
@@ -357,6 +1055,15 @@ class DumpDataFix(DumpDataAll):
 
 
 class DumpDataUpdate(DumpDataBase):
+    # the workers get the calendar from the pool initializer
+    _MAIN_PROCESS_ATTRS = DumpDataBase._MAIN_PROCESS_ATTRS + (
+        "_old_calendar_list",
+        "_new_calendar_list",
+        "_new_calendar_array",
+        "_update_instruments",
+        "_file_ranges",
+    )
+
     def __init__(
         self,
         csv_path: str,
@@ -370,6 +1077,8 @@ class DumpDataUpdate(DumpDataBase):
         exclude_fields: str = "",
         include_fields: str = "",
         limit_nums: int = None,
+        chunk_size: int = None,
+        manifest: bool = False,
     ):
         """
 
@@ -397,6 +1106,11 @@ class DumpDataUpdate(DumpDataBase):
             fields not dumped
         limit_nums: int
             Use when debugging, default None
+        chunk_size: int, default None
+            write the new data of a symbol in chunks of chunk_size rows
+        manifest: bool, default False
+            write the checksums of the updated bins to <qlib_dir>/.dump_manifest.json,
+            a manifest that already exists for freq is always kept up to date
         """
         super().__init__(
             csv_path,
@@ -409,9 +1123,13 @@ class DumpDataUpdate(DumpDataBase):
             symbol_field_name,
             exclude_fields,
             include_fields,
+            chunk_size=chunk_size,
+            manifest=manifest,
         )
         self._mode = self.UPDATE_MODE
+        self._journal = DumpJournal(self.qlib_dir)
         self._old_calendar_list = self._read_calendars(self._calendars_dir.joinpath(f"{self.freq}.txt"))
+        self._old_calendar_end = self._old_calendar_list[-1]
         # NOTE: all.txt only exists once for each stock
         # NOTE: if a stock corresponds to multiple different time ranges, user need to modify self._update_instruments
         self._update_instruments = (
@@ -420,32 +1138,94 @@ class DumpDataUpdate(DumpDataBase):
             .to_dict(orient="index")
         )  # type: dict
 
-        # load all csv files
-        self._all_data = self._load_all_source_data()  # type: pd.DataFrame
-        self._new_calendar_list = self._old_calendar_list + sorted(
-            filter(lambda x: x > self._old_calendar_list[-1], self._all_data[self.date_field_name].unique())
-        )
+        # scan the date and symbol columns of the source files, the data is read by the workers when dumping
+        self._file_ranges = self._scan_source_files()  # type: Dict[Path, Dict[str, tuple]]
+        self._new_calendar_array = self.get_calendar_array(self._new_calendar_list)
+
+    def _read_source_file(self, file_path: Path, usecols=None) -> pd.DataFrame:
+        df = self._get_source_data(file_path, usecols=usecols)
+        if self.symbol_field_name not in df.columns:
+            df[self.symbol_field_name] = self.get_symbol_from_file(file_path)
+        return df
 
-    def _load_all_source_data(self):
-        # NOTE: Need more memory
-        logger.info("start load all source data....")
-        all_df = []
+    def _normalize_codes(self, symbols: pd.Series) -> pd.Series:
+        return symbols.astype(str).map(lambda x: fname_to_code(x.lower()).upper())
 
-        def _read_csv(file_path: Path):
-            _df = pd.read_csv(file_path, parse_dates=[self.date_field_name])
-            if self.symbol_field_name not in _df.columns:
-                _df[self.symbol_field_name] = self.get_symbol_from_file(file_path)
-            return _df
+    def _get_file_update_info(self, file_path: Path):
+        """symbol -> (begin, end) and the dates after the current calendar of a source file"""
+        df = self._read_source_file(file_path, usecols=lambda x: x in (self.date_field_name, self.symbol_field_name))
+        if df.empty:
+            return {}, set()
+        new_dates = set(df.loc[df[self.date_field_name] > self._old_calendar_end, self.date_field_name])
+        date_range = df.groupby(self._normalize_codes(df[self.symbol_field_name]))[self.date_field_name].agg(
+            ["min", "max"]
+        )
+        return {code: (row["min"], row["max"]) for code, row in date_range.iterrows()}, new_dates
 
+    def _scan_source_files(self) -> Dict[Path, Dict[str, tuple]]:
+        logger.info("start scan source data....")
+        file_ranges = {}
+        new_dates = set()
         with tqdm(total=len(self.csv_files)) as p_bar:
-            with ThreadPoolExecutor(max_workers=self.works) as executor:
-                for df in executor.map(_read_csv, self.csv_files):
-                    if not df.empty:
-                        all_df.append(df)
+            with ProcessPoolExecutor(max_workers=self.works) as executor:
+                for file_path, (_ranges, _new_dates) in zip(
+                    self.csv_files, executor.map(self._get_file_update_info, self.csv_files)
+                ):
+                    if _ranges:
+                        file_ranges[file_path] = _ranges
+                    new_dates |= _new_dates
                     p_bar.update()
+        self._new_calendar_list = self._old_calendar_list + sorted(map(pd.Timestamp, new_dates))
+        logger.info("end of scan source data.\n")
+        return file_ranges
+
+    def _group_files(self) -> List[List[Path]]:
+        """group the source files so that all files of a symbol are dumped by the same worker"""
+        files = list(self._file_ranges)
+        parent = list(range(len(files)))
+
+        def _find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        owner = {}
+        for i, file_path in enumerate(files):
+            for code in self._file_ranges[file_path]:
+                if code in owner:
+                    parent[_find(i)] = _find(owner[code])
+                else:
+                    owner[code] = i
+        groups = defaultdict(list)
+        for i, file_path in enumerate(files):
+            groups[_find(i)].append(file_path)
+        return list(groups.values())
+
+    def _dump_files(self, file_paths: List[Path], codes: Dict[str, Union[pd.Timestamp, None]]) -> Dict[str, dict]:
+        """dump `codes` (code -> end datetime of the existing data, None for new stocks) from the source files
 
-        logger.info("end of load all data.\n")
-        return pd.concat(all_df, sort=False)
+        Returns
+        -------
+            code -> manifest entry of the dumped bins
+        """
+        df = pd.concat([self._read_source_file(file_path) for file_path in file_paths], sort=False)
+        # a symbol split over several files has no single source fingerprint
+        source = None
+        if self._write_manifest and len(file_paths) == 1:
+            source = DumpManifest.source_fingerprint(file_paths[0])
+        entries = {}
+        for _code, _df in df.groupby(self._normalize_codes(df[self.symbol_field_name]), group_keys=False):
+            if _code not in codes:
+                continue
+            if codes[_code] is not None:
+                # exists stock, will append data
+                _df = _df[_df[self.date_field_name] > codes[_code]]
+            if not _df.empty:
+                bin_paths = self._dump_bin(_df, _WORKER_CALENDAR)
+                if bin_paths and self._write_manifest:
+                    entries[_code] = DumpManifest.symbol_entry(bin_paths, _WORKER_CALENDAR, source)
+        return entries
 
     def _dump_calendars(self):
         pass
@@ -455,50 +1235,78 @@ class DumpDataUpdate(DumpDataBase):
 
     def _dump_features(self):
         logger.info("start dump features......")
+        # update the instruments and decide what each group of files has to dump
+        date_range = {}
+        for _ranges in self._file_ranges.values():
+            for _code, (_start, _end) in _ranges.items():
+                if _code in date_range:
+                    _start, _end = min(_start, date_range[_code][0]), max(_end, date_range[_code][1])
+                date_range[_code] = (_start, _end)
+        dump_codes = {}
+        for _code, (_start, _end) in date_range.items():
+            if not (isinstance(_start, pd.Timestamp) and isinstance(_end, pd.Timestamp)):
+                continue
+            if _code in self._update_instruments:
+                _old_end = pd.Timestamp(self._update_instruments[_code][self.INSTRUMENTS_END_FIELD])
+                if _end > _old_end:
+                    self._update_instruments[_code][self.INSTRUMENTS_END_FIELD] = self._format_datetime(_end)
+                    dump_codes[_code] = _old_end
+            else:
+                # new stock
+                _dt_range = self._update_instruments.setdefault(_code, dict())
+                _dt_range[self.INSTRUMENTS_START_FIELD] = self._format_datetime(_start)
+                _dt_range[self.INSTRUMENTS_END_FIELD] = self._format_datetime(_end)
+                dump_codes[_code] = None
+
         error_code = {}
-        with ProcessPoolExecutor(max_workers=self.works) as executor:
+        with ProcessPoolExecutor(
+            max_workers=self.works, initializer=_init_worker_calendar, initargs=(self._new_calendar_array,)
+        ) as executor:
             futures = {}
-            for _code, _df in self._all_data.groupby(self.symbol_field_name, group_keys=False):
-                _code = fname_to_code(str(_code).lower()).upper()
-                _start, _end = self._get_date(_df, is_begin_end=True)
-                if not (isinstance(_start, pd.Timestamp) and isinstance(_end, pd.Timestamp)):
-                    continue
-                if _code in self._update_instruments:
-                    # exists stock, will append data
-                    _update_calendars = (
-                        _df[_df[self.date_field_name] > self._update_instruments[_code][self.INSTRUMENTS_END_FIELD]][
-                            self.date_field_name
-                        ]
-                        .sort_values()
-                        .to_list()
-                    )
-                    if _update_calendars:
-                        self._update_instruments[_code][self.INSTRUMENTS_END_FIELD] = self._format_datetime(_end)
-                        futures[executor.submit(self._dump_bin, _df, _update_calendars)] = _code
-                else:
-                    # new stock
-                    _dt_range = self._update_instruments.setdefault(_code, dict())
-                    _dt_range[self.INSTRUMENTS_START_FIELD] = self._format_datetime(_start)
-                    _dt_range[self.INSTRUMENTS_END_FIELD] = self._format_datetime(_end)
-                    futures[executor.submit(self._dump_bin, _df, self._new_calendar_list)] = _code
+            for _files in self._group_files():
+                _codes = {
+                    _code: dump_codes[_code]
+                    for _file in _files
+                    for _code in self._file_ranges[_file]
+                    if _code in dump_codes
+                }
+                if _codes:
+                    futures[executor.submit(self._dump_files, _files, _codes)] = ",".join(sorted(_codes))
 
             with tqdm(total=len(futures)) as p_bar:
                 for _future in as_completed(futures):
                     try:
-                        _future.result()
+                        self._manifest.symbols.update(_future.result())
                     except Exception:
                         error_code[futures[_future]] = traceback.format_exc()
                     p_bar.update()
             logger.info(f"dump bin errors: {error_code}")
+        if error_code:
+            raise RuntimeError(f"dump bin failed for {len(error_code)} groups of files, see the errors above")
 
         logger.info("end of features dump.\n")
 
     def dump(self):
+        # features first, then calendar and instruments: an interrupted update is rolled back by the journal
+        calendar_path = self._calendars_dir.joinpath(f"{self.freq}.txt")
+        self._journal.begin(
+            [calendar_path, self._instruments_dir.joinpath(self.INSTRUMENTS_FILE_NAME), self._manifest.path]
+        )
+        try:
+            self._dump_features()
+        except Exception:
+            # a failed worker leaves some bins updated and others not: restore the data as it was before the update
+            self._journal.rollback()
+            raise
         self.save_calendars(self._new_calendar_list)
-        self._dump_features()
         df = pd.DataFrame.from_dict(self._update_instruments, orient="index")
         df.index.names = [self.symbol_field_name]
         self.save_instruments(df.reset_index())
+        if self._write_manifest:
+            self._manifest.options = self.manifest_options
+            self._manifest.calendar = self._manifest.calendar_info(calendar_path)
+            self._manifest.save()
+        self._journal.commit()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+"""
+Compare dump_bin times for CSV, Parquet and Feather source files
+
+The same synthetic data is written in each format, dumped with DumpDataAll and the resulting
+bin files are checked to be identical.
+
+Usage:
+    $ python dump_bin_benchmark.py run --symbols 200 --rows 5000
+    $ python dump_bin_benchmark.py run --symbols 50 --rows 100000 --freq 1min --max_workers 8
+"""
+
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import fire
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from dump_bin import DumpDataAll
+
+FIELDS = ["open", "close", "high", "low", "volume", "factor"]
+
+
+class DumpBenchmark:
+    SUFFIXES = (".csv", ".parquet", ".feather")
+
+    def __init__(
+        self,
+        symbols: int = 100,
+        rows: int = 2500,
+        freq: str = "day",
+        max_workers: int = 4,
+        work_dir: str = None,
+        keep: bool = False,
+    ):
+        """
+
+        Parameters
+        ----------
+        symbols: int, default 100
+            number of source files
+        rows: int, default 2500
+            rows per source file
+        freq: str, default "day"
+            "day", or an intraday frequency such as "1min"
+        max_workers: int, default 4
+            max_workers of DumpDataAll
+        work_dir: str, default None
+            directory of the source data and dumps, a temporary directory by default
+        keep: bool, default False
+            keep work_dir after the benchmark
+        """
+        self.symbols = symbols
+        self.rows = rows
+        self.freq = freq
+        self.max_workers = max_workers
+        self.work_dir = Path(work_dir).expanduser() if work_dir else Path(tempfile.mkdtemp(prefix="dump_bin_bench_"))
+        self.keep = keep
+
+    def _make_source_data(self):
+        if self.freq == "day":
+            dates = pd.bdate_range("2000-01-03", periods=self.rows)
+        else:
+            dates = pd.date_range("2020-01-02 09:30:00", periods=self.rows, freq=self.freq)
+        rng = np.random.default_rng(0)
+        for i in range(self.symbols):
+            symbol = f"sh{600000 + i}"
+            close = 10 + rng.standard_normal(self.rows).cumsum() * 0.1
+            df = pd.DataFrame(
+                {
+                    "symbol": symbol.upper(),
+                    "date": dates.strftime("%Y-%m-%d" if self.freq == "day" else "%Y-%m-%d %H:%M:%S"),
+                    "open": close + rng.standard_normal(self.rows) * 0.01,
+                    "close": close,
+                    "high": close + 0.05,
+                    "low": close - 0.05,
+                    "volume": rng.integers(0, 1_000_000, self.rows).astype(np.float64),
+                    "factor": 1.0,
+                }
+            )
+            for suffix in self.SUFFIXES:
+                source_dir = self.work_dir.joinpath("source" + suffix.replace(".", "_"))
+                source_dir.mkdir(parents=True, exist_ok=True)
+                file_path = source_dir.joinpath(f"{symbol}{suffix}")
+                if suffix == ".csv":
+                    df.to_csv(file_path, index=False)
+                elif suffix == ".parquet":
+                    df.to_parquet(file_path, index=False)
+                else:
+                    df.to_feather(file_path)
+
+    @staticmethod
+    def _compare_dumps(expected_dir: Path, actual_dir: Path) -> int:
+        """number of files in expected_dir that differ from (or are missing in) actual_dir"""
+        mismatches = 0
+        for expected in expected_dir.rglob("*"):
+            if expected.is_dir():
+                continue
+            actual = actual_dir.joinpath(expected.relative_to(expected_dir))
+            if not actual.exists() or actual.read_bytes() != expected.read_bytes():
+                mismatches += 1
+        return mismatches
+
+    def run(self) -> Dict[str, float]:
+        try:
+            logger.info(f"writing {self.symbols} x {self.rows} rows of source data to {self.work_dir}......")
+            self._make_source_data()
+
+            times = {}
+            for suffix in self.SUFFIXES:
+                qlib_dir = self.work_dir.joinpath("qlib" + suffix.replace(".", "_"))
+                shutil.rmtree(qlib_dir, ignore_errors=True)
+                start = time.perf_counter()
+                DumpDataAll(
+                    csv_path=self.work_dir.joinpath("source" + suffix.replace(".", "_")),
+                    qlib_dir=qlib_dir,
+                    freq=self.freq,
+                    max_workers=self.max_workers,
+                    file_suffix=suffix,
+                    include_fields=",".join(FIELDS),
+                ).dump()
+                times[suffix] = time.perf_counter() - start
+
+            baseline = self.work_dir.joinpath("qlib_csv")
+            for suffix in self.SUFFIXES[1:]:
+                mismatches = self._compare_dumps(baseline, self.work_dir.joinpath("qlib" + suffix.replace(".", "_")))
+                if mismatches:
+                    logger.error(f"{suffix}: {mismatches} dumped files differ from the csv dump")
+
+            for suffix, seconds in times.items():
+                logger.info(f"{suffix:>9}: {seconds:8.2f}s ({times['.csv'] / seconds:.2f}x csv)")
+            return times
+        finally:
+            if not self.keep:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    fire.Fire(DumpBenchmark)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow 为可选依赖，只有使用合并存储时才需要
+    pa = None
+    ipc = None
+
+
+def normalize_symbol(symbol: str) -> str:
+    """统一股票代码写法: 大写，点号转下划线 (0002.hk / 0002_HK -> 0002_HK)"""
+    return str(symbol).strip().upper().replace(".", "_")
+
+
+class FinancialDataLoader:
+    """
+    财务数据按需加载
+
+    每种数据类型（info、balance_sheet 等）首次使用时扫描一次目录（只列文件名，不读取内容），
+    建立 规范化代码 -> 文件 的索引；数据在第一次查询时才读取，最近使用的 max_cached 份保存在
+    LRU 缓存中，内存占用不随股票数量增长。
+
+    目录结构:
+        <financial_data_dir>/<data_type>/<SYMBOL>.csv
+        <financial_data_dir>/<data_type>.consolidated.arrow   (可选，consolidate() 生成)
+
+    合并存储把同一数据类型的全部股票写入一个 Arrow 文件并记录每只股票的行范围，
+    以内存映射方式打开，查询时只切片需要的行，省去逐个打开CSV文件的开销。
+    合并存储记录每个CSV文件的大小和 mtime，打开时逐一比较（只需 stat），
+    有文件新增、删除或修改时忽略合并存储，回退到CSV。
+    """
+
+    DATA_TYPES = ["info", "financials", "balance_sheet", "cashflow", "dividends", "financial_ratios"]
+    CONSOLIDATED_SUFFIX = ".consolidated.arrow"
+    SYMBOL_COLUMN = "__symbol__"
+    INDEX_COLUMN = "__index__"
+    METADATA_KEY = b"financial_symbols"
+    SOURCES_KEY = b"financial_sources"
+
+    def __init__(self, financial_data_dir, max_cached: int = 256, data_types: Optional[Iterable[str]] = None):
+        self.root = Path(financial_data_dir)
+        self.max_cached = max(1, max_cached)
+        self.data_types = list(data_types) if data_types is not None else list(self.DATA_TYPES)
+
+        self._indexes: Dict[str, Dict[str, Path]] = {}
+        self._consolidated: Dict[str, Optional[Dict]] = {}
+        self._cache: "OrderedDict[tuple, Optional[pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def consolidated_path(self, data_type: str) -> Path:
+        return self.root / f"{data_type}{self.CONSOLIDATED_SUFFIX}"
+
+    def available_types(self):
+        """存在数据的类型（目录或合并存储）"""
+        return [
+            data_type
+            for data_type in self.data_types
+            if (self.root / data_type).is_dir() or self.consolidated_path(data_type).exists()
+        ]
+
+    def _get_index(self, data_type: str) -> Dict[str, Path]:
+        """规范化代码 -> CSV 文件（每种数据类型只扫描一次目录）"""
+        index = self._indexes.get(data_type)
+        if index is not None:
+            return index
+
+        index = {}
+        data_path = self.root / data_type
+        try:
+            with os.scandir(data_path) as entries:
+                names = sorted(
+                    entry.name for entry in entries if entry.name.lower().endswith(".csv") and entry.is_file()
+                )
+        except OSError:
+            names = []
+        for name in names:
+            index.setdefault(normalize_symbol(name[:-4]), data_path / name)
+
+        with self._lock:
+            self._indexes.setdefault(data_type, index)
+        return self._indexes[data_type]
+
+    def _scan_sources(self, data_type: str) -> Dict[str, list]:
+        """CSV 文件名 -> [size, mtime_ns]，用于判断合并存储是否过期"""
+        sources = {}
+        try:
+            with os.scandir(self.root / data_type) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(".csv") and entry.is_file():
+                        stat = entry.stat()
+                        sources[entry.name] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            pass
+        return sources
+
+    def _get_consolidated(self, data_type: str) -> Optional[Dict]:
+        """打开合并存储（内存映射），不存在或已过期时返回 None"""
+        if data_type in self._consolidated:
+            return self._consolidated[data_type]
+
+        store = None
+        path = self.consolidated_path(data_type)
+        if ipc is not None and path.exists():
+            try:
+                table = ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+                symbols = json.loads(table.schema.metadata[self.METADATA_KEY])
+                sources = json.loads(table.schema.metadata.get(self.SOURCES_KEY, b"null"))
+                if (self.root / data_type).is_dir() and sources != self._scan_sources(data_type):
+                    logger.warning(f"📁 {data_type} 的CSV文件在合并之后有改动，忽略合并存储: {path.name}")
+                else:
+                    store = {"table": table, "symbols": symbols}
+            except (OSError, ValueError, KeyError, pa.ArrowInvalid) as e:
+                logger.warning(f"读取合并存储失败，回退到CSV: {path}: {e}")
+
+        with self._lock:
+            self._consolidated.setdefault(data_type, store)
+        return self._consolidated[data_type]
+
+    def _read(self, key: str, data_type: str) -> Optional[pd.DataFrame]:
+        store = self._get_consolidated(data_type)
+        if store is not None:
+            entry = store["symbols"].get(key)
+            if entry is None:
+                return None
+            return self._frame_from_store(store["table"], entry)
+
+        path = self._get_index(data_type).get(key)
+        if path is None:
+            return None
+        try:
+            return pd.read_csv(path, index_col=0)
+        except Exception as e:
+            logger.warning(f"Failed to load {data_type} for {key}: {e}")
+            return None
+
+    def get(self, symbol: str, data_type: str) -> Optional[pd.DataFrame]:
+        """获取一只股票的某类财务数据，不存在时返回 None"""
+        if data_type not in self.data_types:
+            return None
+        cache_key = (data_type, normalize_symbol(symbol))
+        with self._lock:
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return self._cache[cache_key]
+            self.misses += 1
+
+        df = self._read(cache_key[1], data_type)
+
+        with self._lock:
+            self._cache[cache_key] = df
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return df
+
+    def warm(self, symbol: str, data_types: Optional[Iterable[str]] = None):
+        """预先读取一只股票的财务数据到缓存（供预读线程调用）"""
+        for data_type in data_types or self.data_types:
+            self.get(symbol, data_type)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
+
+    # ------------------------------------------------------------------
+    # 合并存储
+    # ------------------------------------------------------------------
+
+    def _frame_from_store(self, table, entry: Dict) -> pd.DataFrame:
+        """从合并存储中切出一只股票的数据，恢复原来的列和数值类型"""
+        start, stop = entry["rows"]
+        columns = entry["columns"]
+        df = table.slice(start, stop - start).select([self.INDEX_COLUMN] + columns).to_pandas()
+        df = df.set_index(self.INDEX_COLUMN)
+        df.index.name = entry.get("index_name")
+        if entry.get("index_numeric"):
+            df.index = pd.to_numeric(df.index)
+        for col, dtype in entry.get("numeric", {}).items():
+            if df[col].dtype == object:
+                df[col] = pd.to_numeric(df[col])
+            if df[col].dtype != dtype and df[col].notna().all():
+                df[col] = df[col].astype(dtype)
+        return df
+
+    def consolidate(self, data_types: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        把每种数据类型的CSV合并为一个 Arrow 文件
+
+        各股票的列不完全相同，合并文件使用所有列的并集；某列在全部股票中都是数值时保存为
+        float64，否则保存为字符串，读取时按每只股票原来的数值列和类型还原。
+
+        Returns:
+        --------
+        Dict[str, int]: 数据类型 -> 合并的股票数量
+        """
+        if ipc is None:
+            raise ImportError("合并财务数据需要安装 pyarrow: pip install pyarrow")
+
+        counts = {}
+        for data_type in data_types or self.data_types:
+            index = self._get_index(data_type)
+            if not index:
+                continue
+
+            # 先记录文件状态再读取，读取期间被修改的文件下次打开时会判定为过期
+            sources = self._scan_sources(data_type)
+            frames = []
+            symbols = {}
+            start = 0
+            for key in sorted(index):
+                try:
+                    df = pd.read_csv(index[key], index_col=0)
+                except Exception as e:
+                    logger.warning(f"Failed to load {data_type} for {key}: {e}")
+                    continue
+                df.columns = [str(col) for col in df.columns]
+                symbols[key] = {
+                    "rows": [start, start + len(df)],
+                    "columns": list(df.columns),
+                    "numeric": {
+                        col: str(df[col].dtype) for col in df.columns if pd.api.types.is_numeric_dtype(df[col])
+                    },
+                    "index_name": df.index.name,
+                    "index_numeric": bool(pd.api.types.is_numeric_dtype(df.index)),
+                }
+                start += len(df)
+                frames.append((key, df))
+
+            table = self._build_table(frames)
+            metadata = {
+                self.METADATA_KEY: json.dumps(symbols, ensure_ascii=False).encode("utf-8"),
+                self.SOURCES_KEY: json.dumps(sources, ensure_ascii=False).encode("utf-8"),
+            }
+            table = table.replace_schema_metadata(metadata)
+
+            path = self.consolidated_path(data_type)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                self._consolidated.pop(data_type, None)
+            counts[data_type] = len(symbols)
+            logger.info(f"✅ 合并 {data_type} 数据: {len(symbols)} 只股票 -> {path}")
+        return counts
+
+    def _build_table(self, frames):
+        columns = []
+        seen = set()
+        numeric = {}
+        for _, df in frames:
+            for col in df.columns:
+                if col not in seen:
+                    seen.add(col)
+                    columns.append(col)
+                numeric[col] = numeric.get(col, True) and pd.api.types.is_numeric_dtype(df[col])
+
+        arrays = {self.SYMBOL_COLUMN: [], self.INDEX_COLUMN: []}
+        arrays.update({col: [] for col in columns})
+        for key, df in frames:
+            arrays[self.SYMBOL_COLUMN].extend([key] * len(df))
+            arrays[self.INDEX_COLUMN].extend(None if pd.isna(v) else str(v) for v in df.index)
+            for col in columns:
+                if col not in df.columns:
+                    arrays[col].extend([None] * len(df))
+                elif numeric[col]:
+                    arrays[col].extend(df[col].astype("float64").tolist())
+                else:
+                    arrays[col].extend(None if pd.isna(v) else str(v) for v in df[col])
+
+        fields = [pa.field(self.SYMBOL_COLUMN, pa.string()), pa.field(self.INDEX_COLUMN, pa.string())]
+        fields += [pa.field(col, pa.float64() if numeric[col] else pa.string()) for col in columns]
+        schema = pa.schema(fields)
+        return pa.table({field.name: pa.array(arrays[field.name], type=field.type) for field in fields}, schema=schema)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import xxhash
+except ImportError:  # xxhash 为可选依赖，缺失时退回 hashlib
+    xxhash = None
+
+
+def new_hasher():
+    """返回增量哈希对象：优先使用 xxh3_128，否则使用 blake2b"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_bytes(data: bytes) -> str:
+    hasher = new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def hash_file(path, offset: int = 0, length: Optional[int] = None, chunk_size: int = 1 << 20) -> str:
+    """计算文件 [offset, offset + length) 区间的哈希，length 为 None 时读到文件末尾"""
+    hasher = new_hasher()
+    remaining = length
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return hasher.hexdigest()
+
+
+class BinFingerprinter:
+    """
+    分层的数据变化检测
+
+    第一层: 比较每个文件的 size 和 mtime_ns，完全一致即视为未变化（只需 stat）
+    第二层: 文件变长时，只校验文件头部块和上次长度处的边界块是否一致，都一致则判定为尾部追加
+    第三层: 文件变短、或长度不变但 mtime 变化（可能被原地改写）时才计算全文件哈希
+
+    判定为尾部追加时不读取全文件，记录的 full_hash 为空（未知）；
+    之后若再出现第三层的情况，full_hash 未知时直接判定为 MODIFIED
+    """
+
+    UNCHANGED = "unchanged"
+    APPENDED = "appended"
+    MODIFIED = "modified"
+    NEW = "new"
+
+    # 边界校验块大小（字节）
+    TAIL_BYTES = 4096
+    # 头部校验块大小（字节），覆盖 bin 文件头的起始日期索引
+    HEAD_BYTES = 4096
+
+    def __init__(self, state_store):
+        self.state_store = state_store
+
+    def _tail_region(self, size: int):
+        start = max(0, size - self.TAIL_BYTES)
+        return start, size - start
+
+    def _head_hash(self, path: Path, size: int) -> str:
+        return hash_file(path, 0, min(size, self.HEAD_BYTES))
+
+    def _describe(self, path: Path, stat: os.stat_result, full_hash: bool = True) -> Dict:
+        tail_offset, tail_length = self._tail_region(stat.st_size)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "full_hash": hash_file(path) if full_hash else "",
+            "tail_hash": hash_file(path, tail_offset, tail_length),
+            "head_hash": self._head_hash(path, stat.st_size),
+        }
+
+    def _classify(self, path: Path, stat: os.stat_result, previous: Optional[Dict]) -> str:
+        if previous is None:
+            return self.NEW
+        if stat.st_size == previous["size"] and stat.st_mtime_ns == previous["mtime_ns"]:
+            return self.UNCHANGED
+        if stat.st_size > previous["size"]:
+            # 头部（如起始日期索引）被改写时即使尾部一致也不是追加
+            if not previous.get("head_hash") or self._head_hash(path, previous["size"]) != previous["head_hash"]:
+                return self.MODIFIED
+            tail_offset, tail_length = self._tail_region(previous["size"])
+            if hash_file(path, tail_offset, tail_length) == previous["tail_hash"]:
+                return self.APPENDED
+            return self.MODIFIED
+        # 变短或同长度改写：只能通过全文件哈希判断
+        if not previous["full_hash"]:
+            return self.MODIFIED
+        return self.UNCHANGED if hash_file(path) == previous["full_hash"] else self.MODIFIED
+
+    def check(self, symbol: str, files: Dict[str, Path]) -> str:
+        """检测一只股票的数据文件是否变化，并立即写入新指纹"""
+        result, updates = self.inspect(symbol, files)
+        if updates:
+            self.state_store.set_fingerprints(symbol, updates)
+        return result
+
+    def inspect(self, symbol: str, files: Dict[str, Path]) -> Tuple[str, Dict[str, Dict]]:
+        """
+        检测一只股票的数据文件相对于上次记录是否变化（不写入记录）
+
+        Parameters:
+        -----------
+        symbol : str
+            股票代码
+        files : Dict[str, Path]
+            字段名 -> 数据文件路径
+
+        Returns:
+        --------
+        Tuple[str, Dict[str, Dict]]:
+            (UNCHANGED / APPENDED / MODIFIED / NEW 之一，多个文件时取最严重的结果; 需要写入的新指纹)
+            NEW 仅表示该股票还没有任何指纹记录
+        """
+        previous = self.state_store.get_fingerprints(symbol)
+        severity = [self.UNCHANGED, self.APPENDED, self.NEW, self.MODIFIED]
+        result = self.UNCHANGED
+        updates = {}
+
+        for feature, path in files.items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if feature in previous:
+                    result = self.MODIFIED
+                continue
+
+            kind = self._classify(path, stat, previous.get(feature))
+            if kind == self.NEW and previous:
+                # 已有指纹的股票新增了数据文件（如新 dump 的字段），用到该字段的指标需要全部重算
+                kind = self.MODIFIED
+            if kind == self.UNCHANGED:
+                if stat.st_mtime_ns != previous[feature]["mtime_ns"]:
+                    # 内容一致，只刷新 mtime，下次可以走第一层
+                    updates[feature] = dict(previous[feature], mtime_ns=stat.st_mtime_ns)
+            else:
+                # 尾部追加时不读全文件，full_hash 记为未知
+                updates[feature] = self._describe(path, stat, full_hash=kind != self.APPENDED)
+            if severity.index(kind) > severity.index(result):
+                result = kind
+
+        return result, updates
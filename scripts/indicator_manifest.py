@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from indicator_fingerprint import hash_file, new_hasher
+
+
+def format_date(ts) -> str:
+    """日期格式化: 日线数据为 YYYY-MM-DD，带时间（分钟线等）时为 YYYY-MM-DD HH:MM:SS"""
+    ts = pd.Timestamp(ts)
+    if ts == ts.normalize():
+        return ts.strftime("%Y-%m-%d")
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ChecksumWriter:
+    """
+    包装文本文件对象，在写入的同时计算内容校验和（供 csv.writer 使用）
+
+    校验和基于 UTF-8 编码的文本内容，不包含 BOM；同一个实例可以通过替换
+    stream 跨多次追加写入累计计算
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self._hasher = new_hasher()
+
+    def write(self, text: str):
+        self._hasher.update(text.encode("utf-8"))
+        return self.stream.write(text)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def checkpoint(self):
+        """当前校验和状态，写入的内容被回退（截断）时通过 restore 恢复"""
+        return self._hasher.copy()
+
+    def restore(self, state):
+        self._hasher = state.copy()
+
+
+class OutputManifest:
+    """
+    指标输出文件的清单（<output>.manifest.json）
+
+    记录字段、总行数、每只股票的行数与起止日期以及内容校验和，
+    增量计算只需读取清单即可得到已计算的日期范围，无需解析整个输出文件。
+    清单同时记录输出文件的大小和 mtime，文件被外部修改后清单自动失效。
+    """
+
+    SCHEMA_VERSION = 1
+    SUFFIX = ".manifest.json"
+
+    def __init__(self, output_path, columns: Optional[List[str]] = None, header_rows: int = 2):
+        self.output_path = Path(output_path)
+        self.columns = list(columns) if columns is not None else []
+        self.header_rows = header_rows
+        self.symbols: Dict[str, Dict] = {}
+        self.checksum: Optional[str] = None
+        # 分片运行时记录 {shard_index, num_shards, universe_hash}
+        self.shard: Optional[Dict] = None
+
+    @classmethod
+    def manifest_path(cls, output_path) -> Path:
+        output_path = Path(output_path)
+        return output_path.with_name(output_path.name + cls.SUFFIX)
+
+    @property
+    def path(self) -> Path:
+        return self.manifest_path(self.output_path)
+
+    @property
+    def row_count(self) -> int:
+        return sum(info["rows"] for info in self.symbols.values())
+
+    @property
+    def min_date(self) -> Optional[str]:
+        return min((info["min_date"] for info in self.symbols.values()), default=None)
+
+    @property
+    def max_date(self) -> Optional[str]:
+        return max((info["max_date"] for info in self.symbols.values()), default=None)
+
+    def get_symbol_range(self, symbol: str) -> Optional[Dict]:
+        """获取股票在输出文件中的 {rows, min_date, max_date}，不存在时返回 None"""
+        return self.symbols.get(str(symbol))
+
+    def add_frame(self, df: pd.DataFrame):
+        """累计一个数据块（需包含 Symbol 和 Date 列）的每只股票统计"""
+        if df is None or df.empty or "Symbol" not in df.columns or "Date" not in df.columns:
+            return
+
+        dates = pd.to_datetime(df["Date"], format="mixed", errors="coerce")
+        stats = (
+            pd.DataFrame({"Symbol": df["Symbol"].astype(str).values, "Date": dates.values})
+            .groupby("Symbol")["Date"]
+            .agg(["size", "min", "max"])
+        )
+        for symbol, row in stats.iterrows():
+            rows = int(row["size"])
+            min_date = format_date(row["min"]) if pd.notna(row["min"]) else None
+            max_date = format_date(row["max"]) if pd.notna(row["max"]) else None
+            info = self.symbols.get(symbol)
+            if info is None:
+                self.symbols[symbol] = {"rows": rows, "min_date": min_date, "max_date": max_date}
+                continue
+            info["rows"] += rows
+            if min_date is not None:
+                info["min_date"] = min_date if info["min_date"] is None else min(info["min_date"], min_date)
+            if max_date is not None:
+                info["max_date"] = max_date if info["max_date"] is None else max(info["max_date"], max_date)
+
+    def save(self, checksum: Optional[str] = None) -> Path:
+        """在输出文件写完后保存清单"""
+        if checksum is not None:
+            self.checksum = checksum
+        stat = os.stat(self.output_path)
+        content = {
+            "schema_version": self.SCHEMA_VERSION,
+            "output_file": self.output_path.name,
+            "file_size": stat.st_size,
+            "file_mtime_ns": stat.st_mtime_ns,
+            "checksum": self.checksum,
+            "columns": self.columns,
+            "header_rows": self.header_rows,
+            "row_count": self.row_count,
+            "min_date": self.min_date,
+            "max_date": self.max_date,
+            "symbols": self.symbols,
+            "created_at": datetime.now().isoformat(),
+        }
+        if self.shard is not None:
+            content["shard"] = self.shard
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    @classmethod
+    def load(cls, output_path) -> Optional["OutputManifest"]:
+        """读取清单；清单不存在、版本不符或输出文件已变化时返回 None"""
+        manifest_path = cls.manifest_path(output_path)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            stat = os.stat(output_path)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            content.get("schema_version") != cls.SCHEMA_VERSION
+            or content.get("file_size") != stat.st_size
+            or content.get("file_mtime_ns") != stat.st_mtime_ns
+        ):
+            return None
+
+        manifest = cls(output_path, content.get("columns"), content.get("header_rows", 2))
+        manifest.symbols = content.get("symbols", {})
+        manifest.checksum = content.get("checksum")
+        manifest.shard = content.get("shard")
+        return manifest
+
+    @classmethod
+    def rebuild(cls, output_path, chunksize: int = 200000) -> "OutputManifest":
+        """扫描输出文件的 Symbol/Date 列重建清单（用于旧文件或清单失效的情况）"""
+        output_path = Path(output_path)
+        with open(output_path, "r", encoding="utf-8-sig") as f:
+            columns = f.readline().rstrip("\r\n").split(",")
+            second_line = f.readline().rstrip("\r\n").split(",")
+        # save_results 写入的文件第二行是中文标签，流式写入的文件没有
+        header_rows = 2 if second_line and "Date" in columns and second_line[columns.index("Date")] == "日期" else 1
+
+        manifest = cls(output_path, columns, header_rows)
+        reader = pd.read_csv(
+            output_path,
+            encoding="utf-8-sig",
+            skiprows=header_rows,
+            names=columns,
+            usecols=["Symbol", "Date"],
+            dtype=str,
+            chunksize=chunksize,
+        )
+        for chunk in reader:
+            manifest.add_frame(chunk)
+
+        with open(output_path, "rb") as f:
+            has_bom = f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+        manifest.checksum = hash_file(output_path, offset=len(codecs.BOM_UTF8) if has_bom else 0)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load_or_rebuild(cls, output_path) -> Optional["OutputManifest"]:
+        """优先读取清单，失效时重建；输出文件不存在时返回 None"""
+        if not os.path.exists(output_path):
+            return None
+        return cls.load(output_path) or cls.rebuild(output_path)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from loguru import logger
+
+
+class SymbolPrefetcher:
+    """
+    股票输入数据预读
+
+    后台 I/O 线程提前读取后续 depth 只股票的输入数据（bin 文件等），计算线程处理当前股票时
+    下一批数据已经在内存中，网络存储（NFS/SMB）上的读取延迟与计算重叠。
+    缓冲区最多保存 depth 只股票的数据，按输入顺序逐个返回::
+
+        prefetcher = SymbolPrefetcher(stocks, calculator.prefetch_symbol_inputs, depth=4)
+        for symbol, inputs in prefetcher:
+            calculator.calculate_all_indicators_for_stock(symbol, prefetched=inputs)
+
+    load_fn(item) 返回的数据如果是包含 "bytes" 键的字典，会计入读取字节数；
+    读取失败时返回 None，由计算线程自行重新读取。
+    """
+
+    def __init__(self, items: Iterable, load_fn: Callable[[Any], Any], depth: int = 4, io_threads: int = 2):
+        self.items = list(items)
+        self.load_fn = load_fn
+        self.depth = max(1, depth)
+        self.io_threads = max(1, io_threads)
+
+        self._lock = threading.Lock()
+        self.bytes_read = 0
+        self.read_time = 0.0
+        self.stall_time = 0.0
+        self.loaded = 0
+        self.failed = 0
+
+    def _load(self, item):
+        start = time.perf_counter()
+        try:
+            payload = self.load_fn(item)
+        except Exception as e:
+            logger.warning(f"预读 {item} 失败，将在计算时重新读取: {e}")
+            payload = None
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.read_time += elapsed
+            if payload is None:
+                self.failed += 1
+            else:
+                self.loaded += 1
+                if isinstance(payload, dict):
+                    self.bytes_read += payload.get("bytes", 0)
+        return payload
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        with ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="prefetch") as executor:
+            pending = deque()
+            next_index = 0
+            try:
+                while next_index < len(self.items) or pending:
+                    # 补满缓冲区
+                    while next_index < len(self.items) and len(pending) < self.depth:
+                        item = self.items[next_index]
+                        pending.append((item, executor.submit(self._load, item)))
+                        next_index += 1
+
+                    item, future = pending.popleft()
+                    # 数据尚未读完时计算线程需要等待，计入停顿时间
+                    start = time.perf_counter()
+                    payload = future.result()
+                    with self._lock:
+                        self.stall_time += time.perf_counter() - start
+                    yield item, payload
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def metrics(self) -> Dict[str, float]:
+        """读取字节数、读取耗时、读取吞吐量 (MB/s，按 I/O 线程累计耗时计算) 和计算线程的等待时间"""
+        with self._lock:
+            throughput = self.bytes_read / self.read_time / (1 << 20) if self.read_time > 0 else 0.0
+            return {
+                "loaded": self.loaded,
+                "failed": self.failed,
+                "bytes_read": self.bytes_read,
+                "read_time": self.read_time,
+                "throughput_mb_s": throughput,
+                "stall_time": self.stall_time,
+            }
+
+    def log_metrics(self, label: str = "预读"):
+        m = self.metrics()
+        logger.info(
+            f"📦 {label}: {m['loaded']} 只股票, 读取 {m['bytes_read'] / (1 << 20):.1f} MB, "
+            f"吞吐 {m['throughput_mb_s']:.1f} MB/s, 计算等待 {m['stall_time']:.2f}s"
+            + (f", 失败 {m['failed']}" if m["failed"] else "")
+        )
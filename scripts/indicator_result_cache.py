@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow 为可选依赖，只有启用结果缓存时才需要
+    feather = None
+
+from indicator_fingerprint import hash_bytes, new_hasher
+
+
+def code_version(cls, method_names: Iterable[str], params: Optional[Dict] = None) -> str:
+    """
+    方法源码的版本哈希
+
+    除了 method_names 本身，还递归包含它们通过 self.xxx 调用的本类方法（如 _safe_divide），
+    辅助方法的修改同样会改变版本；params 为影响计算结果的参数（如 TA-Lib 版本）
+    """
+    hasher = new_hasher()
+    pending = sorted(set(method_names))
+    seen = set()
+    while pending:
+        name = pending.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        source = inspect.getsource(getattr(cls, name))
+        hasher.update(f"{name}\n{source}".encode("utf-8"))
+        for ref in sorted(set(re.findall(r"self\.(\w+)", source))):
+            if ref not in seen and inspect.isfunction(getattr(cls, ref, None)):
+                pending.append(ref)
+    hasher.update(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def frame_fingerprint(df: Optional[pd.DataFrame]) -> str:
+    """数据框内容（含索引和列名）的指纹"""
+    if df is None:
+        return "none"
+    hasher = new_hasher()
+    hasher.update("\n".join(map(str, df.columns)).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return hasher.hexdigest()
+
+
+class FamilyResultCache:
+    """
+    按指标族缓存的计算结果（内容寻址）
+
+    缓存键由 股票、输入数据指纹、指标族名称、指标族代码版本 组成，任意一项变化都会得到新的键；
+    修改某个指标族的代码只会使该指标族的缓存失效，其余指标族直接复用缓存结果。
+
+    目录结构:
+        <root>/<family>/<SYMBOL>/<slot>.<key>.feather
+
+    slot 为输入数据的起始时间（分块/增量计算时每个起点各有一份），同一 slot 只保留最新的结果。
+    增量计算每次运行的起点不同，每只股票、每个指标族最多保留 max_slots 个最近使用的 slot；
+    本次运行中读取或写入过的 slot 不会被清理。
+    """
+
+    SUFFIX = ".feather"
+    INDEX_COLUMN = "__index__"
+
+    def __init__(self, root, max_slots: int = 16):
+        if feather is None:
+            raise ImportError("指标结果缓存需要安装 pyarrow: pip install pyarrow")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_slots = max_slots
+        # 命中时刷新文件 mtime，mtime 不早于该时间的结果属于本次运行（留出文件系统时间精度的余量）
+        self._session_start_ns = time.time_ns() - 2 * 10**9
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(symbol: str, input_fingerprint: str, family: str, version: str) -> str:
+        return hash_bytes("\0".join([str(symbol), input_fingerprint, family, version]).encode("utf-8"))
+
+    @staticmethod
+    def slot_name(start) -> str:
+        return pd.Timestamp(start).strftime("%Y%m%d%H%M%S") if start is not None else "empty"
+
+    def _slot_dir(self, symbol: str, family: str) -> Path:
+        return self.root / family / str(symbol).upper()
+
+    def _path(self, symbol: str, family: str, slot: str, key: str) -> Path:
+        return self._slot_dir(symbol, family) / f"{slot}.{key}{self.SUFFIX}"
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, symbol: str, family: str, slot: str, key: str) -> Optional[pd.DataFrame]:
+        """读取缓存结果，不存在或读取失败时返回 None"""
+        path = self._path(symbol, family, slot, key)
+        try:
+            df = feather.read_feather(path)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        self._count(True)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if self.INDEX_COLUMN in df.columns:
+            df = df.set_index(self.INDEX_COLUMN)
+            df.index.name = None
+        return df
+
+    def put(self, symbol: str, family: str, slot: str, key: str, df: pd.DataFrame):
+        """写入缓存结果，删除同一 slot 的旧结果，并清理超出 max_slots 的最久未使用的 slot"""
+        path = self._path(symbol, family, slot, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = df.copy()
+        table.columns = [str(col) for col in table.columns]
+        table[self.INDEX_COLUMN] = df.index
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        feather.write_feather(table.reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+
+        for stale in path.parent.glob(f"{slot}.*{self.SUFFIX}"):
+            if stale != path:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        self._evict(path.parent)
+
+    def _evict(self, slot_dir: Path):
+        entries = []
+        for path in slot_dir.glob(f"*{self.SUFFIX}"):
+            try:
+                entries.append((path.stat().st_mtime_ns, path))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        for mtime_ns, path in entries[self.max_slots :]:
+            if mtime_ns >= self._session_start_ns:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import heapq
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from indicator_manifest import OutputManifest
+
+
+def universe_hash(symbols) -> str:
+    """股票范围的哈希（与顺序无关），用于校验各分片是否基于同一股票范围"""
+    return hashlib.sha1("\n".join(sorted(symbols)).encode("utf-8")).hexdigest()
+
+
+def assign_shards(costs: Dict[str, int], num_shards: int) -> List[List[str]]:
+    """
+    按计算开销把股票分配到各分片（LPT 贪心：开销从大到小，每次放入当前负载最小的分片）
+
+    排序和负载相同时都按股票代码/分片序号决定，同样的输入在任何机器上得到同样的结果。
+
+    Parameters:
+    -----------
+    costs : Dict[str, int]
+        股票 -> 开销（如 bin 文件总大小）
+    num_shards : int
+        分片数量
+
+    Returns:
+    --------
+    List[List[str]]: 每个分片的股票列表（分片内按股票代码排序）
+    """
+    shards = [[] for _ in range(num_shards)]
+    loads = [(0, index) for index in range(num_shards)]
+    for symbol in sorted(costs, key=lambda s: (-costs[s], s)):
+        load, index = heapq.heappop(loads)
+        shards[index].append(symbol)
+        heapq.heappush(loads, (load + costs[symbol], index))
+    return [sorted(shard) for shard in shards]
+
+
+def bin_size_cost(calculator, symbol: str) -> int:
+    """以股票各字段 bin 文件的总大小作为计算开销"""
+    return sum(path.stat().st_size for path in calculator._get_bin_files(symbol).values() if path.exists())
+
+
+def shard_suffix(shard_index: int, num_shards: int) -> str:
+    return f"shard-{shard_index}-of-{num_shards}"
+
+
+def shard_output_path(output_file, shard_index: int, num_shards: int) -> str:
+    """分片输出文件名：out.csv -> out.shard-0-of-4.csv"""
+    path = Path(output_file)
+    return str(path.with_name(f"{path.stem}.{shard_suffix(shard_index, num_shards)}{path.suffix}"))
+
+
+def merge_shards(output_file, num_shards: int, store_root=None) -> Dict:
+    """
+    校验并合并各分片的输出清单（不改写数据文件）
+
+    校验内容: 分片是否齐全、分片数和股票范围哈希是否一致、清单与输出文件是否匹配、
+    分片之间是否有重复股票。合并结果写入 <output>.shards.json，记录每个分片文件及其
+    校验和、行数，以及所有股票所在的分片和日期范围。指定 store_root 时同时把各分片的
+    指标存储索引合并为 index.json（分区文件本身不变）。
+
+    Returns:
+    --------
+    Dict: 合并后的清单内容
+
+    Raises:
+    -------
+    ValueError: 校验失败
+    """
+    shard_infos = []
+    symbols = {}
+    columns = []
+    expected_hash = None
+    errors = []
+
+    for shard_index in range(num_shards):
+        shard_file = shard_output_path(output_file, shard_index, num_shards)
+        manifest = OutputManifest.load(shard_file)
+        if manifest is None:
+            errors.append(f"分片 {shard_index}: 清单缺失或与输出文件不一致 ({shard_file})")
+            continue
+        shard = manifest.shard or {}
+        if shard.get("shard_index") != shard_index or shard.get("num_shards") != num_shards:
+            errors.append(f"分片 {shard_index}: 清单中的分片信息不匹配 ({shard})")
+            continue
+        if expected_hash is None:
+            expected_hash = shard.get("universe_hash")
+        elif shard.get("universe_hash") != expected_hash:
+            errors.append(f"分片 {shard_index}: 股票范围与其他分片不一致")
+
+        for symbol, info in manifest.symbols.items():
+            if symbol in symbols:
+                errors.append(f"股票 {symbol} 同时出现在分片 {symbols[symbol]['shard']} 和 {shard_index}")
+                continue
+            symbols[symbol] = dict(info, shard=shard_index)
+        columns.extend(col for col in manifest.columns if col not in columns)
+
+        stat = os.stat(shard_file)
+        shard_infos.append(
+            {
+                "shard_index": shard_index,
+                "file": Path(shard_file).name,
+                "file_size": stat.st_size,
+                "checksum": manifest.checksum,
+                "row_count": manifest.row_count,
+                "symbol_count": len(manifest.symbols),
+                "header_rows": manifest.header_rows,
+                "columns": manifest.columns,
+            }
+        )
+
+    if errors:
+        raise ValueError("分片校验失败:\n  " + "\n  ".join(errors))
+
+    combined = {
+        "schema_version": OutputManifest.SCHEMA_VERSION,
+        "num_shards": num_shards,
+        "universe_hash": expected_hash,
+        "columns": columns,
+        "row_count": sum(info["row_count"] for info in shard_infos),
+        "min_date": min((info["min_date"] for info in symbols.values() if info["min_date"]), default=None),
+        "max_date": max((info["max_date"] for info in symbols.values() if info["max_date"]), default=None),
+        "shards": shard_infos,
+        "symbols": symbols,
+        "created_at": datetime.now().isoformat(),
+    }
+    output_path = Path(output_file)
+    combined_path = output_path.with_name(output_path.name + ".shards.json")
+    tmp_path = combined_path.with_name(combined_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(combined, f, ensure_ascii=False)
+    os.replace(tmp_path, combined_path)
+
+    if store_root is not None:
+        merge_store_indexes(store_root, num_shards)
+    return combined
+
+
+def merge_store_indexes(store_root, num_shards: int) -> Optional[Path]:
+    """把各分片的指标存储索引（index.shard-i-of-n.json）合并为 index.json"""
+    # 延迟导入：只有使用指标存储时才需要 pyarrow
+    from indicator_store import IndicatorStore
+
+    store_root = Path(store_root)
+    merged = {"schema_version": IndicatorStore.SCHEMA_VERSION, "symbols": {}}
+    for shard_index in range(num_shards):
+        index_path = store_root / IndicatorStore.shard_index_file(shard_index, num_shards)
+        if not index_path.exists():
+            raise ValueError(f"缺少分片索引: {index_path}")
+        with open(index_path, "r", encoding="utf-8") as f:
+            merged["symbols"].update(json.load(f).get("symbols", {}))
+
+    merged["updated_at"] = datetime.now().isoformat()
+    index_path = store_root / IndicatorStore.INDEX_FILE
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    return index_path
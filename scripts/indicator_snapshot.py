@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能使用硬链接/复制
+    fcntl = None
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """尝试写时复制克隆（btrfs/xfs 等支持），失败时返回 False"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if dst.exists():
+            dst.unlink()
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_or_copy(src, dst) -> str:
+    """
+    以最省空间的方式复制文件: reflink -> 硬链接 -> 完整复制
+
+    Returns:
+    --------
+    str: 实际使用的方式 "reflink" / "hardlink" / "copy"
+    """
+    src, dst = Path(src), Path(dst)
+    if _reflink(src, dst):
+        return "reflink"
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+class SnapshotBackup:
+    """
+    输出文件的快照备份
+
+    每个快照是备份目录下的一个子目录 snapshot_<时间戳>_<名称>，其中包含输出文件
+    （或分区目录中的每个分区文件）及其清单，通过 reflink/硬链接创建，几乎不占用额外空间。
+    只能完整复制时，与上一个快照相同（大小和 mtime 一致）的分区直接硬链接到上一个快照的文件，
+    只有变化的分区会被复制。快照目录中的 snapshot.json 记录每个文件的大小和 mtime，
+    恢复时只替换发生变化的分区。
+
+    注意: 硬链接快照与输出文件共享数据，写入输出文件必须先写临时文件再 os.replace。
+    """
+
+    PREFIX = "snapshot_"
+    INFO_FILE = "snapshot.json"
+    # 旧版本的完整复制备份
+    LEGACY_PATTERN = "backup_*.csv"
+
+    def __init__(self, backup_dir):
+        self.backup_dir = Path(backup_dir)
+
+    @staticmethod
+    def _sidecars(target: Path) -> List[Path]:
+        """随输出文件一起备份的附属文件（如输出清单）"""
+        return sorted(target.parent.glob(target.name + ".*.json"))
+
+    @staticmethod
+    def _collect_files(target: Path) -> Dict[str, Path]:
+        """相对路径 -> 实际路径；target 为目录时表示分区输出"""
+        if target.is_dir():
+            return {path.relative_to(target).as_posix(): path for path in sorted(target.rglob("*")) if path.is_file()}
+        files = {target.name: target}
+        for sidecar in SnapshotBackup._sidecars(target):
+            files[sidecar.name] = sidecar
+        return files
+
+    def _latest_info(self, target: Path) -> Optional[Dict]:
+        for snapshot in self.list_snapshots():
+            info = self.read_info(snapshot)
+            if info and info.get("source") == str(target.resolve()):
+                return dict(info, path=snapshot)
+        return None
+
+    def create(self, target, run_id: Optional[str] = None) -> Optional[Path]:
+        """
+        为输出文件或分区目录创建快照，target 不存在时返回 None
+
+        同一次计算中创建的多个快照（如输出文件和指标存储）使用相同的 run_id，清理时按一次运行计数
+        """
+        target = Path(target)
+        if not target.exists():
+            return None
+
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        snapshot = self.backup_dir / f"{self.PREFIX}{timestamp}_{target.name}"
+        tmp_snapshot = snapshot.with_name(snapshot.name + ".tmp")
+        tmp_snapshot.mkdir()
+
+        previous = self._latest_info(target)
+        files_info = {}
+        methods = {}
+        try:
+            for relpath, path in self._collect_files(target).items():
+                stat = path.stat()
+                dst = tmp_snapshot / "data" / relpath
+                dst.parent.mkdir(parents=True, exist_ok=True)
+
+                prev_file = previous["files"].get(relpath) if previous else None
+                method = None
+                if (
+                    prev_file is not None
+                    and prev_file["size"] == stat.st_size
+                    and prev_file["mtime_ns"] == stat.st_mtime_ns
+                ):
+                    # 分区未变化: 与上一个快照共享
+                    try:
+                        os.link(previous["path"] / "data" / relpath, dst)
+                        method = "shared"
+                    except OSError:
+                        method = None
+                if method is None:
+                    method = link_or_copy(path, dst)
+
+                methods[method] = methods.get(method, 0) + 1
+                files_info[relpath] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "method": method}
+
+            info = {
+                "source": str(target.resolve()),
+                "kind": "dir" if target.is_dir() else "file",
+                "created_at": datetime.now().isoformat(),
+                "created_ts": time.time(),
+                "run_id": run_id,
+                "files": files_info,
+                "methods": methods,
+            }
+            with open(tmp_snapshot / self.INFO_FILE, "w", encoding="utf-8") as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_snapshot, snapshot)
+        except Exception:
+            shutil.rmtree(tmp_snapshot, ignore_errors=True)
+            raise
+        return snapshot
+
+    def read_info(self, snapshot) -> Optional[Dict]:
+        try:
+            with open(Path(snapshot) / self.INFO_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_snapshots(self) -> List[Path]:
+        """快照目录列表（新的在前）"""
+        if not self.backup_dir.exists():
+            return []
+        snapshots = [
+            path for path in self.backup_dir.glob(self.PREFIX + "*") if path.is_dir() and not path.name.endswith(".tmp")
+        ]
+        return sorted(snapshots, key=lambda p: p.name, reverse=True)
+
+    def list_backups(self) -> List[Path]:
+        """快照和旧版完整复制备份（新的在前）"""
+        if not self.backup_dir.exists():
+            return []
+        backups = self.list_snapshots() + list(self.backup_dir.glob(self.LEGACY_PATTERN))
+        return sorted(backups, key=lambda p: p.stat().st_mtime, reverse=True)
+
+    def _run_key(self, backup: Path) -> str:
+        """备份所属的运行：同一 run_id 的快照为一组，其余备份各自为一组"""
+        if backup.is_dir():
+            info = self.read_info(backup)
+            if info and info.get("run_id"):
+                return info["run_id"]
+        return str(backup)
+
+    def prune(self, keep_last: Optional[int] = None, max_age_days: Optional[float] = None) -> List[Path]:
+        """
+        按保留策略删除旧备份
+
+        Parameters:
+        -----------
+        keep_last : Optional[int]
+            最多保留最近几次运行的备份（同一次运行的快照合计为一次），None 表示不限制
+        max_age_days : Optional[float]
+            超过该天数的备份被删除，None 表示不限制
+
+        Returns:
+        --------
+        List[Path]: 被删除的备份
+        """
+        backups = self.list_backups()
+        now = time.time()
+        removed = []
+        run_index = {}
+        for backup in backups:
+            run = run_index.setdefault(self._run_key(backup), len(run_index))
+            too_many = keep_last is not None and run >= keep_last
+            too_old = max_age_days is not None and now - backup.stat().st_mtime > max_age_days * 86400
+            if not (too_many or too_old):
+                continue
+            if backup.is_dir():
+                shutil.rmtree(backup)
+            else:
+                backup.unlink()
+            removed.append(backup)
+        return removed
+
+    def restore(self, backup, target) -> Dict[str, int]:
+        """
+        从快照（或旧版备份文件）恢复，只替换发生变化的文件
+
+        Returns:
+        --------
+        Dict[str, int]: {"restored": 替换的文件数, "unchanged": 未变化的文件数, "removed": 删除的多余文件数}
+        """
+        backup, target = Path(backup), Path(target)
+        stats = {"restored": 0, "unchanged": 0, "removed": 0}
+
+        if backup.is_file():
+            # 旧版完整复制备份
+            self._replace_file(backup, target)
+            stats["restored"] = 1
+            return stats
+
+        info = self.read_info(backup)
+        if info is None:
+            raise ValueError(f"无效的快照: {backup}")
+
+        if info["kind"] == "dir":
+            base = target
+            current = self._collect_files(target) if target.exists() else {}
+        else:
+            base = target.parent
+            # 快照中的文件名以原输出文件名保存，恢复到新名称时同步重命名
+            source_name = Path(info["source"]).name
+            renamed = {
+                relpath: target.name + relpath[len(source_name) :]
+                for relpath in info["files"]
+                if relpath.startswith(source_name)
+            }
+            current = {path.name: path for path in [target] + self._sidecars(target) if path.exists()}
+
+        for relpath, file_info in info["files"].items():
+            dst_rel = renamed.get(relpath, relpath) if info["kind"] == "file" else relpath
+            dst = base / dst_rel
+            existing = current.pop(dst_rel, None)
+            if existing is not None:
+                stat = existing.stat()
+                if stat.st_size == file_info["size"] and stat.st_mtime_ns == file_info["mtime_ns"]:
+                    stats["unchanged"] += 1
+                    continue
+            self._replace_file(backup / "data" / relpath, dst)
+            stats["restored"] += 1
+
+        # 快照之后新增的分区（或附属文件）
+        for path in current.values():
+            path.unlink()
+            stats["removed"] += 1
+        return stats
+
+    @staticmethod
+    def _replace_file(src: Path, dst: Path):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".restore.tmp")
+        if tmp.exists():
+            tmp.unlink()
+        link_or_copy(src, tmp)
+        os.replace(tmp, dst)
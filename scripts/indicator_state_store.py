@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+
+class IndicatorStateStore:
+    """
+    增量计算状态存储
+    使用SQLite (WAL模式) 替代 metadata.json / stock_status.json / data_hashes.json / date_ranges.json，
+    按股票逐行更新、事务提交，支持多个计算进程同时读写同一个缓存目录
+    """
+
+    DB_FILE_NAME = "state.sqlite"
+    SCHEMA_VERSION = 4
+
+    # 旧版JSON缓存文件 -> 对应的数据表
+    LEGACY_JSON_FILES = {
+        "metadata": "metadata.json",
+        "stock_status": "stock_status.json",
+        "data_hashes": "data_hashes.json",
+        "date_ranges": "date_ranges.json",
+    }
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS store_info (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS stock_status (
+            symbol TEXT PRIMARY KEY,
+            last_update TEXT,
+            success INTEGER NOT NULL DEFAULT 0,
+            rows INTEGER NOT NULL DEFAULT 0,
+            indicators_count INTEGER NOT NULL DEFAULT 0,
+            indicators_version TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_stock_status_needs_update
+            ON stock_status (success, indicators_count, last_update);
+        DROP TABLE IF EXISTS data_hashes;
+        CREATE TABLE IF NOT EXISTS bin_fingerprints (
+            symbol TEXT NOT NULL,
+            feature TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            full_hash TEXT NOT NULL,
+            tail_hash TEXT NOT NULL,
+            head_hash TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (symbol, feature)
+        );
+        CREATE TABLE IF NOT EXISTS date_ranges (
+            symbol TEXT PRIMARY KEY,
+            start_date TEXT,
+            end_date TEXT,
+            last_update TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_date_ranges_end_date ON date_ranges (end_date);
+    """
+
+    def __init__(self, cache_dir, timeout: float = 30.0):
+        """
+        Parameters:
+        -----------
+        cache_dir : str or Path
+            缓存目录，数据库文件为 cache_dir/state.sqlite
+        timeout : float
+            等待其他进程释放写锁的最长时间（秒）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_FILE_NAME
+
+        # isolation_level=None: 由 transaction() 显式控制事务边界
+        self._conn = sqlite3.connect(str(self.db_path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        with self.transaction():
+            for statement in self._SCHEMA.split(";"):
+                if statement.strip():
+                    self._conn.execute(statement)
+            self._migrate_schema()
+            self._set_info("schema_version", str(self.SCHEMA_VERSION))
+
+        self._migrate_legacy_json()
+
+    def _migrate_schema(self):
+        """旧版数据库补充新增的列（v3: stock_status.indicators_version, v4: bin_fingerprints.head_hash）"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(stock_status)").fetchall()}
+        if "indicators_version" not in columns:
+            self._conn.execute("ALTER TABLE stock_status ADD COLUMN indicators_version TEXT")
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(bin_fingerprints)").fetchall()}
+        if "head_hash" not in columns:
+            # 旧记录没有头部哈希，下次文件变长时按 MODIFIED 处理
+            self._conn.execute("ALTER TABLE bin_fingerprints ADD COLUMN head_hash TEXT NOT NULL DEFAULT ''")
+
+    @contextmanager
+    def transaction(self):
+        """写事务（可嵌套，最外层提交）；BEGIN IMMEDIATE 保证并发进程间的写入串行化"""
+        with self._lock:
+            outermost = self._depth == 0
+            if outermost:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self._conn
+            except BaseException:
+                self._depth -= 1
+                if outermost:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._depth -= 1
+                if outermost:
+                    self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _get_info(self, key: str) -> Optional[str]:
+        rows = self._query("SELECT value FROM store_info WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+    def _set_info(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO store_info (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    # 元数据
+    def get_metadata(self) -> Dict:
+        """读取全部元数据"""
+        return {row["key"]: json.loads(row["value"]) for row in self._query("SELECT key, value FROM metadata")}
+
+    def set_metadata(self, metadata: Dict):
+        """写入元数据（逐键覆盖）"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO metadata (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in metadata.items()],
+            )
+
+    # 股票状态
+    def get_stock_status(self, symbol: str) -> Optional[Dict]:
+        """读取单只股票的处理状态，不存在时返回None"""
+        rows = self._query(
+            "SELECT last_update, success, rows, indicators_count, indicators_version FROM stock_status "
+            "WHERE symbol = ?",
+            (symbol,),
+        )
+        if not rows:
+            return None
+        status = dict(rows[0])
+        status["success"] = bool(status["success"])
+        return status
+
+    def update_stock_status(
+        self,
+        symbol: str,
+        success: bool,
+        rows: int,
+        indicators_count: int,
+        last_update: str,
+        date_range: Optional[tuple] = None,
+        indicators_version: Optional[str] = None,
+        fingerprints: Optional[Dict[str, Dict]] = None,
+    ):
+        """
+        在同一个事务中更新股票状态和日期范围
+
+        indicators_version 为各指标族代码版本（JSON），用于判断指标代码是否变化；
+        fingerprints 为本次计算所基于的数据文件指纹，仅在成功时一并写入，
+        失败时保留旧指纹，下次仍能检测到数据变化
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO stock_status (symbol, last_update, success, rows, indicators_count, indicators_version) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET last_update = excluded.last_update, "
+                "success = excluded.success, rows = excluded.rows, indicators_count = excluded.indicators_count, "
+                "indicators_version = excluded.indicators_version",
+                (symbol, last_update, int(bool(success)), int(rows), int(indicators_count), indicators_version),
+            )
+            if date_range:
+                conn.execute(
+                    "INSERT INTO date_ranges (symbol, start_date, end_date, last_update) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(symbol) DO UPDATE SET start_date = excluded.start_date, "
+                    "end_date = excluded.end_date, last_update = excluded.last_update",
+                    (symbol, str(date_range[0]), str(date_range[1]), last_update),
+                )
+            if success and fingerprints:
+                self.set_fingerprints(symbol, fingerprints)
+
+    def count_stock_status(self) -> Dict[str, int]:
+        """统计成功/失败的股票数量"""
+        rows = self._query(
+            "SELECT COALESCE(SUM(success = 1), 0) AS processed, COALESCE(SUM(success = 0), 0) AS failed "
+            "FROM stock_status"
+        )
+        return {"processed": rows[0]["processed"], "failed": rows[0]["failed"]}
+
+    def get_symbols_needing_update(self, expected_indicators_count: int, stale_before: str) -> Set[str]:
+        """
+        通过索引查询状态层面需要重新计算的股票：
+        上次处理失败、指标数量与预期不符、或最后更新时间早于 stale_before
+        """
+        rows = self._query(
+            "SELECT symbol FROM stock_status WHERE success = 0 OR indicators_count != ? OR last_update < ?",
+            (int(expected_indicators_count), stale_before),
+        )
+        return {row["symbol"] for row in rows}
+
+    def list_processed_ranges(self) -> Dict[str, Dict]:
+        """列出处理成功且有日期范围记录的股票"""
+        rows = self._query(
+            "SELECT s.symbol, s.rows, d.start_date, d.end_date FROM stock_status s "
+            "JOIN date_ranges d ON d.symbol = s.symbol "
+            "WHERE s.success = 1 AND d.start_date IS NOT NULL AND d.end_date IS NOT NULL"
+        )
+        return {
+            row["symbol"]: {"start_date": row["start_date"], "end_date": row["end_date"], "rows": row["rows"]}
+            for row in rows
+        }
+
+    # 数据指纹与日期范围
+    def get_fingerprints(self, symbol: str) -> Dict[str, Dict]:
+        """读取一只股票各数据文件的指纹: 字段名 -> {size, mtime_ns, full_hash, tail_hash, head_hash}"""
+        keys = ("size", "mtime_ns", "full_hash", "tail_hash", "head_hash")
+        rows = self._query(
+            "SELECT feature, size, mtime_ns, full_hash, tail_hash, head_hash FROM bin_fingerprints WHERE symbol = ?",
+            (symbol,),
+        )
+        return {row["feature"]: {k: row[k] for k in keys} for row in rows}
+
+    def set_fingerprints(self, symbol: str, fingerprints: Dict[str, Dict]):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO bin_fingerprints "
+                "(symbol, feature, size, mtime_ns, full_hash, tail_hash, head_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        symbol,
+                        feature,
+                        fp["size"],
+                        fp["mtime_ns"],
+                        fp["full_hash"],
+                        fp["tail_hash"],
+                        fp.get("head_hash", ""),
+                    )
+                    for feature, fp in fingerprints.items()
+                ],
+            )
+
+    def get_date_range(self, symbol: str) -> Dict:
+        """读取股票上次计算时的日期范围，不存在时返回空字典"""
+        rows = self._query("SELECT start_date, end_date, last_update FROM date_ranges WHERE symbol = ?", (symbol,))
+        return dict(rows[0]) if rows else {}
+
+    def clear(self):
+        """清空全部状态（保留表结构）"""
+        with self.transaction() as conn:
+            for table in ["metadata", "stock_status", "bin_fingerprints", "date_ranges"]:
+                conn.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # 旧版JSON缓存迁移
+    def _load_legacy_json(self, name: str) -> Dict:
+        json_file = self.cache_dir / self.LEGACY_JSON_FILES[name]
+        if not json_file.exists():
+            return {}
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except Exception as e:
+            logger.warning(f"读取旧版缓存 {json_file} 失败: {e}")
+            return {}
+
+    def _migrate_legacy_json(self):
+        """首次打开时把旧版JSON缓存导入数据库（只执行一次）"""
+        if self._get_info("legacy_json_migrated"):
+            return
+        legacy_files = [self.cache_dir / f for f in self.LEGACY_JSON_FILES.values()]
+        if not any(f.exists() for f in legacy_files):
+            self._set_info("legacy_json_migrated", "1")
+            return
+
+        # 旧版MD5数据哈希与文件指纹不兼容，不迁移；首次运行时会重新建立指纹
+        metadata = self._load_legacy_json("metadata")
+        stock_status = self._load_legacy_json("stock_status")
+        date_ranges = self._load_legacy_json("date_ranges")
+
+        with self.transaction() as conn:
+            if metadata:
+                self.set_metadata(metadata)
+            conn.executemany(
+                "INSERT OR REPLACE INTO stock_status (symbol, last_update, success, rows, indicators_count) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        symbol,
+                        status.get("last_update"),
+                        int(bool(status.get("success", False))),
+                        int(status.get("rows", 0) or 0),
+                        int(status.get("indicators_count", 0) or 0),
+                    )
+                    for symbol, status in stock_status.items()
+                ],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO date_ranges (symbol, start_date, end_date, last_update) VALUES (?, ?, ?, ?)",
+                [
+                    (symbol, info.get("start_date"), info.get("end_date"), info.get("last_update"))
+                    for symbol, info in date_ranges.items()
+                ],
+            )
+            self._set_info("legacy_json_migrated", "1")
+
+        logger.info(f"✅ 已从旧版JSON缓存迁移状态: {len(stock_status)} 只股票状态, {len(date_ranges)} 条日期范围")
+
+    def remove_legacy_json(self):
+        """删除旧版JSON缓存文件"""
+        for file_name in self.LEGACY_JSON_FILES.values():
+            json_file = self.cache_dir / file_name
+            if json_file.exists():
+                json_file.unlink()
+                logger.info(f"删除旧版缓存文件: {json_file}")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+except ImportError:  # pyarrow 为可选依赖，只有使用指标存储时才需要
+    pa = None
+
+from indicator_fingerprint import hash_file
+from indicator_manifest import format_date
+
+
+class IndicatorStore:
+    """
+    按股票分区的指标结果存储
+
+    目录结构:
+        <root>/index.json                 股票 -> 分区文件、行数、起止日期、校验和
+        <root>/partitions/<SYMBOL>.arrow  Arrow IPC 文件（不压缩，按日期排序）
+
+    读取时通过内存映射打开分区（零拷贝），按日期二分定位切片并只投影需要的列，
+    最近使用的分区保存在 LRU 缓存中。
+    """
+
+    SCHEMA_VERSION = 1
+    INDEX_FILE = "index.json"
+    PARTITION_DIR = "partitions"
+    KEY_COLUMNS = ["Date", "Symbol"]
+
+    def __init__(self, root, max_cached_partitions: int = 256, index_file: str = None):
+        if pa is None:
+            raise ImportError("指标存储需要安装 pyarrow: pip install pyarrow")
+        self.root = Path(root)
+        self.partition_dir = self.root / self.PARTITION_DIR
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        # 分片运行时每个分片写自己的索引，最后由 merge_shards 合并为 index.json
+        self.index_path = self.root / (index_file or self.INDEX_FILE)
+        self.max_cached_partitions = max_cached_partitions
+
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._index = {"schema_version": self.SCHEMA_VERSION, "symbols": {}}
+        self._index_mtime_ns = None
+        # batch() 期间已写入分区、尚未保存到索引文件的股票
+        self._batch_depth = 0
+        self._pending: Dict[str, Dict] = {}
+        self._refresh_index()
+
+    @staticmethod
+    def shard_index_file(shard_index: int, num_shards: int) -> str:
+        return f"index.shard-{shard_index}-of-{num_shards}.json"
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+    def _refresh_index(self):
+        """index.json 被其他进程更新时重新读取"""
+        try:
+            mtime_ns = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._index_mtime_ns:
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("schema_version") != self.SCHEMA_VERSION:
+            raise ValueError(f"不支持的指标存储版本: {index.get('schema_version')}")
+        index["symbols"].update(self._pending)
+        self._index = index
+        self._index_mtime_ns = mtime_ns
+
+    def _save_index(self):
+        self._index["updated_at"] = datetime.now().isoformat()
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime_ns = os.stat(self.index_path).st_mtime_ns
+
+    @contextmanager
+    def batch(self):
+        """
+        批量写入分区，退出时只保存一次索引（可嵌套，最外层保存）::
+
+            with store.batch():
+                for symbol, df in results:
+                    store.write_symbol(symbol, df)
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def flush(self):
+        """保存 batch() 中尚未写入索引文件的分区信息"""
+        with self._lock:
+            if not self._pending:
+                return
+            self._refresh_index()
+            self._save_index()
+            self._pending.clear()
+
+    @property
+    def symbols(self) -> List[str]:
+        with self._lock:
+            self._refresh_index()
+            return sorted(self._index["symbols"])
+
+    def get_symbol_info(self, symbol: str) -> Optional[Dict]:
+        """获取股票分区信息 {file, rows, min_date, max_date, checksum}"""
+        with self._lock:
+            self._refresh_index()
+            return self._index["symbols"].get(str(symbol))
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """统一列类型：Date 转为日期类型并排序，其余对象列尽量转为数值"""
+        df = df.copy()
+        df["Date"] = pd.to_datetime(df["Date"], format="mixed")
+        df["Symbol"] = df["Symbol"].astype(str)
+        for col in df.columns:
+            if col in IndicatorStore.KEY_COLUMNS or df[col].dtype != object:
+                continue
+            converted = pd.to_numeric(df[col], errors="coerce")
+            # 只在没有丢失非空值时才转换，否则按字符串保存
+            if converted.notna().sum() == df[col].replace("", np.nan).notna().sum():
+                df[col] = converted
+            else:
+                df[col] = df[col].astype(str)
+        return df.sort_values("Date", kind="stable").reset_index(drop=True)
+
+    def symbol_writer(self, symbol: str) -> "PartitionWriter":
+        """
+        分块写入（覆盖）一只股票的分区，供按时间分块计算的高频数据使用::
+
+            with store.symbol_writer("AAPL") as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+
+        所有数据块写完后才替换分区文件并更新索引；没有写入任何数据或发生异常时分区保持不变
+        """
+        return PartitionWriter(self, str(symbol))
+
+    def write_symbol(self, symbol: str, df: pd.DataFrame):
+        """写入（覆盖）一只股票的分区，df 需包含 Date 和 Symbol 列"""
+        with self.symbol_writer(symbol) as writer:
+            writer.write(df)
+
+    def _commit_partition(self, symbol: str, path: Path, rows: int, min_date, max_date):
+        info = {
+            "file": f"{self.PARTITION_DIR}/{path.name}",
+            "rows": rows,
+            "min_date": format_date(min_date) if min_date is not None else None,
+            "max_date": format_date(max_date) if max_date is not None else None,
+            "checksum": hash_file(path),
+        }
+        with self._lock:
+            self._cache.pop(symbol, None)
+            if self._batch_depth:
+                self._pending[symbol] = info
+                self._index["symbols"][symbol] = info
+                return
+            self._refresh_index()
+            self._index["symbols"][symbol] = info
+            self._save_index()
+
+    def write_frame(self, df: pd.DataFrame, symbols: Optional[Iterable[str]] = None) -> int:
+        """
+        按股票拆分写入
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            包含多只股票的指标结果
+        symbols : Optional[Iterable[str]]
+            只写入这些股票，None 表示写入全部
+
+        Returns:
+        --------
+        int: 写入的分区数量
+        """
+        if df is None or df.empty:
+            return 0
+        wanted = set(map(str, symbols)) if symbols is not None else None
+        count = 0
+        with self.batch():
+            for symbol, group in df.groupby(df["Symbol"].astype(str), sort=False):
+                if wanted is not None and symbol not in wanted:
+                    continue
+                self.write_symbol(symbol, group)
+                count += 1
+        return count
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    def _open_partition(self, symbol: str):
+        """返回 (table, dates)，dates 为 datetime64 数组；使用 LRU 缓存"""
+        info = self._index["symbols"].get(symbol)
+        if info is None:
+            return None
+
+        cached = self._cache.get(symbol)
+        if cached is not None and cached[0] == info["checksum"]:
+            self._cache.move_to_end(symbol)
+            return cached[1], cached[2]
+
+        source = pa.memory_map(str(self.root / info["file"]), "r")
+        table = pa.ipc.open_file(source).read_all()
+        dates = table.column("Date").to_numpy()
+
+        self._cache[symbol] = (info["checksum"], table, dates)
+        self._cache.move_to_end(symbol)
+        while len(self._cache) > self.max_cached_partitions:
+            self._cache.popitem(last=False)
+        return table, dates
+
+    @staticmethod
+    def _select_columns(names: List[str], columns: Optional[Iterable[str]]) -> List[str]:
+        """列投影，支持通配符（如 "ALPHA158_*"）"""
+        if columns is None:
+            return names
+        selected = []
+        for pattern in columns:
+            matches = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+            selected.extend(name for name in matches if name not in selected)
+        return selected
+
+    def load(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        start=None,
+        end=None,
+        columns: Optional[Iterable[str]] = None,
+        as_numpy: bool = False,
+    ) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+        """
+        查询指标
+
+        Parameters:
+        -----------
+        symbols : Optional[Iterable[str]]
+            股票列表，None 表示全部
+        start, end : 日期（含），None 表示不限制
+        columns : Optional[Iterable[str]]
+            需要的指标列，支持通配符；Date 和 Symbol 总是返回
+        as_numpy : bool
+            为 True 时返回 {"symbols", "dates", "columns", "values"}，values 为 float64 二维数组
+
+        Returns:
+        --------
+        pd.DataFrame 或 numpy 数据块
+        """
+        start = np.datetime64(pd.Timestamp(start)) if start is not None else None
+        end = np.datetime64(pd.Timestamp(end)) if end is not None else None
+
+        slices = []
+        with self._lock:
+            self._refresh_index()
+            if symbols is None:
+                symbols = sorted(self._index["symbols"])
+            for symbol in symbols:
+                opened = self._open_partition(str(symbol))
+                if opened is None:
+                    continue
+                table, dates = opened
+                lo = np.searchsorted(dates, start, side="left") if start is not None else 0
+                hi = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+                if lo >= hi:
+                    continue
+                value_columns = [
+                    name for name in self._select_columns(table.column_names, columns) if name not in self.KEY_COLUMNS
+                ]
+                slices.append(table.slice(lo, hi - lo).select(self.KEY_COLUMNS + value_columns))
+
+        if not slices:
+            if as_numpy:
+                return {
+                    "symbols": np.array([], dtype=object),
+                    "dates": np.array([], dtype="datetime64[ns]"),
+                    "columns": [],
+                    "values": np.empty((0, 0)),
+                }
+            return pd.DataFrame(columns=self.KEY_COLUMNS)
+
+        try:
+            combined = pa.concat_tables(slices, promote_options="default")
+        except TypeError:  # pyarrow < 14
+            combined = pa.concat_tables(slices, promote=True)
+
+        if as_numpy:
+            # numpy 数据块只包含数值列
+            value_columns = [
+                field.name
+                for field in combined.schema
+                if field.name not in self.KEY_COLUMNS
+                and (
+                    pa.types.is_integer(field.type)
+                    or pa.types.is_floating(field.type)
+                    or pa.types.is_boolean(field.type)
+                    or pa.types.is_null(field.type)
+                )
+            ]
+            values = np.empty((combined.num_rows, len(value_columns)), dtype=np.float64)
+            for i, name in enumerate(value_columns):
+                values[:, i] = combined.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+            return {
+                "symbols": combined.column("Symbol").to_numpy(zero_copy_only=False),
+                "dates": combined.column("Date").to_numpy(),
+                "columns": value_columns,
+                "values": values,
+            }
+        return combined.to_pandas()
+
+
+class PartitionWriter:
+    """IndicatorStore.symbol_writer 返回的分区写入器，数据先写入临时文件，close 时替换分区"""
+
+    def __init__(self, store: IndicatorStore, symbol: str):
+        self.store = store
+        self.symbol = symbol
+        self.path = store.partition_dir / f"{symbol}.arrow"
+        # 先写临时文件再替换，保证读取方和快照备份看到的都是完整文件
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.rows = 0
+        self.min_date = None
+        self.max_date = None
+        self._sink = None
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame):
+        """追加一个数据块（需包含 Date 和 Symbol 列，日期晚于已写入的数据块）"""
+        if df is None or df.empty:
+            return
+        df = IndicatorStore._prepare_frame(df)
+        if self._writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._schema = table.schema
+            self._sink = pa.OSFile(str(self.tmp_path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        else:
+            # 后续数据块按第一个数据块的字段类型写入
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+        self.rows += len(df)
+        if self.min_date is None:
+            self.min_date = df["Date"].iloc[0]
+        self.max_date = df["Date"].iloc[-1]
+
+    def _close_files(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def close(self):
+        """完成写入: 替换分区文件并更新索引"""
+        if self._writer is None:
+            return
+        self._close_files()
+        os.replace(self.tmp_path, self.path)
+        self.store._commit_partition(self.symbol, self.path, self.rows, self.min_date, self.max_date)
+
+    def abort(self):
+        self._close_files()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -5,13 +5,12 @@ import os
 import pandas as pd
 import numpy as np
 import talib
-import struct
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Dict, Iterator, List, Optional, Tuple, Set
 from loguru import logger
 import warnings
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 import threading
 import time
 from functools import partial
@@ -20,9 +19,20 @@ import csv
 import gc
 import logging
 import json
-import hashlib
 from datetime import datetime, timedelta
 import shutil
+import contextlib
+
+from indicator_financial import FinancialDataLoader
+from indicator_fingerprint import BinFingerprinter
+from indicator_manifest import ChecksumWriter, OutputManifest
+from indicator_prefetch import SymbolPrefetcher
+from indicator_result_cache import FamilyResultCache, code_version, frame_fingerprint
+from indicator_snapshot import SnapshotBackup
+from indicator_store import IndicatorStore
+from indicator_sharding import (assign_shards, bin_size_cost, merge_shards, shard_output_path,
+                                shard_suffix, universe_hash)
+from indicator_state_store import IndicatorStateStore
 
 warnings.filterwarnings('ignore', category=RuntimeWarning)
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -250,6 +260,36 @@ class QlibIndicatorsEnhancedCalculator:
         'CurrentRatio': '流动比率',
     }
     
+    # 预期的指标数量，指标数量变化时增量模式会重新计算
+    EXPECTED_INDICATORS_COUNT = 695
+    # 超过该天数未更新的股票会被重新计算
+    STALE_UPDATE_DAYS = 30
+    # 历史数据被改写（非尾部追加）时的更新原因
+    DATA_MODIFIED_REASON = "历史数据被修改"
+    # 指标代码变化时的更新原因（需要重新计算全部日期）
+    INDICATOR_CODE_CHANGED_REASON = "指标代码变化"
+    # 指标族 -> 计算方法；各指标族的代码版本由方法源码（含调用的辅助方法）计算
+    INDICATOR_FAMILIES = {
+        'Alpha158': 'calculate_alpha158_indicators',
+        'Alpha360': 'calculate_alpha360_indicators',
+        'Technical': 'calculate_all_technical_indicators',
+        'Candlestick': 'calculate_candlestick_patterns',
+        'Financial': 'calculate_financial_indicators',
+        'Volatility': 'calculate_volatility_indicators',
+    }
+    # 时间窗口/增量计算时在开始日期之前额外读取的交易日数，保证滚动窗口和指数平滑类指标充分预热
+    LOOKBACK_ROWS = 250
+    # 参与计算的价格字段（对应 features/<symbol>/<field>.<freq>.bin）
+    PRICE_FEATURES = ['open', 'high', 'low', 'close', 'volume']
+    # 支持的数据频率（对应 calendars/<freq>.txt）
+    SUPPORTED_FREQS = ['day', '1min', '5min']
+    # 各频率默认的分块行数，None 表示不分块；分钟线数据比日线长数百倍，需要分块计算以控制内存
+    DEFAULT_CHUNK_ROWS = {'day': None, '1min': 20000, '5min': 20000}
+    # 累计型指标: 分块计算时需要把上一块的末值接续到下一块
+    CUMULATIVE_COLUMNS = ['OBV', 'AD']
+    # 以数组下标表示的指标: 分块计算时需要加上数据块的起始位置
+    POSITION_COLUMNS = ['MAXINDEX', 'MININDEX']
+    
     @classmethod
     def _generate_alpha360_labels(cls):
         """生成Alpha360指标的中文标签"""
@@ -392,7 +432,11 @@ class QlibIndicatorsEnhancedCalculator:
     def __init__(self, data_dir: str = r"D:\stk_data\trd\us_data", financial_data_dir: str = None, 
                  max_workers: int = None, enable_parallel: bool = True,
                  cache_dir: str = "indicator_cache", enable_incremental: bool = False,
-                 start_date: str = None, end_date: str = None, recent_days: int = None):
+                 start_date: str = None, end_date: str = None, recent_days: int = None,
+                 indicator_store_dir: str = None, shard_index: int = None, num_shards: int = None,
+                 freq: str = 'day', chunk_rows: int = None, instruments: str = None,
+                 enable_result_cache: bool = False, prefetch_depth: int = 4, io_threads: int = 2,
+                 financial_cache_size: int = 256):
         """
         初始化增强版指标计算器
         
@@ -416,6 +460,27 @@ class QlibIndicatorsEnhancedCalculator:
             计算结束日期 (YYYY-MM-DD格式)
         recent_days : int
             计算最近N天的数据
+        indicator_store_dir : str
+            指标存储目录（按股票分区的Arrow文件，供 load_indicators 查询），为空时不写入
+        shard_index : int
+            分片序号（从0开始），与 num_shards 一起使用时只计算本分片的股票
+        num_shards : int
+            分片总数；按 bin 文件大小均衡分配股票，结果在各机器上一致
+        freq : str
+            数据频率: day / 1min / 5min，读取 <field>.<freq>.bin 和 calendars/<freq>.txt
+        chunk_rows : int
+            分块计算的行数（带预热数据），None 时使用该频率的默认值
+        instruments : str
+            股票池名称（如 csi300、sp500），读取 instruments/<market>.txt，
+            只计算其中的股票及其成分股期间；为空时计算 features 目录下的全部股票
+        enable_result_cache : bool
+            启用按指标族的结果缓存（cache_dir/family_results），输入数据和指标族代码都未变化时直接复用
+        prefetch_depth : int
+            后台预读的股票数量（读取与计算重叠），0 表示不预读
+        io_threads : int
+            预读使用的 I/O 线程数
+        financial_cache_size : int
+            财务数据 LRU 缓存保存的数据份数（按需读取，不在初始化时加载全部财务数据）
         """
         self.data_dir = Path(data_dir)
         self.features_dir = self.data_dir / "features"
@@ -425,29 +490,60 @@ class QlibIndicatorsEnhancedCalculator:
         self.enable_parallel = enable_parallel
         self.enable_incremental = enable_incremental
         
+        # 数据频率；指标窗口按K线根数计算（分钟线的 SMA_20 即20根分钟K线）
+        if freq not in self.SUPPORTED_FREQS:
+            raise ValueError(f"不支持的数据频率: {freq} (可选: {', '.join(self.SUPPORTED_FREQS)})")
+        self.freq = freq
+        self.chunk_rows = chunk_rows if chunk_rows is not None else self.DEFAULT_CHUNK_ROWS[freq]
+        if self.chunk_rows is not None and self.chunk_rows <= 0:
+            raise ValueError("chunk_rows 必须大于0")
+        
+        # 股票池: 股票 -> [(开始日期, 结束日期次日)]，None 表示不限制
+        self.instruments = instruments
+        self.instrument_spans = self._load_instruments(instruments) if instruments else None
+        
         # 时间窗口设置
         self.start_date = None
         self.end_date = None
         self._setup_time_window(start_date, end_date, recent_days)
         
+        # 分片设置
+        self.num_shards = num_shards or 1
+        self.shard_index = shard_index or 0
+        if not 0 <= self.shard_index < self.num_shards:
+            raise ValueError(f"分片序号 {self.shard_index} 超出范围 (分片数: {self.num_shards})")
+        self.shard_info = None
+        
+        # 指标存储（按股票分区，支持按股票/日期/列快速查询）；分片运行时各分片写自己的索引
+        self.indicator_store = None
+        if indicator_store_dir:
+            index_file = (IndicatorStore.shard_index_file(self.shard_index, self.num_shards)
+                          if self.num_shards > 1 else None)
+            self.indicator_store = IndicatorStore(indicator_store_dir, index_file=index_file)
+        
+        # 输入数据预读
+        self.prefetch_depth = prefetch_depth
+        self.io_threads = io_threads
+        
+        # 按指标族的结果缓存
+        self.result_cache = FamilyResultCache(Path(cache_dir) / "family_results") if enable_result_cache else None
+        self._family_versions = None
+        
         # 增量计算相关
         if self.enable_incremental:
             self.cache_dir = Path(cache_dir)
-            self.cache_dir.mkdir(exist_ok=True)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
             
-            # 缓存文件路径
-            self.metadata_file = self.cache_dir / "metadata.json"
-            self.stock_status_file = self.cache_dir / "stock_status.json"
-            self.data_hashes_file = self.cache_dir / "data_hashes.json"
-            self.date_ranges_file = self.cache_dir / "date_ranges.json"
             self.output_backup_dir = self.cache_dir / "output_backups"
             self.output_backup_dir.mkdir(exist_ok=True)
+            self.backup_manager = SnapshotBackup(self.output_backup_dir)
             
-            # 加载或初始化元数据
+            # 状态存储（SQLite），首次打开时自动迁移旧版JSON缓存
+            self.state_store = IndicatorStateStore(self.cache_dir)
+            self.fingerprinter = BinFingerprinter(self.state_store)
+            # 规划阶段检测到的新指纹，待该股票计算成功后与状态一起写入
+            self._pending_fingerprints = {}
             self.metadata = self._load_metadata()
-            self.stock_status = self._load_stock_status()
-            self.data_hashes = self._load_data_hashes()
-            self.date_ranges = self._load_date_ranges()
             
             logger.info(f"增量计算模式已启用，缓存目录: {self.cache_dir}")
         
@@ -455,16 +551,25 @@ class QlibIndicatorsEnhancedCalculator:
         self._indicators_cache = {}
         self._indicators_cache_lock = threading.Lock()
         
-        # 财务数据缓存
-        self._financial_data_cache = {}
-        self._financial_data_cache_lock = threading.Lock()
+        # 财务数据（按需读取 + LRU 缓存）
+        self.financial_loader = (
+            FinancialDataLoader(self.financial_data_dir, max_cached=financial_cache_size)
+            if self.financial_data_dir else None
+        )
+        
+        # 交易日历缓存
+        self._calendar = None
+        self._calendar_lock = threading.Lock()
         
         # 线程本地存储
         self._local = threading.local()
         
-        # 加载财务数据
-        if self.financial_data_dir:
-            self._load_financial_data()
+        if self.financial_loader is not None:
+            available = self.financial_loader.available_types()
+            if available:
+                logger.info(f"财务数据目录: {self.financial_data_dir} (按需读取: {', '.join(available)})")
+            else:
+                logger.warning(f"📁 财务数据目录为空或不存在: {self.financial_data_dir}")
         
         logger.info(f"增强版指标计算器初始化完成 (并行: {enable_parallel}, 增量: {enable_incremental})")
         
@@ -504,65 +609,84 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"时间窗口设置失败: {e}")
             raise ValueError(f"无效的时间窗口参数: {e}")
     
-    def _apply_time_window_filter(self, df: pd.DataFrame) -> pd.DataFrame:
-        """根据时间窗口过滤数据"""
-        if df.empty:
-            return df
-            
-        if self.start_date is None and self.end_date is None:
-            return df
-            
-        try:
-            # 确保DataFrame有日期索引或Date列
-            if 'Date' in df.columns:
-                # 如果有Date列，使用Date列进行过滤
-                df_filtered = df.copy()
-                date_series = pd.to_datetime(df_filtered['Date'])
-                
-                if self.start_date is not None:
-                    mask_start = date_series >= self.start_date
-                    df_filtered = df_filtered[mask_start]
-                    
-                if self.end_date is not None:
-                    mask_end = date_series <= self.end_date
-                    df_filtered = df_filtered[mask_end]
-                    
-            elif isinstance(df.index, pd.DatetimeIndex):
-                # 如果索引是日期索引，直接使用索引过滤
-                df_filtered = df.copy()
-                
-                if self.start_date is not None:
-                    df_filtered = df_filtered[df_filtered.index >= self.start_date]
-                    
-                if self.end_date is not None:
-                    df_filtered = df_filtered[df_filtered.index <= self.end_date]
-                    
-            else:
-                logger.warning("数据没有日期索引或Date列，无法应用时间窗口过滤")
-                return df
-                
-            if not df_filtered.empty:
-                original_len = len(df)
-                filtered_len = len(df_filtered)
-                logger.debug(f"时间窗口过滤: {original_len} -> {filtered_len} 行")
-                
-            return df_filtered
-            
-        except Exception as e:
-            logger.error(f"时间窗口过滤失败: {e}")
-            return df
+    def _window_positions(self, dates, start_date=None, lookback_rows: int = 0) -> Tuple[int, int]:
+        """
+        计算时间窗口在有序日期序列中的位置范围 [lo, hi)
 
+        Parameters:
+        -----------
+        dates : 有序的日期序列（DatetimeIndex 或 datetime64 数组）
+        start_date : 额外的开始日期（如增量开始日期），与时间窗口的开始日期取较晚者
+        lookback_rows : int
+            开始位置之前额外保留的行数（指标预热）
+        """
+        start = self.start_date
+        if start_date is not None:
+            start_date = pd.Timestamp(start_date)
+            start = start_date if start is None else max(start, start_date)
+        lo = int(dates.searchsorted(np.datetime64(start), side='left')) if start is not None else 0
+        hi = int(dates.searchsorted(np.datetime64(self.end_date), side='right')) if self.end_date is not None else len(dates)
+        return max(0, lo - lookback_rows), hi
+
+    def _load_instruments(self, market: str) -> Dict[str, List[Tuple[pd.Timestamp, pd.Timestamp]]]:
+        """
+        读取股票池文件 instruments/<market>.txt（每行: 股票代码 开始日期 结束日期）
+        
+        同一只股票可以有多行（多次调入调出）；结束日期当天全部计入，分钟线数据同样适用
+        """
+        instruments_file = self.data_dir / "instruments" / f"{market}.txt"
+        if not instruments_file.exists():
+            raise ValueError(f"股票池文件不存在: {instruments_file}")
+        
+        spans = {}
+        with open(instruments_file, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                symbol, start, end = parts[0].upper(), pd.Timestamp(parts[1]), pd.Timestamp(parts[2])
+                spans.setdefault(symbol, []).append((start, end.normalize() + pd.Timedelta(days=1)))
+        
+        for symbol_spans in spans.values():
+            symbol_spans.sort()
+        logger.info(f"📋 股票池 {market}: {len(spans)} 只股票")
+        return spans
+    
+    def _span_in_window(self, span_start: pd.Timestamp, span_end: pd.Timestamp) -> bool:
+        """成分期间 [span_start, span_end) 是否与时间窗口有交集"""
+        if self.start_date is not None and span_end <= self.start_date:
+            return False
+        if self.end_date is not None and span_start > self.end_date:
+            return False
+        return True
+    
+    def _symbol_row_ranges(self, symbol: str, dates, start_date=None) -> List[Tuple[int, int]]:
+        """
+        股票需要计算的行范围列表 [(lo, hi)]: 时间窗口（及 start_date）与股票池成分期间的交集
+        
+        指定股票池时，不在成分期间内的数据只作为预热数据读取，不参与输出
+        """
+        lo, hi = self._window_positions(dates, start_date)
+        if self.instrument_spans is None:
+            return [(lo, hi)] if lo < hi else []
+        
+        ranges = []
+        for span_start, span_end in self.instrument_spans.get(symbol.upper(), []):
+            span_lo = max(lo, int(dates.searchsorted(np.datetime64(span_start), side='left')))
+            span_hi = min(hi, int(dates.searchsorted(np.datetime64(span_end), side='left')))
+            if span_lo >= span_hi:
+                continue
+            if ranges and span_lo <= ranges[-1][1]:
+                # 重叠或相邻的成分期间合并为一段
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], span_hi))
+            else:
+                ranges.append((span_lo, span_hi))
+        return ranges
+    
     # 增量计算相关方法
     def _load_metadata(self) -> Dict:
         """加载元数据"""
-        if self.metadata_file.exists():
-            try:
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"加载元数据失败: {e}")
-        
-        return {
+        metadata = {
             "last_update": None,
             "total_stocks": 0,
             "processed_stocks": 0,
@@ -570,129 +694,86 @@ class QlibIndicatorsEnhancedCalculator:
             "output_file": None,
             "last_output_backup": None
         }
+        try:
+            metadata.update(self.state_store.get_metadata())
+        except Exception as e:
+            logger.warning(f"加载元数据失败: {e}")
+        return metadata
     
     def _save_metadata(self):
         """保存元数据"""
         try:
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+            self.state_store.set_metadata(self.metadata)
         except Exception as e:
             logger.error(f"保存元数据失败: {e}")
     
-    def _load_stock_status(self) -> Dict:
-        """加载股票状态"""
-        if self.stock_status_file.exists():
-            try:
-                with open(self.stock_status_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"加载股票状态失败: {e}")
-        
-        return {}
-    
-    def _save_stock_status(self):
-        """保存股票状态"""
-        try:
-            with open(self.stock_status_file, 'w', encoding='utf-8') as f:
-                json.dump(self.stock_status, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"保存股票状态失败: {e}")
-    
-    def _load_data_hashes(self) -> Dict:
-        """加载数据哈希值"""
-        if self.data_hashes_file.exists():
-            try:
-                with open(self.data_hashes_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"加载数据哈希失败: {e}")
-        
-        return {}
-    
-    def _save_data_hashes(self):
-        """保存数据哈希值"""
-        try:
-            with open(self.data_hashes_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data_hashes, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"保存数据哈希失败: {e}")
-    
-    def _load_date_ranges(self) -> Dict:
-        """加载日期范围信息"""
-        if self.date_ranges_file.exists():
-            try:
-                with open(self.date_ranges_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"加载日期范围失败: {e}")
-        
-        return {}
-    
-    def _save_date_ranges(self):
-        """保存日期范围信息"""
-        try:
-            with open(self.date_ranges_file, 'w', encoding='utf-8') as f:
-                json.dump(self.date_ranges, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"保存日期范围失败: {e}")
+    def _get_bin_files(self, symbol: str) -> Dict[str, Path]:
+        """获取股票各价格字段的二进制文件路径"""
+        symbol_dir = self.features_dir / symbol.lower()
+        return {feature: symbol_dir / f"{feature}.{self.freq}.bin" for feature in self.PRICE_FEATURES}
     
-    def _calculate_data_hash(self, symbol: str, date_range: Optional[Tuple[str, str]] = None) -> str:
-        """计算股票数据的哈希值"""
-        try:
-            data = self.read_qlib_binary_data(symbol)
-            if data is None or data.empty:
-                return ""
-            
-            # 如果指定了日期范围，只计算该范围内的数据哈希
-            if date_range:
-                start_date, end_date = date_range
-                data = data[(data.index >= start_date) & (data.index <= end_date)]
-                if data.empty:
-                    return ""
-            
-            # 计算关键字段的哈希值
-            key_fields = ['Open', 'High', 'Low', 'Close', 'Volume']
-            hash_data = data[key_fields].fillna(0).values.tobytes()
-            return hashlib.md5(hash_data).hexdigest()
-            
-        except Exception as e:
-            logger.warning(f"计算 {symbol} 数据哈希失败: {e}")
-            return ""
+    def _get_calendar(self) -> Optional[pd.DatetimeIndex]:
+        """读取并缓存交易日历（整个计算器生命周期只解析一次）"""
+        with self._calendar_lock:
+            if self._calendar is None:
+                calendar_file = self.data_dir / "calendars" / f"{self.freq}.txt"
+                if calendar_file.exists():
+                    with open(calendar_file, 'r') as f:
+                        calendar_dates = [line.strip() for line in f if line.strip()]
+                    self._calendar = pd.DatetimeIndex(pd.to_datetime(calendar_dates))
+            return self._calendar
     
     def _get_stock_date_range(self, symbol: str) -> Tuple[Optional[str], Optional[str]]:
-        """获取股票的数据日期范围"""
+        """
+        获取股票的数据日期范围（限定在时间窗口和股票池成分期间内）
+        与 read_qlib_binary_data 的日期对齐方式一致（数据与日历尾部对齐），
+        只根据文件大小和缓存的日历推算，不读取文件内容
+        """
         try:
-            data = self.read_qlib_binary_data(symbol)
-            if data is None or data.empty:
+            layout = self._get_price_layout(symbol)
+            if layout is None:
                 return None, None
+            _, dates = layout
             
-            return str(data.index.min()), str(data.index.max())
+            ranges = self._symbol_row_ranges(symbol, dates)
+            if not ranges:
+                return None, None
+            
+            return str(dates[ranges[0][0]]), str(dates[ranges[-1][1] - 1])
             
         except Exception as e:
             logger.warning(f"获取 {symbol} 日期范围失败: {e}")
             return None, None
     
-    def _is_data_changed(self, symbol: str, date_range: Optional[Tuple[str, str]] = None) -> bool:
-        """检查股票数据是否发生变化"""
-        current_hash = self._calculate_data_hash(symbol, date_range)
-        
-        # 构建哈希键
-        if date_range:
-            hash_key = f"{symbol}_{date_range[0]}_{date_range[1]}"
-        else:
-            hash_key = symbol
-        
-        previous_hash = self.data_hashes.get(hash_key, "")
-        
-        if current_hash != previous_hash:
-            self.data_hashes[hash_key] = current_hash
-            return True
+    def _detect_data_change(self, symbol: str) -> str:
+        """
+        基于分层文件指纹检测股票数据变化
         
-        return False
+        Returns:
+        --------
+        str: BinFingerprinter.UNCHANGED / APPENDED / MODIFIED / NEW
+        """
+        try:
+            result, updates = self.fingerprinter.inspect(symbol, self._get_bin_files(symbol))
+            if result == BinFingerprinter.UNCHANGED:
+                # 内容未变，只刷新了 mtime，可以直接写入
+                if updates:
+                    self.state_store.set_fingerprints(symbol, updates)
+            elif updates:
+                self._pending_fingerprints[symbol] = updates
+            return result
+        except Exception as e:
+            logger.warning(f"检测 {symbol} 数据变化失败: {e}")
+            return BinFingerprinter.MODIFIED
+    
+    def _is_data_changed(self, symbol: str) -> bool:
+        """检查股票数据是否发生变化"""
+        return self._detect_data_change(symbol) in (BinFingerprinter.APPENDED, BinFingerprinter.MODIFIED)
     
     def _get_stock_last_update(self, symbol: str) -> Optional[str]:
         """获取股票最后更新时间"""
-        return self.stock_status.get(symbol, {}).get('last_update')
+        status = self.state_store.get_stock_status(symbol)
+        return status.get('last_update') if status else None
     
     def _update_stock_status(self, symbol: str, success: bool, rows: int = 0, 
                            date_range: Optional[Tuple[str, str]] = None):
@@ -710,23 +791,35 @@ class QlibIndicatorsEnhancedCalculator:
         date_range : Optional[Tuple[str, str]]
             日期范围 (start_date, end_date)
         """
-        if symbol not in self.stock_status:
-            self.stock_status[symbol] = {}
-        
-        self.stock_status[symbol].update({
-            'last_update': datetime.now().isoformat(),
-            'success': success,
-            'rows': rows,
-            'indicators_count': 695  # 预期的指标数量
-        })
+        # 状态和日期范围在同一个事务中按行写入
+        self.state_store.update_stock_status(
+            symbol,
+            success=success,
+            rows=rows,
+            indicators_count=self.EXPECTED_INDICATORS_COUNT,
+            last_update=datetime.now().isoformat(),
+            date_range=date_range,
+            indicators_version=json.dumps(self.get_family_versions(), sort_keys=True),
+            fingerprints=self._pending_fingerprints.pop(symbol, None)
+        )
+    
+    def _commit_stock_statuses(self, statuses: List[Tuple], output_saved: bool):
+        """
+        输出写入之后，在一个事务中提交本次运行各股票的状态、日期范围和指纹
         
-        # 更新日期范围信息
-        if date_range:
-            self.date_ranges[symbol] = {
-                'start_date': date_range[0],
-                'end_date': date_range[1],
-                'last_update': datetime.now().isoformat()
-            }
+        输出未能写入时，计算成功的股票按失败记录（不写入新指纹），下次运行会重新计算
+        """
+        with self.state_store.transaction():
+            for symbol, success, rows, date_range in statuses:
+                if success and not output_saved:
+                    success, rows = False, 0
+                self._update_stock_status(symbol, success, rows, date_range)
+    
+    def _commit_pending_fingerprints(self, symbol: str):
+        """无需计算的股票直接写入规划阶段检测到的指纹"""
+        updates = self._pending_fingerprints.pop(symbol, None)
+        if updates:
+            self.state_store.set_fingerprints(symbol, updates)
     
     def _needs_update(self, symbol: str, force_update: bool = False, 
                      date_range: Optional[Tuple[str, str]] = None) -> Tuple[bool, str]:
@@ -750,13 +843,16 @@ class QlibIndicatorsEnhancedCalculator:
         if force_update:
             return True, "强制更新"
         
-        # 检查数据是否发生变化（基于数据哈希）
-        if self._is_data_changed(symbol, date_range):
-            return True, "数据发生变化"
+        # 检查数据是否发生变化（基于分层文件指纹；首次建立指纹时交由后续检查判断）
+        data_change = self._detect_data_change(symbol)
+        if data_change == BinFingerprinter.MODIFIED:
+            return True, self.DATA_MODIFIED_REASON
+        if data_change == BinFingerprinter.APPENDED:
+            return True, "数据发生变化（新增数据）"
         
         # 检查是否有新的日期范围
         if date_range:
-            current_range = self.date_ranges.get(symbol, {})
+            current_range = self.state_store.get_date_range(symbol)
             current_start = current_range.get('start_date')
             current_end = current_range.get('end_date')
             
@@ -776,49 +872,72 @@ class QlibIndicatorsEnhancedCalculator:
                 return True, f"日期范围变化（可能是数据修正）"
         
         # 检查是否从未处理过
-        if symbol not in self.stock_status:
+        status = self.state_store.get_stock_status(symbol)
+        if status is None:
             return True, "首次处理"
         
         # 检查上次处理是否成功
-        if not self.stock_status[symbol].get('success', False):
+        if not status.get('success', False):
             return True, "上次处理失败"
         
-        # 检查是否有指标数量变化（可能算法更新）
-        current_indicators_count = self.stock_status[symbol].get('indicators_count', 0)
-        expected_indicators_count = 695  # 预期的指标数量
-        if current_indicators_count != expected_indicators_count:
-            return True, f"指标数量变化（当前: {current_indicators_count}, 预期: {expected_indicators_count}）"
+        # 检查指标代码是否变化（比较各指标族的代码版本；旧版状态没有版本记录时比较指标数量）
+        recorded_versions = status.get('indicators_version')
+        if recorded_versions:
+            recorded_versions = json.loads(recorded_versions)
+            changed_families = [
+                family for family, version in self.get_family_versions().items()
+                if recorded_versions.get(family) != version
+            ]
+            if changed_families:
+                return True, f"{self.INDICATOR_CODE_CHANGED_REASON}（{', '.join(changed_families)}）"
+        else:
+            current_indicators_count = status.get('indicators_count', 0)
+            expected_indicators_count = self.EXPECTED_INDICATORS_COUNT
+            if current_indicators_count != expected_indicators_count:
+                return True, f"指标数量变化（当前: {current_indicators_count}, 预期: {expected_indicators_count}）"
         
         # 检查最后更新时间（可选：基于时间间隔的更新）
-        last_update = self.stock_status[symbol].get('last_update')
+        last_update = status.get('last_update')
         if last_update:
             try:
                 last_update_time = datetime.fromisoformat(last_update)
                 days_since_update = (datetime.now() - last_update_time).days
                 # 如果超过30天没有更新，建议重新计算（可选策略）
-                if days_since_update > 30:
+                if days_since_update > self.STALE_UPDATE_DAYS:
                     return True, f"长时间未更新（{days_since_update}天）"
             except Exception:
                 pass
         
         return False, "无需更新"
     
-    def _backup_output_file(self, output_file: str) -> str:
-        """备份输出文件"""
+    def _backup_output_file(self, output_file: str, run_id: Optional[str] = None) -> str:
+        """备份输出文件（快照备份，优先使用reflink/硬链接）；run_id 相同的快照清理时按一次运行计数"""
         if not os.path.exists(output_file):
             return None
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = self.output_backup_dir / f"backup_{timestamp}_{Path(output_file).name}"
-        
         try:
-            shutil.copy2(output_file, backup_file)
-            logger.info(f"✅ 备份文件: {backup_file}")
-            return str(backup_file)
+            snapshot = self.backup_manager.create(output_file, run_id=run_id)
+            methods = self.backup_manager.read_info(snapshot)["methods"]
+            logger.info(f"✅ 备份快照: {snapshot} ({', '.join(f'{k}: {v}' for k, v in methods.items())})")
+            return str(snapshot)
         except Exception as e:
             logger.error(f"❌ 备份文件失败: {e}")
             return None
     
+    def prune_backups(self, keep_last: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """按保留策略清理旧备份，返回删除的备份数量"""
+        if not self.enable_incremental:
+            return 0
+        
+        try:
+            removed = self.backup_manager.prune(keep_last, max_age_days)
+            for backup in removed:
+                logger.info(f"🗑️ 删除过期备份: {backup}")
+            return len(removed)
+        except Exception as e:
+            logger.error(f"❌ 清理备份失败: {e}")
+            return 0
+    
     def _merge_with_existing_output(self, new_data: pd.DataFrame, output_file: str) -> pd.DataFrame:
         """
         与现有输出文件合并
@@ -869,8 +988,13 @@ class QlibIndicatorsEnhancedCalculator:
                 return existing_data
             
             # 创建复合键：股票+日期（基于"Stock X Date X Indicator"维度）
-            existing_data['composite_key'] = existing_data['Symbol'].astype(str) + '_' + existing_data['Date'].astype(str)
-            new_data['composite_key'] = new_data['Symbol'].astype(str) + '_' + new_data['Date'].astype(str)
+            # 日期统一格式化后再比较：现有文件中的日期是字符串，新数据中是时间戳
+            def composite_key(df):
+                dates = pd.to_datetime(df['Date'], format='mixed', errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+                return df['Symbol'].astype(str) + '_' + dates.fillna(df['Date'].astype(str))
+            
+            existing_data['composite_key'] = composite_key(existing_data)
+            new_data['composite_key'] = composite_key(new_data)
             
             # 统计重复记录
             duplicate_keys = set(existing_data['composite_key']) & set(new_data['composite_key'])
@@ -915,109 +1039,79 @@ class QlibIndicatorsEnhancedCalculator:
                 logger.error(f"❌ 读取现有数据也失败: {read_error}")
                 return new_data if not new_data.empty else pd.DataFrame()
     
-    def _load_financial_data(self):
-        """加载财务数据到内存缓存"""
-        try:
-            if self.financial_data_dir is None:
-                logger.warning("未指定财务数据目录，将使用估算值")
-                return
-                
-            logger.info(f"正在加载财务数据从: {self.financial_data_dir}")
-            
-            # 加载各种财务数据
-            data_types = ['info', 'financials', 'balance_sheet', 'cashflow', 'dividends', 'financial_ratios']
-            
-            for data_type in data_types:
-                data_path = self.financial_data_dir / data_type
-                if data_path.exists():
-                    self._financial_data_cache[data_type] = {}
-                    
-                    # 读取CSV文件
-                    csv_files = list(data_path.glob("*.csv"))
-                    if csv_files:
-                        for csv_file in csv_files:
-                            symbol = csv_file.stem.upper()
-                            try:
-                                df = pd.read_csv(csv_file, index_col=0)
-                                self._financial_data_cache[data_type][symbol] = df
-                            except Exception as e:
-                                logger.warning(f"Failed to load {data_type} for {symbol}: {e}")
-                        
-                        logger.info(f"✅ 加载 {data_type} 数据: {len(self._financial_data_cache[data_type])} 只股票")
-                    else:
-                        logger.warning(f"📁 {data_type} 目录为空")
-                else:
-                    logger.warning(f"📁 财务数据目录不存在: {data_path}")
-                    
-        except Exception as e:
-            logger.error(f"加载财务数据失败: {e}")
-            self._financial_data_cache = {}
+    def consolidate_financial_data(self) -> Dict[str, int]:
+        """把财务数据合并为每种数据类型一个 Arrow 文件（之后按内存映射读取，启动无需扫描CSV）"""
+        if self.financial_loader is None:
+            logger.warning("未指定财务数据目录，无需合并")
+            return {}
+        return self.financial_loader.consolidate()
     
-    def read_qlib_binary_data(self, symbol: str) -> Optional[pd.DataFrame]:
-        """读取Qlib二进制数据"""
+    def _get_symbol_dates(self, length: int) -> pd.DatetimeIndex:
+        """长度为 length 的数据对应的日期（数据与日历尾部对齐）"""
+        calendar_dates = self._get_calendar()
+        if calendar_dates is not None:
+            # The data in qlib is typically aligned with the calendar in reverse order
+            if length <= len(calendar_dates):
+                return calendar_dates[len(calendar_dates) - length:]
+            # If data is longer than calendar, extend backwards
+            latest_date = calendar_dates[-1] if len(calendar_dates) else pd.to_datetime('2025-06-27')
+            return pd.bdate_range(end=latest_date, periods=length, freq='B')
+        # Fallback: generate business days ending at a reasonable date
+        return pd.bdate_range(end=pd.to_datetime('2025-06-27'), periods=length, freq='B')
+    
+    def _get_price_layout(self, symbol: str) -> Optional[Tuple[Dict[str, Path], pd.DatetimeIndex]]:
+        """获取股票的价格 bin 文件及每一行对应的日期，不读取文件内容"""
         symbol_dir = self.features_dir / symbol.lower()
-        
         if not symbol_dir.exists():
             return None
         
-        features = ['open', 'high', 'low', 'close', 'volume']
+        bin_files = {
+            feature: bin_file
+            for feature, bin_file in self._get_bin_files(symbol).items()
+            if bin_file.exists()
+        }
+        if not bin_files:
+            return None
+        
+        # Ensure all arrays have the same length
+        length = min(bin_file.stat().st_size for bin_file in bin_files.values()) // 4
+        return bin_files, self._get_symbol_dates(length)
+    
+    @staticmethod
+    def _read_price_rows(bin_files: Dict[str, Path], dates: pd.DatetimeIndex, lo: int, hi: int) -> pd.DataFrame:
+        """只读取每个 bin 文件中 [lo, hi) 行对应的字节范围"""
+        count = max(0, hi - lo)
         data_dict = {}
+        for feature, bin_file in bin_files.items():
+            values = np.fromfile(bin_file, dtype='<f4', count=count, offset=lo * 4).astype(np.float64)
+            values[~np.isfinite(values)] = 0.0
+            data_dict[feature.title()] = values
+        return pd.DataFrame(data_dict, index=pd.DatetimeIndex(dates[lo:lo + count]))
+    
+    def read_qlib_binary_data(self, symbol: str, start_date: Optional[str] = None,
+                              lookback_rows: int = 0) -> Optional[pd.DataFrame]:
+        """
+        读取Qlib二进制数据
+        
+        时间窗口（以及 start_date）先换算为日历位置，每个 bin 文件只读取对应的字节范围，
+        短窗口的读取开销与窗口长度成正比
         
+        Parameters:
+        -----------
+        symbol : str
+            股票代码
+        start_date : Optional[str]
+            额外的开始日期（如增量开始日期），与时间窗口的开始日期取较晚者
+        lookback_rows : int
+            开始日期之前额外读取的行数，供需要历史数据预热的指标使用
+        """
         try:
-            for feature in features:
-                bin_file = symbol_dir / f"{feature}.day.bin"
-                if bin_file.exists():
-                    with open(bin_file, 'rb') as f:
-                        values = []
-                        while True:
-                            data = f.read(4)
-                            if not data:
-                                break
-                            value = struct.unpack('<f', data)[0]
-                            if not np.isnan(value) and not np.isinf(value):
-                                values.append(value)
-                            else:
-                                values.append(0.0)
-                        data_dict[feature.title()] = values
-            
-            if not data_dict:
+            layout = self._get_price_layout(symbol)
+            if layout is None:
                 return None
-            
-            # Ensure all arrays have the same length
-            lengths = [len(v) for v in data_dict.values()]
-            if len(set(lengths)) > 1:
-                min_length = min(lengths)
-                for key in data_dict:
-                    data_dict[key] = data_dict[key][:min_length]
-            
-            df = pd.DataFrame(data_dict)
-            
-            # Read actual calendar dates from qlib
-            calendar_file = self.data_dir / "calendars" / "day.txt"
-            if calendar_file.exists():
-                with open(calendar_file, 'r') as f:
-                    calendar_dates = [line.strip() for line in f.readlines()]
-                calendar_dates = [pd.to_datetime(date) for date in calendar_dates if date.strip()]
-                
-                # The data in qlib is typically aligned with the calendar in reverse order
-                if len(df) <= len(calendar_dates):
-                    dates = calendar_dates[-len(df):]
-                else:
-                    # If data is longer than calendar, extend backwards
-                    latest_date = calendar_dates[-1] if calendar_dates else pd.to_datetime('2025-06-27')
-                    all_dates = pd.bdate_range(end=latest_date, periods=len(df), freq='B')
-                    dates = all_dates.tolist()
-            else:
-                # Fallback: generate business days ending at a reasonable date
-                end_date = pd.to_datetime('2025-06-27')
-                dates = pd.bdate_range(end=end_date, periods=len(df), freq='B')
-            
-            df.index = pd.DatetimeIndex(dates)
-            
-            # 应用时间窗口过滤
-            df = self._apply_time_window_filter(df)
-            
-            return df
+            bin_files, dates = layout
+            lo, hi = self._window_positions(dates, start_date, lookback_rows)
+            return self._read_price_rows(bin_files, dates, lo, hi)
             
         except Exception as e:
             logger.warning(f"Failed to read binary data {symbol}: {e}")
@@ -1031,34 +1125,50 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"Features directory does not exist: {self.features_dir}")
             return stocks
         
-        for stock_dir in self.features_dir.iterdir():
-            if stock_dir.is_dir():
-                required_files = ['open.day.bin', 'high.day.bin', 'low.day.bin', 'close.day.bin', 'volume.day.bin']
-                if all((stock_dir / file).exists() for file in required_files):
-                    symbol = stock_dir.name.upper()
-                    stocks.append(symbol)
+        if self.instrument_spans is not None:
+            # 只检查成分期间与时间窗口有交集的股票，不遍历整个 features 目录
+            candidates = [
+                self.features_dir / symbol.lower()
+                for symbol, spans in self.instrument_spans.items()
+                if any(self._span_in_window(span_start, span_end) for span_start, span_end in spans)
+            ]
+        else:
+            candidates = [stock_dir for stock_dir in self.features_dir.iterdir() if stock_dir.is_dir()]
+        
+        required_files = [f"{feature}.{self.freq}.bin" for feature in self.PRICE_FEATURES]
+        for stock_dir in candidates:
+            if all((stock_dir / file).exists() for file in required_files):
+                symbol = stock_dir.name.upper()
+                stocks.append(symbol)
         
         logger.info(f"Found {len(stocks)} stocks data")
-        return sorted(stocks)
+        stocks = sorted(stocks)
+        
+        if self.num_shards > 1:
+            stocks = self._select_shard(stocks)
+        return stocks
+    
+    def _select_shard(self, stocks: List[str]) -> List[str]:
+        """按 bin 文件大小均衡分片，返回本分片的股票"""
+        costs = {symbol: bin_size_cost(self, symbol) for symbol in stocks}
+        shard_stocks = assign_shards(costs, self.num_shards)[self.shard_index]
+        self.shard_info = {
+            "shard_index": self.shard_index,
+            "num_shards": self.num_shards,
+            "universe_hash": universe_hash(stocks),
+        }
+        shard_cost = sum(costs[symbol] for symbol in shard_stocks)
+        total_cost = sum(costs.values()) or 1
+        logger.info(f"分片 {shard_suffix(self.shard_index, self.num_shards)}: {len(shard_stocks)} 只股票 "
+                    f"(数据量占比 {shard_cost / total_cost * 100:.1f}%)")
+        return shard_stocks
     
     def get_financial_data(self, symbol: str, data_type: str) -> Optional[pd.DataFrame]:
-        """获取财务数据"""
-        try:
-            # 尝试多种符号格式
-            symbol_variants = [
-                symbol,                        # 原始符号
-                symbol.replace('_', '.'),      # 下划线转点号 (0002_HK -> 0002.HK)
-                symbol.replace('.', '_'),      # 点号转下划线 (0002.HK -> 0002_HK)
-                symbol.upper(),                # 大写
-                symbol.replace('_HK', '.HK'),  # 特定转换
-                symbol.replace('.HK', '_HK')   # 特定转换
-            ]
-            
-            if data_type in self._financial_data_cache:
-                for variant in symbol_variants:
-                    if variant in self._financial_data_cache[data_type]:
-                        return self._financial_data_cache[data_type][variant]
+        """获取财务数据（代码写法统一规范化，如 0002.HK / 0002_hk 视为同一只股票）"""
+        if self.financial_loader is None:
             return None
+        try:
+            return self.financial_loader.get(symbol, data_type)
         except Exception as e:
             logger.warning(f"Failed to get financial data for {symbol}, {data_type}: {e}")
             return None
@@ -1067,6 +1177,30 @@ class QlibIndicatorsEnhancedCalculator:
         """安全除法操作，避免除零错误"""
         return np.where(np.abs(b) > 1e-12, a / b, fill_value)
     
+    @staticmethod
+    def _ref_values(values: np.ndarray, periods: int) -> np.ndarray:
+        """periods 行之前的值（同 Qlib 的 Ref），开头不足 periods 行的位置为 NaN，不回绕到数据末尾"""
+        values = np.asarray(values, dtype=float)
+        shifted = np.full(len(values), np.nan)
+        if periods < len(values):
+            shifted[periods:] = values[:len(values) - periods]
+        return shifted
+    
+    @staticmethod
+    def _frame_stats(data: pd.DataFrame) -> Dict[str, float]:
+        """
+        依赖整段数据（而非滚动窗口）的统计量，供估算财务指标使用
+        
+        分块计算时按整段数据计算一次并传给每个数据块，各数据块使用与不分块时相同的值
+        """
+        volume = data['Volume'].values if 'Volume' in data.columns else np.array([])
+        positive = volume[volume > 0]
+        return {
+            'avg_volume': float(np.mean(positive)) if len(positive) > 0 else 1000000.0,
+            'mean_volume': float(np.mean(volume)) if len(volume) > 0 else 1000000.0,
+            'mean_close': float(np.mean(data['Close'].values)) if len(data) > 0 else float('nan'),
+        }
+    
     def _get_calculated_indicators(self):
         """获取线程本地的指标集合"""
         if not hasattr(self._local, 'calculated_indicators'):
@@ -1270,7 +1404,7 @@ class QlibIndicatorsEnhancedCalculator:
             
             # ROC - Rate of Change
             for d in windows:
-                ref_close = np.roll(close, d)
+                ref_close = self._ref_values(close, d)
                 self._add_indicator(indicators, f'ALPHA158_ROC{d}', self._safe_divide(ref_close, close))
             
             # MA - Simple Moving Average
@@ -1571,7 +1705,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_CLOSE{i}', self._safe_divide(close, close))
                 else:
-                    ref_close = np.roll(close, i)
+                    ref_close = self._ref_values(close, i)
                     self._add_indicator(indicators, f'ALPHA360_CLOSE{i}', self._safe_divide(ref_close, close))
             
             # 2. OPEN 指标 (60个)
@@ -1579,7 +1713,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_OPEN{i}', self._safe_divide(open_price, close))
                 else:
-                    ref_open = np.roll(open_price, i)
+                    ref_open = self._ref_values(open_price, i)
                     self._add_indicator(indicators, f'ALPHA360_OPEN{i}', self._safe_divide(ref_open, close))
             
             # 3. HIGH 指标 (60个)
@@ -1587,7 +1721,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_HIGH{i}', self._safe_divide(high, close))
                 else:
-                    ref_high = np.roll(high, i)
+                    ref_high = self._ref_values(high, i)
                     self._add_indicator(indicators, f'ALPHA360_HIGH{i}', self._safe_divide(ref_high, close))
             
             # 4. LOW 指标 (60个)
@@ -1595,7 +1729,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_LOW{i}', self._safe_divide(low, close))
                 else:
-                    ref_low = np.roll(low, i)
+                    ref_low = self._ref_values(low, i)
                     self._add_indicator(indicators, f'ALPHA360_LOW{i}', self._safe_divide(ref_low, close))
             
             # 5. VWAP 指标 (60个)
@@ -1603,7 +1737,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_VWAP{i}', self._safe_divide(vwap, close))
                 else:
-                    ref_vwap = np.roll(vwap, i)
+                    ref_vwap = self._ref_values(vwap, i)
                     self._add_indicator(indicators, f'ALPHA360_VWAP{i}', self._safe_divide(ref_vwap, close))
             
             # 6. VOLUME 指标 (60个)
@@ -1611,7 +1745,7 @@ class QlibIndicatorsEnhancedCalculator:
                 if i == 0:
                     self._add_indicator(indicators, f'ALPHA360_VOLUME{i}', self._safe_divide(volume, volume + 1e-12))
                 else:
-                    ref_volume = np.roll(volume, i)
+                    ref_volume = self._ref_values(volume, i)
                     self._add_indicator(indicators, f'ALPHA360_VOLUME{i}', self._safe_divide(ref_volume, volume + 1e-12))
             
             # 转换为DataFrame
@@ -1672,10 +1806,16 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算蜡烛图形态失败: {e}")
             return pd.DataFrame()
     
-    def calculate_financial_indicators(self, data: pd.DataFrame, symbol: str) -> pd.DataFrame:
-        """计算财务指标和换手率（约15个）- 使用估算值替代缺失数据"""
+    def calculate_financial_indicators(self, data: pd.DataFrame, symbol: str,
+                                       frame_stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        """
+        计算财务指标和换手率（约15个）- 使用估算值替代缺失数据
+        
+        frame_stats 为整段数据的统计量（见 _frame_stats），为空时由 data 计算
+        """
         try:
             result_data = data.copy()
+            frame_stats = frame_stats or self._frame_stats(data)
             
             # 预先初始化所有财务指标列
             financial_columns = [
@@ -1692,13 +1832,15 @@ class QlibIndicatorsEnhancedCalculator:
             
             # 如果有真实财务数据，使用真实数据
             if info_data is not None and not info_data.empty:
-                result_data = self._calculate_real_financial_indicators(result_data, info_data, balance_sheet_data)
+                result_data = self._calculate_real_financial_indicators(
+                    result_data, info_data, balance_sheet_data, frame_stats
+                )
             else:
                 # 否则使用基于价格和成交量的估算指标
-                result_data = self._calculate_estimated_financial_indicators(result_data, symbol)
+                result_data = self._calculate_estimated_financial_indicators(result_data, symbol, frame_stats)
             
             # 确保所有财务指标列都存在且有默认值
-            result_data = self._ensure_financial_columns_exist(result_data, symbol)
+            result_data = self._ensure_financial_columns_exist(result_data, symbol, frame_stats)
             
             logger.info(f"✅ 完成财务指标计算 (包含估算值)")
             return result_data
@@ -1711,7 +1853,8 @@ class QlibIndicatorsEnhancedCalculator:
                     data[col] = np.nan
             return data
     
-    def _calculate_real_financial_indicators(self, data: pd.DataFrame, info_data: pd.DataFrame, balance_sheet_data: pd.DataFrame) -> pd.DataFrame:
+    def _calculate_real_financial_indicators(self, data: pd.DataFrame, info_data: pd.DataFrame, balance_sheet_data: pd.DataFrame,
+                                             frame_stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
         """使用真实财务数据计算指标"""
         result_data = data.copy()
         
@@ -1811,7 +1954,7 @@ class QlibIndicatorsEnhancedCalculator:
         except Exception as e:
             logger.error(f"使用真实财务数据计算失败: {e}")
             # 如果真实数据计算失败，回退到估算方法
-            result_data = self._calculate_estimated_financial_indicators(result_data, "UNKNOWN")
+            result_data = self._calculate_estimated_financial_indicators(result_data, "UNKNOWN", frame_stats)
         
         return result_data
     
@@ -1836,9 +1979,11 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算真实换手率指标失败: {e}")
             return data
     
-    def _calculate_estimated_financial_indicators(self, data: pd.DataFrame, symbol: str) -> pd.DataFrame:
-        """基于价格和成交量数据估算财务指标"""
+    def _calculate_estimated_financial_indicators(self, data: pd.DataFrame, symbol: str,
+                                                  frame_stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        """基于价格和成交量数据估算财务指标（平均成交量等整段统计量取自 frame_stats）"""
         result_data = data.copy()
+        frame_stats = frame_stats or self._frame_stats(data)
         
         # 获取基础数据
         close = result_data['Close'].values
@@ -1847,7 +1992,7 @@ class QlibIndicatorsEnhancedCalculator:
         low = result_data['Low'].values
         
         # 1. 估算市值 (假设流通股为平均成交量的某个倍数)
-        avg_volume = np.mean(volume[volume > 0]) if len(volume[volume > 0]) > 0 else 1000000
+        avg_volume = frame_stats['avg_volume']
         estimated_shares = avg_volume * 50  # 假设平均成交量是流通股的1/50
         result_data['MarketCap'] = close * estimated_shares
         
@@ -1858,7 +2003,7 @@ class QlibIndicatorsEnhancedCalculator:
         # 3. 估算市盈率 (基于价格趋势，上涨趋势对应高PE)
         price_trend = pd.Series(close).rolling(20).apply(lambda x: np.polyfit(range(len(x)), x, 1)[0] if len(x) > 1 else 0).fillna(0)
         base_pe = 15  # 基准PE
-        result_data['PERatio'] = base_pe + (price_trend / np.mean(close) * 1000)
+        result_data['PERatio'] = base_pe + (price_trend / frame_stats['mean_close'] * 1000)
         result_data['PERatio'] = np.clip(result_data['PERatio'], 5, 50)  # 限制在合理范围
         
         # 4. 估算市销率 (基于成交量活跃度)
@@ -1921,9 +2066,11 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"估算换手率指标失败: {e}")
             return data
     
-    def _ensure_financial_columns_exist(self, data: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    def _ensure_financial_columns_exist(self, data: pd.DataFrame, symbol: str,
+                                        frame_stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
         """确保所有财务指标列都存在且有合理的默认值"""
         result_data = data.copy()
+        frame_stats = frame_stats or self._frame_stats(data)
         
         # 定义所有必需的财务指标列和其默认值
         required_columns = {
@@ -1965,8 +2112,7 @@ class QlibIndicatorsEnhancedCalculator:
                     result_data[col_name] = default_value
                 elif col_name == 'MarketCap':
                     # 估算市值：假设平均股价为当前股价，流通股为成交量的50倍
-                    avg_volume = result_data['Volume'].mean() if 'Volume' in result_data.columns else 1000000
-                    estimated_shares = avg_volume * 50
+                    estimated_shares = frame_stats['mean_volume'] * 50
                     result_data['MarketCap'] = result_data['Close'] * estimated_shares
                 elif col_name.startswith('turnover'):
                     # 只有在换手率指标确实缺失或有问题时才重新计算
@@ -1974,8 +2120,7 @@ class QlibIndicatorsEnhancedCalculator:
                     
                     # 估算换手率相关指标
                     if 'DailyTurnover' not in result_data.columns or result_data['DailyTurnover'].isna().all() or (result_data['DailyTurnover'] == 0).all():
-                        avg_volume = result_data['Volume'].mean() if 'Volume' in result_data.columns else 1000000
-                        estimated_shares = avg_volume * 50
+                        estimated_shares = frame_stats['mean_volume'] * 50
                         result_data['DailyTurnover'] = result_data['Volume'] / estimated_shares
                     
                     # 计算累计和平均换手率
@@ -2026,7 +2171,64 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算波动率指标失败: {e}")
             return pd.DataFrame()
     
-    def calculate_all_indicators_for_stock(self, symbol: str, incremental_start_date: Optional[str] = None) -> Optional[pd.DataFrame]:
+    def get_family_versions(self) -> Dict[str, str]:
+        """各指标族的代码版本（方法源码 + TA-Lib 版本的哈希），计算器生命周期内只计算一次"""
+        if self._family_versions is None:
+            params = {'talib': talib.__version__}
+            self._family_versions = {
+                family: code_version(type(self), [method_name], params)
+                for family, method_name in self.INDICATOR_FAMILIES.items()
+            }
+        return self._family_versions
+    
+    def _financial_fingerprint(self, symbol: str) -> str:
+        """股票财务数据的指纹（财务指标族的缓存键包含该指纹）"""
+        frames = [
+            frame_fingerprint(self.get_financial_data(symbol, data_type))
+            for data_type in (sorted(self.financial_loader.available_types()) if self.financial_loader else [])
+        ]
+        return "|".join(frames)
+    
+    def _calculate_family(self, family: str, symbol: str, price_data: pd.DataFrame,
+                          frame_stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        """
+        计算一个指标族，启用结果缓存时优先读取缓存
+        
+        缓存键: 股票、输入价格数据指纹（财务指标族另加财务数据指纹和整段统计量）、指标族名称、指标族代码版本
+        """
+        method = getattr(self, self.INDICATOR_FAMILIES[family])
+        if family == 'Financial':
+            frame_stats = frame_stats or self._frame_stats(price_data)
+        args = (price_data, symbol, frame_stats) if family == 'Financial' else (price_data,)
+        if self.result_cache is None:
+            return method(*args)
+        
+        input_fingerprint = frame_fingerprint(price_data)
+        if family == 'Financial':
+            input_fingerprint += "|" + self._financial_fingerprint(symbol)
+            input_fingerprint += "|" + json.dumps(frame_stats, sort_keys=True)
+        key = self.result_cache.make_key(symbol, input_fingerprint, family, self.get_family_versions()[family])
+        slot = self.result_cache.slot_name(price_data.index[0] if len(price_data) else None)
+        
+        cached = self.result_cache.get(symbol, family, slot, key)
+        if cached is not None:
+            # 与实际计算一致：登记已有的指标名，后续指标族不再重复添加
+            self._get_calculated_indicators().update(cached.columns)
+            logger.debug(f"♻️ {symbol} - {family}: 使用缓存结果")
+            return cached
+        
+        result = method(*args)
+        if result is not None and not result.empty:
+            self.result_cache.put(symbol, family, slot, key, result)
+        return result
+    
+    def _log_result_cache_stats(self):
+        if self.result_cache is not None:
+            stats = self.result_cache.stats()
+            logger.info(f"♻️ 指标结果缓存: 命中 {stats['hits']}, 未命中 {stats['misses']}")
+    
+    def calculate_all_indicators_for_stock(self, symbol: str, incremental_start_date: Optional[str] = None,
+                                           prefetched: Optional[Dict] = None) -> Optional[pd.DataFrame]:
         """
         为单只股票计算所有指标（支持增量计算）
         
@@ -2036,39 +2238,211 @@ class QlibIndicatorsEnhancedCalculator:
             股票代码
         incremental_start_date : Optional[str]
             增量计算的开始日期，如果提供则只计算该日期之后的数据
+        prefetched : Optional[Dict]
+            prefetch_symbol_inputs 预读的输入数据，为空时在计算线程中读取
         """
         try:
-            # 读取历史价格数据
-            price_data = self.read_qlib_binary_data(symbol)
-            if price_data is None or price_data.empty:
-                logger.warning(f"No price data found for {symbol}")
-                return None
-            
-            # 如果指定了增量开始日期，只计算该日期之后的数据
-            if incremental_start_date:
-                start_date = pd.to_datetime(incremental_start_date)
-                price_data = price_data[price_data.index >= start_date]
-                if price_data.empty:
-                    logger.info(f"{symbol}: 增量日期 {incremental_start_date} 之后没有新数据")
-                    return None
-                logger.info(f"{symbol}: 增量计算 {incremental_start_date} 之后的数据 ({len(price_data)} 行)")
-            
-            # 使用并行计算或顺序计算
-            if self.enable_parallel:
-                return self._calculate_indicators_parallel(symbol, price_data)
+            chunks = list(self.iter_indicator_chunks(symbol, incremental_start_date, prefetched))
+        except Exception:
+            # 任一数据块失败时整只股票视为失败（错误已在 iter_indicator_chunks 中记录），不返回不完整的结果
+            return None
+        if not chunks:
+            return None
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+    
+    def iter_indicator_chunks(self, symbol: str, incremental_start_date: Optional[str] = None,
+                              prefetched: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+        """
+        按时间分块计算单只股票的指标（生成器），每次只在内存中保留一个数据块
+        
+        每个数据块额外读取之前 LOOKBACK_ROWS 行作为预热数据，预热行参与计算但不输出；
+        累计型指标（OBV、AD）接续上一块的末值，下标型指标加上数据块的起始位置，
+        依赖整段数据的统计量（估算财务指标用到的平均成交量等）按整段计算一次后传给每个数据块。
+        EMA、KAMA、希尔伯特变换等递推指标的记忆无限长，预热有限，分块结果与整段计算存在微小差异；
+        其余指标与整段计算一致。chunk_rows 为 None（日线默认）时只有一个数据块。
+        
+        Parameters:
+        -----------
+        symbol : str
+            股票代码
+        incremental_start_date : Optional[str]
+            增量计算的开始日期，如果提供则只计算该日期之后的数据
+        prefetched : Optional[Dict]
+            prefetch_symbol_inputs 预读的输入数据（需使用相同的 incremental_start_date）
+        
+        任一数据块计算失败时抛出异常，调用方需丢弃该股票已产出的数据块
+        """
+        try:
+            if prefetched is not None:
+                bin_files, dates, ranges = prefetched['bin_files'], prefetched['dates'], prefetched['ranges']
+                preloaded = dict(prefetched['chunks'])
             else:
-                return self._calculate_indicators_sequential(symbol, price_data)
+                plan = self._plan_symbol_rows(symbol, incremental_start_date)
+                if plan is None:
+                    logger.warning(f"No price data found for {symbol}")
+                    return
+                bin_files, dates, ranges = plan
+                preloaded = {}
+            
+            if not ranges:
+                if incremental_start_date:
+                    logger.info(f"{symbol}: 增量日期 {incremental_start_date} 之后没有新数据")
+                else:
+                    logger.warning(f"No price data found for {symbol}")
+                return
+            if incremental_start_date:
+                total_rows = sum(hi - lo for lo, hi in ranges)
+                logger.info(f"{symbol}: 增量计算 {incremental_start_date} 之后的数据 ({total_rows} 行)")
+            
+            range_stats = {}
+            for chunk_lo, chunk_hi, read_lo, carry, position_offset, frame in self._iter_chunk_bounds(ranges):
+                warmup_rows = chunk_lo - read_lo
+                price_data = preloaded.pop((read_lo, chunk_hi), None)
+                if price_data is None:
+                    price_data = self._read_price_rows(bin_files, dates, read_lo, chunk_hi)
+                
+                frame_stats = None
+                if frame != (read_lo, chunk_hi):
+                    # 分块计算：整段统计量按不分块时的计算范围读取一次（只读收盘价和成交量）
+                    if frame not in range_stats:
+                        stat_files = {k: v for k, v in bin_files.items() if k in ('close', 'volume')}
+                        range_stats[frame] = self._frame_stats(self._read_price_rows(stat_files, dates, *frame))
+                    frame_stats = range_stats[frame]
+                
+                # 使用并行计算或顺序计算
+                if self.enable_parallel:
+                    result = self._calculate_indicators_parallel(symbol, price_data, frame_stats)
+                else:
+                    result = self._calculate_indicators_sequential(symbol, price_data, frame_stats)
+                if result is None:
+                    raise RuntimeError(f"数据块 {chunk_lo}-{chunk_hi} 指标计算失败")
+                
+                if len(result) != len(price_data):
+                    # 结果行数与输入不一致时按日期确定预热行数
+                    warmup_rows = int((pd.to_datetime(result['Date']) < price_data.index[warmup_rows]).sum())
+                
+                self._carry_chunk_columns(result, carry, warmup_rows, position_offset)
+                if warmup_rows:
+                    result = result.iloc[warmup_rows:].reset_index(drop=True)
+                logger.debug(f"{symbol}: 数据块 {chunk_lo}-{chunk_hi} 计算完成 ({len(result)} 行)")
+                yield result
                 
         except Exception as e:
             logger.error(f"❌ {symbol}: 计算指标失败 - {e}")
+            raise
+    
+    def _plan_symbol_rows(self, symbol: str, incremental_start_date: Optional[str] = None):
+        """
+        返回 (bin_files, dates, ranges)：价格 bin 文件、每行日期，以及时间窗口（及增量开始日期）
+        与股票池成分期间对应的行范围；没有数据文件时返回 None
+        """
+        layout = self._get_price_layout(symbol)
+        if layout is None:
             return None
+        bin_files, dates = layout
+        return bin_files, dates, self._symbol_row_ranges(symbol, dates, incremental_start_date)
+    
+    def prefetch_symbol_inputs(self, symbol: str, incremental_start_date: Optional[str] = None) -> Optional[Dict]:
+        """
+        读取一只股票的计算输入（供 SymbolPrefetcher 在 I/O 线程中调用）
+        
+        分块计算时只预读第一个数据块，控制缓冲区内存；日线（不分块）时读取全部数据
+        
+        Returns:
+        --------
+        Optional[Dict]: {"bin_files", "dates", "ranges", "chunks": {(read_lo, chunk_hi): 价格数据}, "bytes"}
+        """
+        plan = self._plan_symbol_rows(symbol, incremental_start_date)
+        if plan is None:
+            return None
+        bin_files, dates, ranges = plan
+        
+        chunks = {}
+        rows = 0
+        for chunk_lo, chunk_hi, read_lo, _, _, _ in self._iter_chunk_bounds(ranges):
+            if self.chunk_rows and rows >= self.chunk_rows:
+                break
+            chunks[(read_lo, chunk_hi)] = self._read_price_rows(bin_files, dates, read_lo, chunk_hi)
+            rows += chunk_hi - read_lo
+        
+        # 财务数据同时读入 LRU 缓存
+        if self.financial_loader is not None:
+            self.financial_loader.warm(symbol, ['info', 'balance_sheet'])
+        
+        return {
+            "bin_files": bin_files,
+            "dates": dates,
+            "ranges": ranges,
+            "chunks": chunks,
+            "bytes": rows * len(bin_files) * 4,
+        }
+    
+    def _make_prefetcher(self, items, load_fn=None) -> Optional[SymbolPrefetcher]:
+        """创建预读器；prefetch_depth 为 0 时返回 None（在计算线程中同步读取）"""
+        if not self.prefetch_depth:
+            return None
+        return SymbolPrefetcher(items, load_fn or self.prefetch_symbol_inputs,
+                                depth=self.prefetch_depth, io_threads=self.io_threads)
+    
+    def _iter_prefetched(self, prefetcher: Optional[SymbolPrefetcher], items) -> Iterator[Tuple]:
+        """按顺序返回 (item, 预读数据)；未启用预读时预读数据为 None"""
+        if prefetcher is None:
+            return ((item, None) for item in items)
+        return iter(prefetcher)
+    
+    def _iter_chunk_bounds(self, ranges: List[Tuple[int, int]]):
+        """
+        把行范围拆分为数据块，生成 (chunk_lo, chunk_hi, read_lo, carry, position_offset, frame)
+        
+        read_lo 为包含预热数据的读取起点；同一段行范围内的数据块共享 carry（累计型指标的接续值），
+        frame 为该段不分块时的读取范围 (read_lo, hi)；不连续的两段（如股票两次调入股票池）各自独立计算
+        """
+        for lo, hi in ranges:
+            chunk_rows = self.chunk_rows or (hi - lo)
+            first_read_lo = max(0, lo - self.LOOKBACK_ROWS)
+            carry = {}
+            for chunk_lo in range(lo, hi, chunk_rows):
+                read_lo = max(0, chunk_lo - self.LOOKBACK_ROWS)
+                yield (chunk_lo, min(hi, chunk_lo + chunk_rows), read_lo, carry, read_lo - first_read_lo,
+                       (first_read_lo, hi))
+    
+    def _carry_chunk_columns(self, result: pd.DataFrame, carry: Dict[str, float], warmup_rows: int, position_offset: int):
+        """
+        分块计算时修正跨块依赖的指标（原地修改 result）
+        
+        Parameters:
+        -----------
+        result : pd.DataFrame
+            当前数据块（含预热行）的计算结果
+        carry : Dict[str, float]
+            上一块输出的累计型指标末值，处理后更新为当前块的末值
+        warmup_rows : int
+            当前块的预热行数；预热的最后一行就是上一块输出的最后一行
+        position_offset : int
+            当前块读取起点相对第一块读取起点的偏移
+        """
+        for col in self.CUMULATIVE_COLUMNS:
+            if col not in result.columns:
+                continue
+            if col in carry and warmup_rows > 0:
+                anchor = result[col].iloc[warmup_rows - 1]
+                if pd.notna(anchor) and pd.notna(carry[col]):
+                    result[col] = result[col] + (carry[col] - anchor)
+            carry[col] = result[col].iloc[-1]
+        if position_offset:
+            for col in self.POSITION_COLUMNS:
+                if col in result.columns:
+                    result[col] = result[col] + position_offset
     
-    def _calculate_indicators_parallel(self, symbol: str, price_data: pd.DataFrame) -> Optional[pd.DataFrame]:
+    def _calculate_indicators_parallel(self, symbol: str, price_data: pd.DataFrame,
+                                       frame_stats: Optional[Dict[str, float]] = None) -> Optional[pd.DataFrame]:
         """
-        并行计算单只股票的所有指标类型
+        并行计算单只股票的所有指标类型（frame_stats 见 _calculate_indicators_sequential）
         """
         if not self.enable_parallel:
-            return self._calculate_indicators_sequential(symbol, price_data)
+            return self._calculate_indicators_sequential(symbol, price_data, frame_stats)
         
         try:
             logger.info(f"开始并行计算 {symbol} 的所有指标...")
@@ -2082,12 +2456,8 @@ class QlibIndicatorsEnhancedCalculator:
             
             # 定义各类指标计算任务
             indicator_tasks = [
-                ('Alpha158', partial(self.calculate_alpha158_indicators, price_data)),
-                ('Alpha360', partial(self.calculate_alpha360_indicators, price_data)),
-                ('Technical', partial(self.calculate_all_technical_indicators, price_data)),
-                ('Candlestick', partial(self.calculate_candlestick_patterns, price_data)),
-                ('Financial', partial(self.calculate_financial_indicators, price_data, symbol)),
-                ('Volatility', partial(self.calculate_volatility_indicators, price_data))
+                (family, partial(self._calculate_family, family, symbol, price_data, frame_stats))
+                for family in self.INDICATOR_FAMILIES
             ]
             
             # 使用线程池并行计算
@@ -2212,18 +2582,21 @@ class QlibIndicatorsEnhancedCalculator:
             except Exception as e:
                 logger.error(f"❌ {symbol}: 合并指标时发生错误 - {e}")
                 # 降级到顺序计算方法
-                return self._calculate_indicators_sequential(symbol, price_data)
+                return self._calculate_indicators_sequential(symbol, price_data, frame_stats)
             else:
                 logger.error(f"❌ {symbol}: 所有指标计算都失败了")
                 return None
                 
         except Exception as e:
             logger.error(f"❌ {symbol}: 并行计算失败 - {e}")
-            return self._calculate_indicators_sequential(symbol, price_data)
+            return self._calculate_indicators_sequential(symbol, price_data, frame_stats)
     
-    def _calculate_indicators_sequential(self, symbol: str, price_data: pd.DataFrame) -> Optional[pd.DataFrame]:
+    def _calculate_indicators_sequential(self, symbol: str, price_data: pd.DataFrame,
+                                         frame_stats: Optional[Dict[str, float]] = None) -> Optional[pd.DataFrame]:
         """
         顺序计算单只股票的所有指标（备用方法）
+        
+        frame_stats 为分块计算时整段数据的统计量（见 _frame_stats），为空时由 price_data 计算
         """
         try:
             logger.info(f"开始顺序计算 {symbol} 的所有指标...")
@@ -2235,22 +2608,22 @@ class QlibIndicatorsEnhancedCalculator:
             original_dates = price_data.index
             
             # 1. 计算Alpha158指标体系 (~158个)
-            alpha158_indicators = self.calculate_alpha158_indicators(price_data)
+            alpha158_indicators = self._calculate_family('Alpha158', symbol, price_data)
             
             # 2. 计算Alpha360指标体系 (~360个)
-            alpha360_indicators = self.calculate_alpha360_indicators(price_data)
+            alpha360_indicators = self._calculate_family('Alpha360', symbol, price_data)
             
             # 3. 计算技术指标 (~60个)
-            technical_indicators = self.calculate_all_technical_indicators(price_data)
+            technical_indicators = self._calculate_family('Technical', symbol, price_data)
             
             # 4. 计算蜡烛图形态 (61个)
-            candlestick_patterns = self.calculate_candlestick_patterns(price_data)
+            candlestick_patterns = self._calculate_family('Candlestick', symbol, price_data)
             
             # 5. 计算财务指标 (~15个)
-            financial_data = self.calculate_financial_indicators(price_data, symbol)
+            financial_data = self._calculate_family('Financial', symbol, price_data, frame_stats)
             
             # 6. 计算波动率指标 (~8个)
-            volatility_indicators = self.calculate_volatility_indicators(price_data)
+            volatility_indicators = self._calculate_family('Volatility', symbol, price_data)
             
             # 合并所有指标（确保索引一致性并保留日期信息）
             base_index = price_data.index
@@ -2347,33 +2720,43 @@ class QlibIndicatorsEnhancedCalculator:
         failed_stocks = []
         start_time = time.time()
         
+        completed = 0
+        
+        def collect(future, symbol):
+            # 收集结果（带进度显示）
+            nonlocal completed, success_count
+            completed += 1
+            try:
+                result = future.result(timeout=600)  # 10分钟超时
+                if result is not None:
+                    all_results.append(result)
+                    success_count += 1
+                    logger.info(f"✅ 进度 {completed}/{len(stocks)}: {symbol} 计算完成 ({len(result.columns)-1} 个指标)")
+                else:
+                    failed_stocks.append(symbol)
+                    logger.warning(f"⚠️ 进度 {completed}/{len(stocks)}: {symbol} 计算结果为空")
+                    
+            except Exception as e:
+                failed_stocks.append(symbol)
+                logger.error(f"❌ 进度 {completed}/{len(stocks)}: {symbol} 计算失败 - {e}")
+        
+        prefetcher = self._make_prefetcher(stocks)
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有股票的计算任务
-            future_to_symbol = {
-                executor.submit(self.calculate_all_indicators_for_stock, symbol): symbol 
-                for symbol in stocks
-            }
+            # 预读完成的股票依次提交计算；同时计算的股票数限制为线程数，预读数据不会无限堆积
+            future_to_symbol = {}
+            for symbol, prefetched in self._iter_prefetched(prefetcher, stocks):
+                if prefetcher is not None and len(future_to_symbol) >= self.max_workers:
+                    done, _ = wait(future_to_symbol, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, future_to_symbol.pop(future))
+                future = executor.submit(self.calculate_all_indicators_for_stock, symbol, prefetched=prefetched)
+                future_to_symbol[future] = symbol
             
-            # 收集结果（带进度显示）
-            completed = 0
             for future in as_completed(future_to_symbol):
-                symbol = future_to_symbol[future]
-                completed += 1
-                
-                try:
-                    result = future.result(timeout=600)  # 10分钟超时
-                    if result is not None:
-                        all_results.append(result)
-                        success_count += 1
-                        logger.info(f"✅ 进度 {completed}/{len(stocks)}: {symbol} 计算完成 ({len(result.columns)-1} 个指标)")
-                    else:
-                        failed_stocks.append(symbol)
-                        logger.warning(f"⚠️ 进度 {completed}/{len(stocks)}: {symbol} 计算结果为空")
-                        
-                except Exception as e:
-                    failed_stocks.append(symbol)
-                    logger.error(f"❌ 进度 {completed}/{len(stocks)}: {symbol} 计算失败 - {e}")
+                collect(future, future_to_symbol[future])
         
+        if prefetcher is not None:
+            prefetcher.log_metrics()
         elapsed_time = time.time() - start_time
         
         if failed_stocks:
@@ -2628,11 +3011,13 @@ class QlibIndicatorsEnhancedCalculator:
         success_count = 0
         start_time = time.time()
         
-        for i, symbol in enumerate(stocks, 1):
+        # 后台预读后续股票的输入数据
+        prefetcher = self._make_prefetcher(stocks)
+        for i, (symbol, prefetched) in enumerate(self._iter_prefetched(prefetcher, stocks), 1):
             stock_start_time = time.time()
             logger.info(f"📈 处理第 {i}/{len(stocks)} 只股票: {symbol}")
             
-            result = self.calculate_all_indicators_for_stock(symbol)
+            result = self.calculate_all_indicators_for_stock(symbol, prefetched=prefetched)
             if result is not None:
                 all_results.append(result)
                 success_count += 1
@@ -2643,6 +3028,8 @@ class QlibIndicatorsEnhancedCalculator:
             else:
                 logger.warning(f"⚠️ {symbol}: 计算失败")
         
+        if prefetcher is not None:
+            prefetcher.log_metrics()
         elapsed_time = time.time() - start_time
         
         if all_results:
@@ -2686,8 +3073,12 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error("❌ 没有成功计算任何股票的指标")
             return pd.DataFrame()
     
-    def save_results(self, df: pd.DataFrame, filename: str = "enhanced_quantitative_indicators.csv") -> str:
-        """保存结果到CSV文件，包含中文标签行，空值使用空字符串（兼容SAS）"""
+    def save_results(self, df: pd.DataFrame, filename: str = "enhanced_quantitative_indicators.csv",
+                     store_symbols: Optional[set] = None) -> str:
+        """
+        保存结果到CSV文件，包含中文标签行，空值使用空字符串（兼容SAS）
+        启用指标存储时同时写入股票分区，store_symbols 不为空时只写入这些股票
+        """
         if df.empty:
             logger.warning("DataFrame为空，无法保存")
             return ""
@@ -2712,10 +3103,13 @@ class QlibIndicatorsEnhancedCalculator:
             
             logger.info("📝 空值处理: 将NaN值替换为空字符串以兼容SAS")
             
-            # 使用手动方式写入CSV文件以包含中文标签行
-            with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-                import csv
-                writer = csv.writer(f)
+            # 使用手动方式写入CSV文件以包含中文标签行（同时计算校验和用于输出清单）
+            # 先写临时文件再替换，避免改写与备份快照共享的文件
+            checksum_writer = ChecksumWriter()
+            tmp_path = output_path.with_name(output_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+                checksum_writer.stream = f
+                writer = csv.writer(checksum_writer)
                 
                 # 第一行：字段名（英文列名）
                 writer.writerow(columns)
@@ -2726,6 +3120,7 @@ class QlibIndicatorsEnhancedCalculator:
                 # 第三行开始：具体数据
                 for _, row in df_clean.iterrows():
                     writer.writerow(row.values)
+            os.replace(tmp_path, output_path)
             
             logger.info(f"结果已保存到: {output_path}")
             logger.info(f"数据形状: {df_reordered.shape}")
@@ -2735,6 +3130,16 @@ class QlibIndicatorsEnhancedCalculator:
             logger.info(f"  第三行开始: 具体数据 ({len(df_reordered)} 行数据)")
             logger.info(f"  空值处理: NaN → '' (空字符串，兼容SAS)")
             
+            # 写入输出清单，供增量计算直接读取日期范围
+            manifest = OutputManifest(output_path, columns, header_rows=2)
+            manifest.shard = self.shard_info
+            manifest.add_frame(df_reordered)
+            manifest.save(checksum_writer.hexdigest())
+            
+            if self.indicator_store is not None:
+                partitions = self.indicator_store.write_frame(df_reordered, store_symbols)
+                logger.info(f"🗄️ 指标存储已更新: {partitions} 个股票分区 -> {self.indicator_store.root}")
+            
             # 计算指标数量：总列数减去Date和Symbol列
             indicator_count = len(df_reordered.columns) - (2 if 'Date' in df_reordered.columns else 1)
             logger.info(f"指标数量: {indicator_count}")
@@ -2773,6 +3178,7 @@ class QlibIndicatorsEnhancedCalculator:
             logger.info(f"📈 包含 {results_df['Symbol'].nunique()} 只股票")
             logger.info(f"⏱️ 总耗时: {total_elapsed:.2f} 秒")
             logger.info(f"💾 结果保存至: {output_path}")
+            self._log_result_cache_stats()
             logger.info("=" * 80)
             
             # 显示指标统计
@@ -2801,9 +3207,36 @@ class QlibIndicatorsEnhancedCalculator:
         logger.info(f"波动率指标: {volatility_count} 个")
         logger.info(f"总计: {alpha158_count + alpha360_count + technical_count + candlestick_count + financial_count + volatility_count} 个")
 
+    def load_indicators(self, symbols: Optional[List[str]] = None, start: str = None, end: str = None,
+                        columns: Optional[List[str]] = None, as_numpy: bool = False):
+        """
+        从指标存储中查询指标结果（无需扫描输出文件）
+        
+        Parameters:
+        -----------
+        symbols : Optional[List[str]]
+            股票列表，None 表示全部
+        start : str
+            开始日期 (YYYY-MM-DD，含)
+        end : str
+            结束日期 (YYYY-MM-DD，含)
+        columns : Optional[List[str]]
+            指标列，支持通配符（如 "ALPHA158_*"），Date 和 Symbol 总是返回
+        as_numpy : bool
+            是否返回 numpy 数据块 {"symbols", "dates", "columns", "values"}
+            
+        Returns:
+        --------
+        pd.DataFrame 或 Dict[str, np.ndarray]
+        """
+        if self.indicator_store is None:
+            raise ValueError("未配置指标存储，请指定 indicator_store_dir (--indicator-store)")
+        return self.indicator_store.load(symbols, start, end, columns, as_numpy=as_numpy)
+
     def calculate_all_indicators_streaming(self, output_file: str, max_stocks: Optional[int] = None, batch_size: int = 20):
         """
         流式计算所有股票的指标，逐行写入CSV，极大节省内存
+        分钟线等长序列按数据块计算和写入（见 iter_indicator_chunks），内存占用与数据长度无关
         """
         stocks = self.get_available_stocks()
         if max_stocks:
@@ -2817,9 +3250,13 @@ class QlibIndicatorsEnhancedCalculator:
         
         # 第一步：收集实际存在的列名（用于验证）
         actual_columns = set()
-        for i, symbol in enumerate(stocks):
+        prefetcher = self._make_prefetcher(stocks)
+        for i, (symbol, prefetched) in enumerate(self._iter_prefetched(prefetcher, stocks)):
             try:
-                result = self.calculate_all_indicators_for_stock(symbol)
+                # 各数据块的字段相同，只需计算第一块
+                chunks = self.iter_indicator_chunks(symbol, prefetched=prefetched)
+                result = next(chunks, None)
+                chunks.close()
                 if result is not None and not result.empty:
                     actual_columns.update(result.columns)
                 if i % 10 == 0:
@@ -2831,43 +3268,96 @@ class QlibIndicatorsEnhancedCalculator:
         available_columns = [col for col in standard_columns if col in actual_columns]
         logger.info(f"[流式模式] 实际可用字段: {len(available_columns)} 个")
         
-        # 第二步：写入CSV头部
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
+        # 第二步：写入CSV头部（同时计算校验和用于输出清单）
+        # 写入临时文件，全部完成后再替换输出文件
+        checksum_writer = ChecksumWriter()
+        manifest = OutputManifest(output_file, available_columns, header_rows=1)
+        manifest.shard = self.shard_info
+        tmp_output_file = f"{output_file}.tmp"
+        with open(tmp_output_file, 'w', newline='', encoding='utf-8') as f:
+            checksum_writer.stream = f
+            writer = csv.writer(checksum_writer)
             writer.writerow(available_columns)
         
         # 第三步：分批处理并逐行写入
         current_batch = []
         batch_num = 0
         total_rows = 0
-        for i, symbol in enumerate(stocks):
-            try:
-                result = self.calculate_all_indicators_for_stock(symbol)
-                if result is not None and not result.empty:
-                    current_batch.append(result)
-                if len(current_batch) >= batch_size or i == len(stocks) - 1:
-                    batch_num += 1
-                    batch_rows = 0
-                    with open(output_file, 'a', newline='', encoding='utf-8') as f:
-                        writer = csv.writer(f)
-                        for df in current_batch:
-                            for _, row in df.iterrows():
-                                row_data = [row[col] if col in row and not pd.isna(row[col]) else '' for col in available_columns]
-                                writer.writerow(row_data)
-                                batch_rows += 1
-                    total_rows += batch_rows
-                    logger.info(f"[流式模式] 第 {batch_num} 批写入完成: {batch_rows} 行")
-                    current_batch.clear()
-                    gc.collect()
-            except Exception as e:
-                logger.warning(f"写入数据时跳过 {symbol}: {e}")
+        # current_batch 中正在计算的股票的第一个数据块位置；
+        # 该股票的数据块在完成前就被写入CSV时，记录写入前的 (文件长度, 校验和状态)，失败时据此回退
+        symbol_start = 0
+        symbol_checkpoint = None
+        
+        def flush_batch():
+            nonlocal batch_num, total_rows, symbol_start, symbol_checkpoint
+            if not current_batch:
+                return
+            batch_num += 1
+            batch_rows = 0
+            with open(tmp_output_file, 'a', newline='', encoding='utf-8') as f:
+                checksum_writer.stream = f
+                writer = csv.writer(checksum_writer)
+                for index, df in enumerate(current_batch):
+                    if index == symbol_start and symbol_checkpoint is None:
+                        f.flush()
+                        symbol_checkpoint = (f.tell(), checksum_writer.checkpoint())
+                    manifest.add_frame(df)
+                    for _, row in df.iterrows():
+                        row_data = [row[col] if col in row and not pd.isna(row[col]) else '' for col in available_columns]
+                        writer.writerow(row_data)
+                        batch_rows += 1
+            total_rows += batch_rows
+            if self.indicator_store is not None:
+                # 指标存储的索引每批保存一次
+                self.indicator_store.flush()
+            logger.info(f"[流式模式] 第 {batch_num} 批写入完成: {batch_rows} 行")
+            current_batch.clear()
+            symbol_start = 0
+            gc.collect()
+        
+        prefetcher = self._make_prefetcher(stocks)
+        store_batch = self.indicator_store.batch() if self.indicator_store is not None else contextlib.nullcontext()
+        with store_batch:
+            for symbol, prefetched in self._iter_prefetched(prefetcher, stocks):
+                symbol_start = len(current_batch)
+                symbol_checkpoint = None
+                try:
+                    # 指标存储的分区随数据块一起写入，股票全部数据块完成后才替换分区
+                    store_writer = (self.indicator_store.symbol_writer(symbol)
+                                    if self.indicator_store is not None else contextlib.nullcontext())
+                    with store_writer:
+                        for result in self.iter_indicator_chunks(symbol, prefetched=prefetched):
+                            if result.empty:
+                                continue
+                            current_batch.append(result)
+                            if self.indicator_store is not None:
+                                store_writer.write(result)
+                            if len(current_batch) >= batch_size:
+                                flush_batch()
+                except Exception as e:
+                    # 丢弃该股票已产出的数据块（指标存储的分区由 store_writer 放弃写入）
+                    del current_batch[symbol_start:]
+                    if symbol_checkpoint is not None:
+                        position, checksum_state = symbol_checkpoint
+                        os.truncate(tmp_output_file, position)
+                        checksum_writer.restore(checksum_state)
+                        total_rows -= manifest.symbols.pop(str(symbol), {}).get('rows', 0)
+                    logger.warning(f"写入数据时跳过 {symbol}: {e}")
+            symbol_start = len(current_batch)
+            flush_batch()
+        if prefetcher is not None:
+            prefetcher.log_metrics()
+        os.replace(tmp_output_file, output_file)
+        manifest.save(checksum_writer.hexdigest())
         logger.info(f"[流式模式] 流式计算完成，总行数: {total_rows}")
 
     def calculate_indicators_incremental(self, output_file: str, 
                                        max_stocks: Optional[int] = None,
                                        force_update: bool = False,
                                        batch_size: int = 20,
-                                       backup_output: bool = True) -> bool:
+                                       backup_output: bool = True,
+                                       backup_keep: Optional[int] = None,
+                                       backup_max_age_days: Optional[float] = None) -> bool:
         """
         增强版增量计算指标，只计算需要更新的股票
         基于"Stock X Date X Indicator"维度进行增量判断
@@ -2884,6 +3374,10 @@ class QlibIndicatorsEnhancedCalculator:
             批次大小
         backup_output : bool
             是否备份输出文件
+        backup_keep : Optional[int]
+            最多保留最近几次运行的备份（输出文件和指标存储的快照合计为一次），None 表示不限制
+        backup_max_age_days : Optional[float]
+            备份最长保留天数，None 表示不限制
             
         Returns:
         --------
@@ -2926,19 +3420,17 @@ class QlibIndicatorsEnhancedCalculator:
             except Exception as e:
                 logger.warning(f"无法获取数据时间范围: {e}")
         
-        # 检查现有输出文件的日期范围
+        # 检查现有输出文件的日期范围（读取输出清单，清单缺失或失效时只扫描 Symbol/Date 列重建）
         output_start_date = None
         output_end_date = None
+        output_manifest = None
         if os.path.exists(output_file):
             try:
-                existing_data = pd.read_csv(output_file, low_memory=False)
-                logger.info(f"📋 现有输出文件: {len(existing_data)} 行")
-                if 'Date' in existing_data.columns:
-                    # 跳过第一行（字段名）和第二行（中文标签）
-                    date_data = existing_data['Date'].iloc[2:] if len(existing_data) > 2 else existing_data['Date']
-                    # 处理可能包含时间的日期格式
-                    output_start_date = pd.to_datetime(date_data, format='mixed').min()
-                    output_end_date = pd.to_datetime(date_data, format='mixed').max()
+                output_manifest = OutputManifest.load_or_rebuild(output_file)
+                logger.info(f"📋 现有输出文件: {output_manifest.row_count} 行")
+                if output_manifest.max_date:
+                    output_start_date = pd.Timestamp(output_manifest.min_date)
+                    output_end_date = pd.Timestamp(output_manifest.max_date)
                     logger.info(f"📅 已计算时间范围: {output_start_date} 至 {output_end_date}")
                     if data_start_date and data_end_date:
                         # 计算覆盖率
@@ -2968,15 +3460,25 @@ class QlibIndicatorsEnhancedCalculator:
             
             if should_update:
                 # 计算增量开始日期
+                # 历史数据被修改或指标代码变化时需要重新计算该股票的全部日期
                 incremental_start_date = None
-                if not force_update and output_end_date:
-                    # 如果现有数据到2025-05-30，增量计算应该从2025-05-31开始
-                    incremental_start_date = (output_end_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+                symbol_range = output_manifest.get_symbol_range(symbol) if output_manifest else None
+                full_recompute = (reason == self.DATA_MODIFIED_REASON
+                                  or reason.startswith(self.INDICATOR_CODE_CHANGED_REASON))
+                if not force_update and symbol_range and symbol_range['max_date'] and not full_recompute:
+                    # 如果该股票现有数据到2025-05-30，增量计算应该从2025-05-31开始
+                    symbol_end_date = pd.Timestamp(symbol_range['max_date'])
+                    if self.freq == 'day':
+                        incremental_start_date = (symbol_end_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+                    else:
+                        # 分钟线从最后一根K线之后开始
+                        incremental_start_date = (symbol_end_date + pd.Timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
                     logger.info(f"{symbol}: 增量计算从 {incremental_start_date} 开始")
                 
                 needs_update.append((symbol, reason, date_range, incremental_start_date))
                 update_date_ranges.append(date_range)
             else:
+                self._commit_pending_fingerprints(symbol)
                 skip_count += 1
                 logger.debug(f"跳过 {symbol}: {reason}")
         
@@ -3013,15 +3515,26 @@ class QlibIndicatorsEnhancedCalculator:
         
         # 备份现有输出文件
         backup_path = ""
-        if backup_output and os.path.exists(output_file):
-            backup_path = self._backup_output_file(output_file)
-            if backup_path:
-                self.metadata['last_output_backup'] = backup_path
+        if backup_output:
+            run_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            if os.path.exists(output_file):
+                backup_path = self._backup_output_file(output_file, run_id)
+                if backup_path:
+                    self.metadata['last_output_backup'] = backup_path
+            if self.indicator_store is not None:
+                self._backup_output_file(str(self.indicator_store.root), run_id)
+            self.prune_backups(backup_keep, backup_max_age_days)
         
         # 分批处理需要更新的股票
         success_count = 0
         failed_count = 0
         all_new_data = []
+        # 股票状态在输出写入成功后才提交，避免崩溃时把未写入输出的股票标记为最新
+        stock_statuses = []
+        
+        # 后台按计算顺序预读各股票增量范围的输入数据
+        prefetcher = self._make_prefetcher(needs_update, lambda item: self.prefetch_symbol_inputs(item[0], item[3]))
+        prefetched_inputs = self._iter_prefetched(prefetcher, needs_update)
         
         for i in range(0, len(needs_update), batch_size):
             batch = needs_update[i:i + batch_size]
@@ -3033,26 +3546,27 @@ class QlibIndicatorsEnhancedCalculator:
             batch_results = []
             
             for symbol, reason, date_range, incremental_start_date in batch:
+                _, prefetched = next(prefetched_inputs)
                 try:
                     if incremental_start_date:
                         logger.info(f"计算 {symbol} ({reason}) - 增量范围: {incremental_start_date} 至 {date_range[1]}")
                     else:
                         logger.info(f"计算 {symbol} ({reason}) - 日期范围: {date_range}")
                     
-                    result = self.calculate_all_indicators_for_stock(symbol, incremental_start_date)
+                    result = self.calculate_all_indicators_for_stock(symbol, incremental_start_date, prefetched)
                     
                     if result is not None and not result.empty:
                         batch_results.append(result)
-                        self._update_stock_status(symbol, True, len(result), date_range)
+                        stock_statuses.append((symbol, True, len(result), date_range))
                         success_count += 1
                         logger.info(f"✅ {symbol}: 完成 ({len(result)} 行)")
                     else:
-                        self._update_stock_status(symbol, False, 0, date_range)
+                        stock_statuses.append((symbol, False, 0, date_range))
                         failed_count += 1
                         logger.warning(f"⚠️ {symbol}: 计算结果为空")
                         
                 except Exception as e:
-                    self._update_stock_status(symbol, False, 0, date_range)
+                    stock_statuses.append((symbol, False, 0, date_range))
                     failed_count += 1
                     logger.error(f"❌ {symbol}: 计算失败 - {e}")
             
@@ -3062,11 +3576,11 @@ class QlibIndicatorsEnhancedCalculator:
                 all_new_data.append(batch_data)
                 logger.info(f"批次 {batch_num} 完成: {len(batch_data)} 行")
             
-            # 保存状态
-            self._save_stock_status()
-            self._save_data_hashes()
+        if prefetcher is not None:
+            prefetcher.log_metrics()
         
         # 合并所有新数据
+        output_saved = False
         if all_new_data:
             new_data = pd.concat(all_new_data, ignore_index=True, sort=False)
             logger.info(f"新数据总计: {len(new_data)} 行")
@@ -3077,8 +3591,13 @@ class QlibIndicatorsEnhancedCalculator:
             # 检查合并结果
             if final_data is not None and not final_data.empty:
                 # 保存最终结果
-                self.save_results(final_data, output_file)
-                logger.info(f"保存最终结果: {len(final_data)} 行 -> {output_file}")
+                output_saved = bool(
+                    self.save_results(final_data, output_file, store_symbols=set(new_data['Symbol'].astype(str)))
+                )
+                if output_saved:
+                    logger.info(f"保存最终结果: {len(final_data)} 行 -> {output_file}")
+                else:
+                    logger.error("❌ 保存最终结果失败，本次计算的股票将在下次运行时重新计算")
             else:
                 logger.error("❌ 合并结果为空，无法保存")
                 logger.info("🔄 保留现有文件")
@@ -3087,15 +3606,14 @@ class QlibIndicatorsEnhancedCalculator:
             # 没有新数据时，检查是否需要保留现有文件
             if os.path.exists(output_file):
                 logger.info("📋 没有新数据，保留现有输出文件")
-                # 读取现有文件的行数作为最终结果
-                try:
-                    existing_data = pd.read_csv(output_file, skiprows=2, low_memory=False)
-                    logger.info(f"📋 现有文件保留: {len(existing_data)} 行")
-                except Exception as e:
-                    logger.warning(f"📋 读取现有文件失败: {e}")
+                # 现有文件的行数取自输出清单
+                if output_manifest is not None:
+                    logger.info(f"📋 现有文件保留: {output_manifest.row_count} 行")
             else:
                 logger.warning("📋 没有新数据且输出文件不存在")
         
+        self._commit_stock_statuses(stock_statuses, output_saved)
+        
         # 更新元数据
         self.metadata.update({
             "last_update": datetime.now().isoformat(),
@@ -3113,6 +3631,7 @@ class QlibIndicatorsEnhancedCalculator:
         logger.info(f"📊 成功: {success_count}, 失败: {failed_count}, 跳过: {skip_count}")
         logger.info(f"📈 总行数: {len(all_new_data) > 0 and sum(len(df) for df in all_new_data) or 0}")
         logger.info(f"💾 结果保存至: {output_file}")
+        self._log_result_cache_stats()
         logger.info("=" * 80)
         
         return True
@@ -3123,13 +3642,15 @@ class QlibIndicatorsEnhancedCalculator:
             return {"error": "增量计算模式未启用"}
         
         total_stocks = len(self.get_available_stocks())
-        processed_stocks = len([s for s in self.stock_status.values() if s.get('success', False)])
-        failed_stocks = len([s for s in self.stock_status.values() if not s.get('success', False)])
+        status_counts = self.state_store.count_stock_status()
+        stale_before = (datetime.now() - timedelta(days=self.STALE_UPDATE_DAYS)).isoformat()
+        pending_stocks = self.state_store.get_symbols_needing_update(self.EXPECTED_INDICATORS_COUNT, stale_before)
         
         return {
             "total_stocks": total_stocks,
-            "processed_stocks": processed_stocks,
-            "failed_stocks": failed_stocks,
+            "processed_stocks": status_counts['processed'],
+            "failed_stocks": status_counts['failed'],
+            "pending_stocks": len(pending_stocks),
             "last_update": self.metadata.get('last_update'),
             "output_file": self.metadata.get('output_file')
         }
@@ -3168,19 +3689,16 @@ class QlibIndicatorsEnhancedCalculator:
         
         # 分析已处理的数据
         processed_info = {}
-        for symbol, status in self.stock_status.items():
-            if status.get('success', False):
-                date_range = self.date_ranges.get(symbol, {})
-                if date_range.get('start_date') and date_range.get('end_date'):
-                    start_dt = pd.to_datetime(date_range['start_date'])
-                    end_dt = pd.to_datetime(date_range['end_date'])
-                    days = (end_dt - start_dt).days + 1
-                    processed_info[symbol] = {
-                        'start_date': date_range['start_date'],
-                        'end_date': date_range['end_date'],
-                        'days': days,
-                        'rows': status.get('rows', 0)
-                    }
+        for symbol, info in self.state_store.list_processed_ranges().items():
+            start_dt = pd.to_datetime(info['start_date'])
+            end_dt = pd.to_datetime(info['end_date'])
+            days = (end_dt - start_dt).days + 1
+            processed_info[symbol] = {
+                'start_date': info['start_date'],
+                'end_date': info['end_date'],
+                'days': days,
+                'rows': info['rows']
+            }
         
         # 计算覆盖率
         total_processed_stocks = len(processed_info)
@@ -3205,12 +3723,10 @@ class QlibIndicatorsEnhancedCalculator:
             return
         
         try:
-            # 删除缓存文件
-            for file_path in [self.metadata_file, self.stock_status_file, 
-                            self.data_hashes_file, self.date_ranges_file]:
-                if file_path.exists():
-                    file_path.unlink()
-                    logger.info(f"删除缓存文件: {file_path}")
+            # 清空状态库，同时删除旧版JSON缓存，避免下次打开时被重新迁移
+            self.state_store.clear()
+            self.state_store.remove_legacy_json()
+            logger.info(f"清空状态库: {self.state_store.db_path}")
             
             # 清理备份文件
             if not keep_backups and self.output_backup_dir.exists():
@@ -3219,9 +3735,6 @@ class QlibIndicatorsEnhancedCalculator:
             
             # 重新初始化
             self.metadata = self._load_metadata()
-            self.stock_status = self._load_stock_status()
-            self.data_hashes = self._load_data_hashes()
-            self.date_ranges = self._load_date_ranges()
             
             logger.info("✅ 缓存清理完成")
             
@@ -3229,19 +3742,14 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"❌ 清理缓存失败: {e}")
     
     def list_backups(self) -> List[str]:
-        """列出备份文件"""
+        """列出备份（快照目录和旧版备份文件，新的在前）"""
         if not self.enable_incremental:
             return []
         
-        backups = []
-        if self.output_backup_dir.exists():
-            for backup_file in self.output_backup_dir.glob("backup_*.csv"):
-                backups.append(str(backup_file))
-        
-        return sorted(backups, reverse=True)
+        return [str(backup) for backup in self.backup_manager.list_backups()]
     
     def restore_backup(self, backup_file: str, output_file: str) -> bool:
-        """恢复备份文件"""
+        """恢复备份（快照只替换发生变化的文件）"""
         if not self.enable_incremental:
             logger.error("增量计算模式未启用")
             return False
@@ -3251,8 +3759,9 @@ class QlibIndicatorsEnhancedCalculator:
                 logger.error(f"备份文件不存在: {backup_file}")
                 return False
             
-            shutil.copy2(backup_file, output_file)
-            logger.info(f"✅ 备份恢复完成: {backup_file} -> {output_file}")
+            stats = self.backup_manager.restore(backup_file, output_file)
+            logger.info(f"✅ 备份恢复完成: {backup_file} -> {output_file} "
+                        f"(恢复 {stats['restored']}, 未变化 {stats['unchanged']}, 删除 {stats['removed']})")
             return True
             
         except Exception as e:
@@ -3663,6 +4172,9 @@ def main():
   # 指定数据目录和财务数据目录
   python qlib_indicators.py --data-dir ./data --financial-dir ./financial_data
   
+  # 把财务数据CSV合并为每种数据类型一个Arrow文件（之后的计算直接按内存映射读取）
+  python qlib_indicators.py --financial-dir ./financial_data --consolidate-financial
+  
   # 自定义输出文件名
   python qlib_indicators.py --output indicators_2025.csv
   
@@ -3694,6 +4206,35 @@ def main():
   # 结合增量计算和时间窗口
   python qlib_indicators.py --incremental --recent-days 90
 
+指标存储与查询:
+  # 计算时同时写入按股票分区的指标存储
+  python qlib_indicators.py --incremental --indicator-store indicator_store
+  
+  # 在Python中查询（内存映射读取，按日期二分切片，只读取需要的列）
+  calculator.load_indicators(["AAPL", "MSFT"], "2023-01-01", "2023-12-31", columns=["ALPHA158_*"])
+
+多机分片计算（共享文件系统）:
+  # 每台机器计算一个分片（按数据量均衡分配股票）
+  python qlib_indicators.py --num-shards 4 --shard-index 0 --output indicators.csv
+  
+  # 全部分片完成后校验并合并清单（生成 indicators.csv.shards.json，不改写数据）
+  python qlib_indicators.py --merge-shards --num-shards 4 --output indicators.csv
+
+指标结果缓存:
+  # 按指标族缓存结果；修改某个指标族（如 Alpha360）的代码后只重新计算该指标族
+  python qlib_indicators.py --incremental --result-cache
+
+股票池:
+  # 只计算 instruments/csi300.txt 中的股票，且只输出其成分股期间的数据
+  python qlib_indicators.py --instruments csi300 --output indicators_csi300.csv
+
+分钟线数据:
+  # 读取 <field>.5min.bin 和 calendars/5min.txt，分块计算并流式写入
+  python qlib_indicators.py --freq 5min --streaming --output indicators_5min.csv
+  
+  # 调整分块大小（每块的K线根数）
+  python qlib_indicators.py --freq 1min --chunk-rows 50000 --streaming
+
 增强版增量计算管理:
   # 查看增量计算摘要
   python qlib_indicators.py --incremental --summary
@@ -3707,8 +4248,11 @@ def main():
   # 列出备份文件
   python qlib_indicators.py --incremental --list-backups
   
-  # 恢复备份
-  python qlib_indicators.py --incremental --restore-backup backup_file.csv
+  # 恢复备份（快照目录或旧版备份文件）
+  python qlib_indicators.py --incremental --restore-backup indicator_cache/output_backups/snapshot_xxx
+  
+  # 备份保留策略：最多保留5个，且不超过30天
+  python qlib_indicators.py --incremental --backup-keep 5 --backup-max-age-days 30
 
 多线程性能优化:
   - 🚀 多只股票并行计算: 显著提升处理速度
@@ -3719,10 +4263,10 @@ def main():
 
 增强版增量计算特性:
   - 🔄 智能增量更新: 基于"Stock X Date X Indicator"维度判断
-  - 📊 数据哈希检测: 基于MD5哈希值检测数据变化
+  - 📊 数据指纹检测: 先比较文件大小和mtime，变长时只校验追加边界，可疑时才计算全文件哈希 (xxhash可选)
   - 📅 日期范围分析: 智能检测数据时间范围变化
   - 💾 自动备份: 计算前自动备份现有结果
-  - 🔍 状态跟踪: 详细记录每只股票的处理状态
+  - 🔍 状态跟踪: 详细记录每只股票的处理状态 (SQLite WAL状态库，自动迁移旧版JSON缓存)
   - 🛡️ 容错恢复: 支持断点续传和错误恢复
   - 📈 覆盖率分析: 实时显示数据覆盖率统计
 
@@ -3748,6 +4292,9 @@ def main():
         '--financial-dir',
         help='财务数据目录路径 (默认: ~/.qlib/financial_data)'
     )
+    parser.add_argument('--financial-cache-size', type=int, default=256, help='财务数据LRU缓存的数据份数')
+    parser.add_argument('--consolidate-financial', action='store_true',
+                        help='把财务数据CSV合并为每种数据类型一个Arrow文件 (<financial-dir>/<type>.consolidated.arrow)')
     
     parser.add_argument(
         '--max-stocks',
@@ -3780,9 +4327,20 @@ def main():
         help='最大线程数 (默认: CPU核心数+4，最大32)'
     )
     
+    parser.add_argument('--prefetch-depth', type=int, default=4, help='后台预读的股票数量 (0表示不预读)')
+    parser.add_argument('--io-threads', type=int, default=2, help='预读使用的I/O线程数')
     parser.add_argument('--streaming', action='store_true', help='是否启用流式写入模式')
     parser.add_argument('--batch-size', type=int, default=20, help='流式写入批次大小')
     
+    # 股票池参数
+    parser.add_argument('--instruments', help='股票池名称 (读取 instruments/<market>.txt，如: csi300、sp500)')
+    
+    # 数据频率参数
+    parser.add_argument('--freq', choices=QlibIndicatorsEnhancedCalculator.SUPPORTED_FREQS, default='day',
+                        help='数据频率 (读取 <field>.<freq>.bin 和 calendars/<freq>.txt)')
+    parser.add_argument('--chunk-rows', type=int,
+                        help='分块计算的K线根数 (默认: 日线不分块，分钟线20000)')
+    
     # 时间窗口参数
     parser.add_argument('--start-date', type=str, help='计算开始日期 (格式: YYYY-MM-DD，如: 2023-01-01)')
     parser.add_argument('--end-date', type=str, help='计算结束日期 (格式: YYYY-MM-DD，如: 2023-12-31)')
@@ -3793,6 +4351,10 @@ def main():
     parser.add_argument('--cache-dir', default='indicator_cache', help='增量计算缓存目录')
     parser.add_argument('--force-update', action='store_true', help='强制更新所有股票')
     parser.add_argument('--backup-output', action='store_true', default=True, help='是否备份输出文件')
+    parser.add_argument('--backup-keep', type=int, default=0, help='最多保留最近几次运行的备份 (默认0表示不限制)')
+    parser.add_argument('--backup-max-age-days', type=float, help='备份最长保留天数')
+    parser.add_argument('--result-cache', action='store_true',
+                        help='启用按指标族的结果缓存 (保存在 cache-dir/family_results，只重新计算代码或数据变化的指标族)')
     parser.add_argument('--enable-parallel', action='store_true', default=True, help='启用多线程并行计算')
     
     # 增量计算管理命令
@@ -3802,6 +4364,14 @@ def main():
     parser.add_argument('--restore-backup', help='恢复指定的备份文件')
     parser.add_argument('--analyze-coverage', action='store_true', help='分析数据覆盖率')
     
+    # 指标存储参数
+    parser.add_argument('--indicator-store', help='指标存储目录（按股票分区的Arrow文件，供 load_indicators 快速查询）')
+    
+    # 分片参数（多台机器共享文件系统时分摊全量计算）
+    parser.add_argument('--shard-index', type=int, help='本机计算的分片序号 (从0开始)')
+    parser.add_argument('--num-shards', type=int, help='分片总数')
+    parser.add_argument('--merge-shards', action='store_true', help='校验并合并各分片的输出清单（不改写数据）')
+    
     args = parser.parse_args()
     
     # 设置日志级别
@@ -3813,6 +4383,27 @@ def main():
     )
     
     try:
+        # 合并分片清单
+        if args.merge_shards:
+            if not args.num_shards:
+                logger.error("❌ --merge-shards 需要指定 --num-shards")
+                return
+            combined = merge_shards(args.output, args.num_shards, args.indicator_store)
+            logger.info(f"✅ 分片合并完成: {args.num_shards} 个分片, {len(combined['symbols'])} 只股票, "
+                        f"{combined['row_count']} 行")
+            return
+        
+        # 分片运行：输出文件和增量缓存按分片区分
+        if args.num_shards and args.num_shards > 1:
+            suffix = shard_suffix(args.shard_index or 0, args.num_shards)
+            args.output = shard_output_path(args.output, args.shard_index or 0, args.num_shards)
+            args.cache_dir = str(Path(args.cache_dir) / suffix)
+            logger.info(f"🧩 分片模式: {suffix}, 输出文件: {args.output}")
+        
+        # 分钟线的增量状态与日线分开保存
+        if args.freq != 'day':
+            args.cache_dir = str(Path(args.cache_dir) / args.freq)
+        
         # 验证时间窗口参数
         if args.recent_days and (args.start_date or args.end_date):
             logger.warning("同时指定了--recent-days和--start-date/--end-date参数，将优先使用--recent-days")
@@ -3827,9 +4418,24 @@ def main():
             recent_days=args.recent_days,
             max_workers=args.max_workers,
             cache_dir=args.cache_dir,
-            enable_incremental=args.incremental
+            enable_incremental=args.incremental,
+            indicator_store_dir=args.indicator_store,
+            shard_index=args.shard_index,
+            num_shards=args.num_shards,
+            freq=args.freq,
+            chunk_rows=args.chunk_rows,
+            instruments=args.instruments,
+            enable_result_cache=args.result_cache,
+            prefetch_depth=args.prefetch_depth,
+            io_threads=args.io_threads,
+            financial_cache_size=args.financial_cache_size
         )
         
+        if args.consolidate_financial:
+            counts = calculator.consolidate_financial_data()
+            logger.info(f"✅ 财务数据合并完成: {counts}")
+            return
+        
         # 处理增量计算管理命令
         if args.summary:
             summary = calculator.get_update_summary()
@@ -3886,7 +4492,9 @@ def main():
                 max_stocks=args.max_stocks,
                 force_update=args.force_update,
                 batch_size=args.batch_size,
-                backup_output=args.backup_output
+                backup_output=args.backup_output,
+                backup_keep=args.backup_keep or None,
+                backup_max_age_days=args.backup_max_age_days
             )
             if not success:
                 logger.error("❌ 增强版增量计算失败")
@@ -0,0 +1,113 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from batch_calculator import BatchIndicatorCalculator, BatchJournal
+
+
+class TestBatchJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.journal = BatchJournal(self.tmp_dir.joinpath("work"))
+        self.journal.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _record(self, batch_num: int, symbols):
+        batch_file = self.journal.batch_path(batch_num)
+        batch_file.write_bytes(b"batch")
+        self.journal.record(batch_num, batch_file, symbols, len(symbols))
+
+    def test_plan(self):
+        stocks = ["AAA", "BBB", "CCC"]
+        self.journal.write_plan(stocks, 2)
+        plan = self.journal.load_plan()
+        self.assertEqual(plan["universe_hash"], BatchJournal.universe_hash(stocks))
+        self.assertEqual((plan["total_stocks"], plan["batch_size"]), (3, 2))
+
+    def test_resume_with_torn_line(self):
+        self._record(1, ["AAA", "BBB"])
+        self._record(2, ["CCC"])
+        # crashed while appending the record of batch 3
+        with open(self.journal.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"batch": 3, "file": "batch_0')
+
+        completed = self.journal.completed()
+        self.assertEqual([entry["batch"] for entry in completed], [1, 2])
+        self.assertEqual(completed[0]["symbols"], ["AAA", "BBB"])
+
+        # the resumed run records batch 3 again, the torn line must not swallow it
+        self._record(3, ["DDD"])
+        self.assertEqual([entry["batch"] for entry in self.journal.completed()], [1, 2, 3])
+
+    def test_missing_batch_file(self):
+        self._record(1, ["AAA"])
+        self._record(2, ["BBB"])
+        self.journal.batch_path(2).unlink()
+        self.assertEqual([entry["batch"] for entry in self.journal.completed()], [1])
+
+
+class TestSpilledBatches(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.calculator = BatchIndicatorCalculator(data_dir=str(self.tmp_dir), max_workers=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _frame(symbols, dates, **columns) -> pd.DataFrame:
+        index = pd.MultiIndex.from_product([symbols, pd.to_datetime(dates)], names=["Symbol", "Date"])
+        df = index.to_frame(index=False)
+        for name, offset in columns.items():
+            df[name] = range(offset, offset + len(df))
+        return df
+
+    def test_merge(self):
+        # batch 2 has another schema and repeats two rows of BBB
+        batch_1 = self._frame(["BBB", "AAA"], ["2020-01-02", "2020-01-03"], RSI=0, MACD=100)
+        batch_2 = self._frame(["CCC", "BBB"], ["2020-01-03", "2020-01-06"], RSI=200, KDJ=300)
+        batch_files = [
+            self.calculator.spill_batch(batch_1, self.tmp_dir.joinpath("batch_1.arrow")),
+            self.calculator.spill_batch(batch_2, self.tmp_dir.joinpath("batch_2.arrow")),
+        ]
+        output_file = self.tmp_dir.joinpath("output.csv")
+        stats = self.calculator.merge_spilled_batches(batch_files, output_file)
+        self.assertEqual(stats, {"rows": 7, "symbols": 3, "columns": 5, "duplicates": 1})
+
+        merged = pd.read_csv(output_file, encoding="utf-8-sig", parse_dates=["Date"])
+        self.assertEqual(list(merged.columns), ["Date", "KDJ", "MACD", "RSI", "Symbol"])
+        self.assertEqual(merged["Symbol"].tolist(), ["AAA"] * 2 + ["BBB"] * 3 + ["CCC"] * 2)
+        merged = merged.set_index(["Symbol", "Date"])
+        self.assertFalse(merged.index.duplicated().any())
+        # the duplicated row is taken from the first batch, the columns it lacks stay empty
+        self.assertEqual(merged.loc[("BBB", pd.Timestamp("2020-01-03")), "RSI"], 1)
+        self.assertTrue(pd.isna(merged.loc[("BBB", pd.Timestamp("2020-01-03")), "KDJ"]))
+        self.assertEqual(merged.loc[("BBB", pd.Timestamp("2020-01-06")), "KDJ"], 303)
+        self.assertTrue(merged.loc["AAA", "KDJ"].isna().all())
+        self.assertTrue(merged.loc["CCC", "MACD"].isna().all())
+
+    def test_resume_with_smaller_universe(self):
+        stocks = ["AAA", "BBB", "CCC", "DDD"]
+        calculator = BatchIndicatorCalculator(data_dir=str(self.tmp_dir), batch_size=2, max_workers=1)
+        calculator.calculator.get_available_stocks = lambda: stocks
+        calculator.calculator.calculate_all_indicators = lambda: self._frame(
+            calculator.calculator.get_available_stocks(), ["2020-01-02"], RSI=0
+        )
+        output_file = self.tmp_dir.joinpath("output.csv")
+        self.assertTrue(calculator.run_batch_calculation(output_file=str(output_file), keep_batches=True))
+
+        # every stock is in a completed batch, the batches of CCC and DDD must not be merged any more
+        self.assertTrue(calculator.run_batch_calculation(max_stocks=3, output_file=str(output_file), resume=True))
+        merged = pd.read_csv(output_file, encoding="utf-8-sig")
+        self.assertEqual(merged["Symbol"].tolist(), ["AAA", "BBB", "CCC"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+import check_dump_bin
+from check_dump_bin import CheckBin
+from dump_bin import DumpDataAll
+
+
+class TestCheckBin(unittest.TestCase):
+    FIELDS = "open,close,volume".split(",")
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.source_dir = self.tmp_dir.joinpath("source")
+        self.source_dir.mkdir()
+        self.qlib_dir = self.tmp_dir.joinpath("qlib")
+        self.dates = pd.bdate_range("2020-01-01", periods=20)
+        rng = np.random.default_rng(0)
+        for symbol, symbol_dates in (("sh600000", self.dates), ("sz000001", self.dates[5:])):
+            df = pd.DataFrame({"symbol": symbol.upper(), "date": symbol_dates})
+            for field in self.FIELDS:
+                df[field] = rng.random(len(df))
+            df.to_csv(self.source_dir.joinpath(f"{symbol}.csv"), index=False)
+        DumpDataAll(csv_path=self.source_dir, qlib_dir=self.qlib_dir, include_fields=self.FIELDS, max_workers=1).dump()
+
+        self.checker = CheckBin(self.qlib_dir, self.source_dir, check_fields=self.FIELDS, max_workers=1)
+        check_dump_bin._init_worker_calendar(self.checker._read_calendar())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _bin_path(self, symbol: str, field: str) -> Path:
+        return self.qlib_dir.joinpath("features", symbol, f"{field}.day.bin")
+
+    def _compare(self, symbol: str):
+        return self.checker._compare(self.source_dir.joinpath(f"{symbol}.csv"))
+
+    def _check_warnings(self) -> list:
+        messages = []
+        handler = logger.add(lambda message: messages.append(message.record["message"]), level="WARNING")
+        try:
+            self.checker.check()
+        finally:
+            logger.remove(handler)
+        return messages
+
+    def test_clean_dump(self):
+        for symbol in ("sh600000", "sz000001"):
+            self.assertEqual(self._compare(symbol), (CheckBin.COMPARE_TRUE, {}))
+        self.assertEqual(self._check_warnings(), [])
+
+    def test_corrupted_value(self):
+        bin_path = self._bin_path("sz000001", "close")
+        data = np.fromfile(bin_path, dtype="<f")
+        # the first value is the start index of the bin
+        data[[4, 9]] += 1
+        data.tofile(bin_path)
+
+        result, mismatches = self._compare("sz000001")
+        self.assertEqual(result, CheckBin.COMPARE_FALSE)
+        self.assertEqual(mismatches, {"close": (2, str(self.dates[8]), 0)})
+        self.assertEqual(self._compare("sh600000"), (CheckBin.COMPARE_TRUE, {}))
+
+        messages = self._check_warnings()
+        self.assertIn("compare False: ['sz000001']", messages)
+        self.assertIn(
+            f"close: 2 mismatches (0 missing in bin) in 1 symbols, first at {self.dates[8]} (sz000001)", messages
+        )
+
+    def test_truncated_bin(self):
+        bin_path = self._bin_path("sh600000", "volume")
+        with bin_path.open("r+b") as fp:
+            fp.truncate(bin_path.stat().st_size - 3 * 4)
+
+        result, mismatches = self._compare("sh600000")
+        self.assertEqual(result, CheckBin.COMPARE_FALSE)
+        self.assertEqual(mismatches, {"volume": (3, str(self.dates[-3]), 3)})
+
+        messages = self._check_warnings()
+        self.assertIn(
+            f"volume: 3 mismatches (3 missing in bin) in 1 symbols, first at {self.dates[-3]} (sh600000)", messages
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
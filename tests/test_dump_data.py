@@ -14,7 +14,7 @@ from qlib.data import D
 
 sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
 from get_data import GetData
-from dump_bin import DumpDataAll, DumpDataFix
+from dump_bin import DumpDataAll, DumpDataFix, DumpManifest
 
 
 DATA_DIR = Path(__file__).parent.joinpath("test_dump_data")
@@ -36,7 +36,9 @@ class TestDumpData(unittest.TestCase):
     @classmethod
     def setUpClass(cls) -> None:
         GetData().download_data(file_name="csv_data_cn.zip", target_dir=SOURCE_DIR)
-        TestDumpData.DUMP_DATA = DumpDataAll(csv_path=SOURCE_DIR, qlib_dir=QLIB_DIR, include_fields=cls.FIELDS)
+        TestDumpData.DUMP_DATA = DumpDataAll(
+            csv_path=SOURCE_DIR, qlib_dir=QLIB_DIR, include_fields=cls.FIELDS, manifest=True
+        )
         TestDumpData.STOCK_NAMES = list(map(lambda x: x.name[:-4].upper(), SOURCE_DIR.glob("*.csv")))
         provider_uri = str(QLIB_DIR.resolve())
         qlib.init(
@@ -85,6 +87,44 @@ class TestDumpData(unittest.TestCase):
         self.assertEqual(len(df), len(TestDumpData.SIMPLE_DATA), "dump features simple failed")
         self.assertTrue(np.isclose(df.dropna(), self.SIMPLE_DATA.dropna()).all(), "dump features simple failed")
 
+    def test_5_dump_parquet(self):
+        parquet_dir = DATA_DIR.joinpath("source_parquet")
+        parquet_dir.mkdir(exist_ok=True, parents=True)
+        for csv_path in SOURCE_DIR.glob("*.csv"):
+            pd.read_csv(csv_path).to_parquet(parquet_dir.joinpath(f"{csv_path.stem}.parquet"), index=False)
+        qlib_dir = DATA_DIR.joinpath("qlib_parquet")
+        DumpDataAll(csv_path=parquet_dir, qlib_dir=qlib_dir, file_suffix=".parquet", include_fields=self.FIELDS).dump()
+
+        for stock in self.STOCK_NAMES:
+            for field in self.FIELDS:
+                bin_name = Path(stock.lower(), f"{field}.day.bin")
+                parquet_bin = qlib_dir.joinpath("features", bin_name)
+                csv_bin = QLIB_DIR.joinpath("features", bin_name)
+                self.assertEqual(parquet_bin.exists(), csv_bin.exists(), "dump parquet failed")
+                if csv_bin.exists():
+                    self.assertEqual(parquet_bin.read_bytes(), csv_bin.read_bytes(), "dump parquet failed")
+
+    def test_6_dump_manifest(self):
+        manifest = DumpManifest.load(QLIB_DIR)
+        result = manifest.verify(QLIB_DIR.joinpath("features"), QLIB_DIR.joinpath("calendars", "day.txt"))
+        self.assertFalse(any(result.values()), "dump manifest failed")
+
+        bins = {_p: _p.stat().st_mtime_ns for _p in QLIB_DIR.joinpath("features").rglob("*.bin")}
+        DumpDataAll(csv_path=SOURCE_DIR, qlib_dir=QLIB_DIR, include_fields=self.FIELDS, skip_unchanged=True).dump()
+        self.assertDictEqual(
+            bins,
+            {_p: _p.stat().st_mtime_ns for _p in QLIB_DIR.joinpath("features").rglob("*.bin")},
+            "skip unchanged failed",
+        )
+
+    def test_7_dump_chunks(self):
+        qlib_dir = DATA_DIR.joinpath("qlib_chunks")
+        DumpDataAll(csv_path=SOURCE_DIR, qlib_dir=qlib_dir, include_fields=self.FIELDS, chunk_size=100).dump()
+
+        for bin_path in QLIB_DIR.joinpath("features").rglob("*.bin"):
+            chunk_bin = qlib_dir.joinpath("features", bin_path.relative_to(QLIB_DIR.joinpath("features")))
+            self.assertEqual(chunk_bin.read_bytes(), bin_path.read_bytes(), "dump chunks failed")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from dump_bin import DumpDataAll, DumpDataUpdate, DumpJournal
+
+
+class TestDumpUpdate(unittest.TestCase):
+    FIELDS = "open,close,volume".split(",")
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        dates = pd.bdate_range("2020-01-01", periods=30)
+        cls.split_date = dates[19]
+        rng = np.random.default_rng(0)
+        frames = {
+            # trades every day
+            "sh600000": dates,
+            # suspended on the first two new calendar days, after the partial dump
+            "sh600001": dates.delete([20, 21]),
+            # suspended across the end of the partial dump
+            "sz000001": dates.delete([18, 19, 20]),
+        }
+        old_dir = cls.tmp_dir.joinpath("source_old")
+        new_dir = cls.tmp_dir.joinpath("source_new")
+        old_dir.mkdir()
+        new_dir.mkdir()
+        for symbol, symbol_dates in frames.items():
+            df = pd.DataFrame({"symbol": symbol.upper(), "date": symbol_dates})
+            for field in cls.FIELDS:
+                df[field] = rng.random(len(df))
+            df.to_csv(new_dir.joinpath(f"{symbol}.csv"), index=False)
+            df[df["date"] <= cls.split_date].to_csv(old_dir.joinpath(f"{symbol}.csv"), index=False)
+        cls.old_dir = old_dir
+        cls.new_dir = new_dir
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def _dump_all(self, csv_path: Path, qlib_dir: Path):
+        DumpDataAll(csv_path=csv_path, qlib_dir=qlib_dir, include_fields=self.FIELDS, max_workers=2).dump()
+
+    @staticmethod
+    def _snapshot(qlib_dir: Path) -> dict:
+        return {
+            str(p.relative_to(qlib_dir)): p.read_bytes()
+            for p in qlib_dir.rglob("*")
+            if p.is_file() and DumpJournal.JOURNAL_DIR_NAME not in p.parts
+        }
+
+    def test_update_after_partial_dump(self):
+        full_dir = self.tmp_dir.joinpath("qlib_full")
+        update_dir = self.tmp_dir.joinpath("qlib_update")
+        self._dump_all(self.new_dir, full_dir)
+        self._dump_all(self.old_dir, update_dir)
+        DumpDataUpdate(csv_path=self.new_dir, qlib_dir=update_dir, include_fields=self.FIELDS, max_workers=2).dump()
+
+        self.assertEqual(
+            full_dir.joinpath("calendars", "day.txt").read_text(),
+            update_dir.joinpath("calendars", "day.txt").read_text(),
+        )
+        full_bins = sorted(p.relative_to(full_dir) for p in full_dir.joinpath("features").rglob("*.bin"))
+        update_bins = sorted(p.relative_to(update_dir) for p in update_dir.joinpath("features").rglob("*.bin"))
+        self.assertEqual(full_bins, update_bins)
+        for bin_path in full_bins:
+            self.assertEqual(
+                full_dir.joinpath(bin_path).read_bytes(),
+                update_dir.joinpath(bin_path).read_bytes(),
+                f"{bin_path} differs between dump_update and dump_all",
+            )
+
+    def test_failed_worker_rolls_back(self):
+        source_dir = self.tmp_dir.joinpath("source_bad")
+        shutil.copytree(self.new_dir, source_dir)
+        # a new stock, its bins must be removed again
+        df = pd.read_csv(source_dir.joinpath("sh600000.csv"))
+        df.assign(symbol="SH600002").to_csv(source_dir.joinpath("sh600002.csv"), index=False)
+        # open and close are appended before the bad volume value fails the worker
+        df = pd.read_csv(source_dir.joinpath("sz000001.csv"))
+        df["volume"] = df["volume"].astype(object)
+        df.loc[df.index[-1], "volume"] = "bad"
+        df.to_csv(source_dir.joinpath("sz000001.csv"), index=False)
+
+        qlib_dir = self.tmp_dir.joinpath("qlib_rollback")
+        self._dump_all(self.old_dir, qlib_dir)
+        before = self._snapshot(qlib_dir)
+        with self.assertRaises(RuntimeError):
+            DumpDataUpdate(csv_path=source_dir, qlib_dir=qlib_dir, include_fields=self.FIELDS, max_workers=2).dump()
+
+        self.assertEqual(self._snapshot(qlib_dir), before)
+        self.assertFalse(qlib_dir.joinpath("features", "sh600002").exists())
+        self.assertFalse(DumpJournal(qlib_dir).exists())
+
+    def test_recover_stale_journal(self):
+        qlib_dir = self.tmp_dir.joinpath("qlib_recover")
+        self._dump_all(self.old_dir, qlib_dir)
+        before = self._snapshot(qlib_dir)
+
+        # an update that died after appending to a bin, creating a bin and rewriting the calendar
+        calendar_path = qlib_dir.joinpath("calendars", "day.txt")
+        appended = qlib_dir.joinpath("features", "sh600000", "close.day.bin")
+        created = qlib_dir.joinpath("features", "sh600002", "close.day.bin")
+        journal = DumpJournal(qlib_dir)
+        journal.begin([calendar_path, qlib_dir.joinpath("instruments", "all.txt")])
+        journal.record([appended, created])
+        with appended.open("ab") as fp:
+            np.ones(5, dtype="<f").tofile(fp)
+        created.parent.mkdir()
+        created.write_bytes(np.zeros(3, dtype="<f").tobytes())
+        calendar_path.write_text("2099-01-01\n")
+
+        # constructing the next dumper rolls the interrupted update back
+        DumpDataUpdate(csv_path=self.new_dir, qlib_dir=qlib_dir, include_fields=self.FIELDS, max_workers=2)
+        self.assertFalse(journal.exists())
+        self.assertFalse(created.parent.exists())
+        self.assertEqual(self._snapshot(qlib_dir), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
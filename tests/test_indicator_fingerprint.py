@@ -0,0 +1,108 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_fingerprint import BinFingerprinter
+from indicator_state_store import IndicatorStateStore
+
+
+class TestBinFingerprinter(unittest.TestCase):
+    # larger than the head and tail blocks, so that a header rewrite is not covered by the tail check
+    VALUES = 5000
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.store = IndicatorStateStore(self.tmp_dir.joinpath("cache"))
+        self.fingerprinter = BinFingerprinter(self.store)
+        self.bin_path = self.tmp_dir.joinpath("close.day.bin")
+        self._write(np.hstack([[10], np.arange(self.VALUES)]))
+        self.files = {"close": self.bin_path}
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, data, mode="wb"):
+        with self.bin_path.open(mode) as fp:
+            np.asarray(data).astype("<f").tofile(fp)
+        self._touch()
+
+    def _touch(self):
+        # a distinct mtime for every change, independent of the file system time resolution
+        stat = self.bin_path.stat()
+        mtime_ns = stat.st_mtime_ns + 10**9
+        os.utime(self.bin_path, ns=(mtime_ns, mtime_ns))
+
+    def test_new_then_unchanged(self):
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.NEW)
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.UNCHANGED)
+
+    def test_inspect_does_not_persist(self):
+        result, updates = self.fingerprinter.inspect("AAA", self.files)
+        self.assertEqual(result, BinFingerprinter.NEW)
+        self.assertIn("close", updates)
+        self.assertEqual(self.store.get_fingerprints("AAA"), {})
+
+    def test_touched_without_change(self):
+        self.fingerprinter.check("AAA", self.files)
+        self._touch()
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.UNCHANGED)
+
+    def test_appended(self):
+        self.fingerprinter.check("AAA", self.files)
+        self._write([1.0, 2.0, 3.0], mode="ab")
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.APPENDED)
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.UNCHANGED)
+
+    def test_modified_in_place(self):
+        self.fingerprinter.check("AAA", self.files)
+        data = np.fromfile(self.bin_path, dtype="<f")
+        data[100] += 1
+        self._write(data)
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.MODIFIED)
+
+    def test_modified_after_append(self):
+        # an appended file has no full hash, a later in-place rewrite can only be reported as modified
+        self.fingerprinter.check("AAA", self.files)
+        self._write([1.0], mode="ab")
+        self.fingerprinter.check("AAA", self.files)
+        self._touch()
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.MODIFIED)
+
+    def test_truncated(self):
+        self.fingerprinter.check("AAA", self.files)
+        data = np.fromfile(self.bin_path, dtype="<f")
+        self._write(data[:-10])
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.MODIFIED)
+
+    def test_header_rewrite_with_append(self):
+        # the start index in the header moves while the tail stays the same: not an append
+        self.fingerprinter.check("AAA", self.files)
+        data = np.fromfile(self.bin_path, dtype="<f")
+        data[0] = 5
+        self._write(np.hstack([data, [1.0, 2.0]]))
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.MODIFIED)
+
+    def test_new_file_of_known_symbol(self):
+        # a field dumped after the first run has its whole history to compute
+        self.fingerprinter.check("AAA", self.files)
+        vwap_path = self.tmp_dir.joinpath("vwap.day.bin")
+        vwap_path.write_bytes(self.bin_path.read_bytes())
+        files = dict(self.files, vwap=vwap_path)
+        self.assertEqual(self.fingerprinter.check("AAA", files), BinFingerprinter.MODIFIED)
+        self.assertEqual(self.fingerprinter.check("AAA", files), BinFingerprinter.UNCHANGED)
+
+    def test_missing_file(self):
+        self.fingerprinter.check("AAA", self.files)
+        self.bin_path.unlink()
+        self.assertEqual(self.fingerprinter.check("AAA", self.files), BinFingerprinter.MODIFIED)
+
+
+if __name__ == "__main__":
+    unittest.main()
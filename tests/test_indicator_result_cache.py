@@ -0,0 +1,59 @@
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_result_cache import FamilyResultCache
+
+
+class TestFamilyResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.cache = FamilyResultCache(self.tmp_dir, max_slots=2)
+        self.df = pd.DataFrame({"RSI_14": [1.0, 2.0]}, index=pd.bdate_range("2020-01-01", periods=2))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _age(self, slot: str, seconds: int):
+        # results written by an earlier run
+        for path in self.tmp_dir.joinpath("rsi", "AAA").glob(f"{slot}.*"):
+            mtime_ns = time.time_ns() - seconds * 10**9
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def _slots(self):
+        return sorted(path.name.split(".")[0] for path in self.tmp_dir.joinpath("rsi", "AAA").glob("*.feather"))
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get("AAA", "rsi", "s1", "k1"))
+        self.cache.put("AAA", "rsi", "s1", "k1", self.df)
+        pd.testing.assert_frame_equal(self.cache.get("AAA", "rsi", "s1", "k1"), self.df, check_freq=False)
+        # a new result of the same slot replaces the old one
+        self.cache.put("AAA", "rsi", "s1", "k2", self.df)
+        self.assertIsNone(self.cache.get("AAA", "rsi", "s1", "k1"))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 2})
+
+    def test_slot_eviction(self):
+        for slot in ["s1", "s2", "s3", "s4"]:
+            self.cache.put("AAA", "rsi", slot, "k", self.df)
+        for age, slot in enumerate(["s4", "s3", "s2", "s1"], start=1):
+            self._age(slot, age * 100)
+        # the oldest slot is read in this run and must survive
+        self.assertIsNotNone(self.cache.get("AAA", "rsi", "s1", "k"))
+        self.cache.put("AAA", "rsi", "s5", "k", self.df)
+        self.assertEqual(self._slots(), ["s1", "s5"])
+
+    def test_current_run_not_evicted(self):
+        for slot in ["s1", "s2", "s3", "s4"]:
+            self.cache.put("AAA", "rsi", slot, "k", self.df)
+        self.assertEqual(self._slots(), ["s1", "s2", "s3", "s4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_manifest import OutputManifest
+from indicator_sharding import assign_shards, merge_shards, shard_output_path
+from indicator_store import IndicatorStore
+from qlib_indicators import QlibIndicatorsEnhancedCalculator
+
+
+class TestAssignShards(unittest.TestCase):
+    def test_lpt(self):
+        costs = {"A": 8, "B": 7, "C": 6, "D": 5, "E": 4}
+        # the tie after D goes to the lower shard index
+        self.assertEqual(assign_shards(costs, 2), [["A", "D", "E"], ["B", "C"]])
+
+    def test_deterministic_and_balanced(self):
+        rng = random.Random(0)
+        costs = {f"S{i:03d}": rng.choice([100, 200, 300, 5000, 5000]) for i in range(200)}
+        shards = assign_shards(costs, 4)
+
+        items = list(costs.items())
+        rng.shuffle(items)
+        self.assertEqual(assign_shards(dict(items), 4), shards)
+
+        self.assertEqual(sorted(symbol for shard in shards for symbol in shard), sorted(costs))
+        loads = [sum(costs[symbol] for symbol in shard) for shard in shards]
+        # LPT: the loads differ by at most the largest single cost
+        self.assertLessEqual(max(loads) - min(loads), max(costs.values()))
+
+
+class TestMergeShards(unittest.TestCase):
+    SYMBOLS = {"s000": 300, "s001": 200, "s002": 250, "s003": 120}
+    OUTPUT_FILE = "indicators.csv"
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        start = 20
+        calendar = pd.bdate_range("2015-01-01", periods=start + max(self.SYMBOLS.values()))
+        self.tmp_dir.joinpath("calendars").mkdir()
+        self.tmp_dir.joinpath("calendars", "day.txt").write_text("\n".join(calendar.strftime("%Y-%m-%d")) + "\n")
+        rng = np.random.default_rng(2)
+        for symbol, rows in self.SYMBOLS.items():
+            close = 10 + np.cumsum(rng.normal(0, 0.1, rows))
+            fields = {
+                "open": close + rng.normal(0, 0.05, rows),
+                "close": close,
+                "high": close + 0.2,
+                "low": close - 0.2,
+                "volume": rng.integers(1000, 5000, rows).astype(float),
+            }
+            features_dir = self.tmp_dir.joinpath("features", symbol)
+            features_dir.mkdir(parents=True)
+            for field, values in fields.items():
+                np.hstack([start, values]).astype("<f").tofile(features_dir.joinpath(f"{field}.day.bin"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _run(self, output_file: str, store_dir: Path, **kwargs):
+        calculator = QlibIndicatorsEnhancedCalculator(
+            data_dir=str(self.tmp_dir), enable_parallel=False, indicator_store_dir=str(store_dir), **kwargs
+        )
+        calculator.save_results(calculator.calculate_all_indicators(), output_file)
+
+    def _read_output(self, output_file: str) -> pd.DataFrame:
+        # skip the label row
+        df = pd.read_csv(self.tmp_dir.joinpath(output_file), encoding="utf-8-sig", skiprows=[1], dtype=str)
+        return df.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+
+    def test_merge_equals_unsharded(self):
+        self._run("full.csv", self.tmp_dir.joinpath("store_full"))
+        for shard_index in range(2):
+            self._run(
+                shard_output_path(self.OUTPUT_FILE, shard_index, 2),
+                self.tmp_dir.joinpath("store"),
+                shard_index=shard_index,
+                num_shards=2,
+            )
+        combined = merge_shards(self.tmp_dir.joinpath(self.OUTPUT_FILE), 2, self.tmp_dir.joinpath("store"))
+
+        full = OutputManifest.load(self.tmp_dir.joinpath("full.csv"))
+        self.assertEqual(combined["row_count"], full.row_count)
+        self.assertEqual((combined["min_date"], combined["max_date"]), (full.min_date, full.max_date))
+        self.assertEqual(
+            {symbol: {k: v for k, v in info.items() if k != "shard"} for symbol, info in combined["symbols"].items()},
+            full.symbols,
+        )
+        # balanced by bin size: the largest stock shares its shard with the smallest one
+        self.assertEqual({info["symbol_count"] for info in combined["shards"]}, {2})
+
+        shards = pd.concat(
+            [self._read_output(shard_output_path(self.OUTPUT_FILE, shard_index, 2)) for shard_index in range(2)]
+        )
+        pd.testing.assert_frame_equal(
+            shards.sort_values(["Symbol", "Date"]).reset_index(drop=True), self._read_output("full.csv")
+        )
+
+        merged_store = IndicatorStore(self.tmp_dir.joinpath("store")).load()
+        full_store = IndicatorStore(self.tmp_dir.joinpath("store_full")).load()
+        self.assertEqual(
+            IndicatorStore(self.tmp_dir.joinpath("store")).symbols, sorted(s.upper() for s in self.SYMBOLS)
+        )
+        pd.testing.assert_frame_equal(
+            merged_store.sort_values(["Symbol", "Date"]).reset_index(drop=True),
+            full_store.sort_values(["Symbol", "Date"]).reset_index(drop=True),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
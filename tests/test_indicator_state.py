@@ -0,0 +1,80 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_state_store import IndicatorStateStore
+
+
+class TestIndicatorStateStore(unittest.TestCase):
+    FINGERPRINT = {"size": 400, "mtime_ns": 1, "full_hash": "aa", "tail_hash": "bb", "head_hash": "cc"}
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.store = IndicatorStateStore(self.tmp_dir)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _reopen(self):
+        self.store.close()
+        self.store = IndicatorStateStore(self.tmp_dir)
+
+    def test_round_trip(self):
+        self.store.set_metadata({"version": "1.0", "fields": ["close", "volume"]})
+        self.store.set_fingerprints("AAA", {"close": self.FINGERPRINT})
+        self.store.update_stock_status(
+            "AAA",
+            True,
+            100,
+            50,
+            "2024-01-02T00:00:00",
+            date_range=("2020-01-01", "2020-06-30"),
+            indicators_version="v1",
+        )
+        self._reopen()
+
+        self.assertEqual(self.store.get_metadata(), {"version": "1.0", "fields": ["close", "volume"]})
+        self.assertEqual(self.store.get_fingerprints("AAA"), {"close": self.FINGERPRINT})
+        status = self.store.get_stock_status("AAA")
+        self.assertTrue(status["success"])
+        self.assertEqual((status["rows"], status["indicators_count"]), (100, 50))
+        self.assertEqual(status["indicators_version"], "v1")
+        self.assertEqual(
+            self.store.list_processed_ranges(),
+            {"AAA": {"start_date": "2020-01-01", "end_date": "2020-06-30", "rows": 100}},
+        )
+        self.assertIsNone(self.store.get_stock_status("BBB"))
+
+    def test_fingerprints_follow_successful_status(self):
+        updated = dict(self.FINGERPRINT, size=800, mtime_ns=2)
+        self.store.update_stock_status(
+            "AAA", True, 100, 50, "2024-01-02T00:00:00", fingerprints={"close": self.FINGERPRINT}
+        )
+        self.store.update_stock_status("AAA", False, 0, 0, "2024-01-03T00:00:00", fingerprints={"close": updated})
+        self._reopen()
+
+        # the failed calculation keeps the old fingerprints, so the change is detected again next time
+        self.assertEqual(self.store.get_fingerprints("AAA"), {"close": self.FINGERPRINT})
+        self.assertFalse(self.store.get_stock_status("AAA")["success"])
+        self.assertEqual(self.store.count_stock_status(), {"processed": 0, "failed": 1})
+
+        self.store.update_stock_status("AAA", True, 200, 50, "2024-01-04T00:00:00", fingerprints={"close": updated})
+        self.assertEqual(self.store.get_fingerprints("AAA"), {"close": updated})
+
+    def test_status_rolled_back_with_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction():
+                self.store.update_stock_status(
+                    "AAA", True, 100, 50, "2024-01-02T00:00:00", fingerprints={"close": self.FINGERPRINT}
+                )
+                raise RuntimeError("interrupted")
+        self.assertIsNone(self.store.get_stock_status("AAA"))
+        self.assertEqual(self.store.get_fingerprints("AAA"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
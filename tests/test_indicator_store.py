@@ -0,0 +1,75 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_store import IndicatorStore
+
+
+class TestIndicatorStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        dates = pd.bdate_range("2020-01-01", periods=10)
+        self.df = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "Date": dates,
+                        "Symbol": symbol,
+                        "RSI_14": np.arange(10, dtype=float) + offset,
+                        "MACD": np.arange(10, dtype=float) * 2 + offset,
+                        "ALPHA158_KMID": np.arange(10, dtype=float) * 3 + offset,
+                    }
+                )
+                for symbol, offset in (("AAA", 0), ("BBB", 100))
+            ],
+            ignore_index=True,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_write_and_load(self):
+        store = IndicatorStore(self.tmp_dir)
+        self.assertEqual(store.write_frame(self.df), 2)
+
+        # a new instance reads the saved index
+        store = IndicatorStore(self.tmp_dir)
+        self.assertEqual(store.symbols, ["AAA", "BBB"])
+        info = store.get_symbol_info("BBB")
+        self.assertEqual((info["rows"], info["min_date"], info["max_date"]), (10, "2020-01-01", "2020-01-14"))
+
+        loaded = store.load()
+        pd.testing.assert_frame_equal(
+            loaded.sort_values(["Symbol", "Date"]).reset_index(drop=True)[self.df.columns],
+            self.df,
+            check_dtype=False,
+        )
+
+    def test_load_slice(self):
+        store = IndicatorStore(self.tmp_dir)
+        store.write_frame(self.df)
+        loaded = store.load(symbols=["BBB"], start="2020-01-03", end="2020-01-07", columns=["ALPHA158_*"])
+        self.assertEqual(list(loaded.columns), ["Date", "Symbol", "ALPHA158_KMID"])
+        self.assertEqual(list(pd.to_datetime(loaded["Date"])), list(pd.bdate_range("2020-01-03", "2020-01-07")))
+        self.assertEqual(loaded["ALPHA158_KMID"].tolist(), [106.0, 109.0, 112.0])
+
+        block = store.load(columns=["RSI_14"], as_numpy=True)
+        self.assertEqual(block["columns"], ["RSI_14"])
+        self.assertEqual(block["values"].shape, (20, 1))
+
+    def test_overwrite_symbol(self):
+        store = IndicatorStore(self.tmp_dir)
+        store.write_frame(self.df)
+        store.write_symbol("AAA", self.df[self.df["Symbol"] == "AAA"].head(3))
+        self.assertEqual(len(store.load(symbols=["AAA"])), 3)
+        self.assertEqual(len(IndicatorStore(self.tmp_dir).load(symbols=["BBB"])), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from data_collector.base import BaseNormalize, Normalize
+from dump_bin import DumpDataAll
+
+
+class SortNormalize(BaseNormalize):
+    """sort by date, drop duplicated dates and rows without a close price"""
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.dropna(subset=["close"]).drop_duplicates(self._date_field_name)
+        df[self._date_field_name] = pd.to_datetime(df[self._date_field_name])
+        df[self._symbol_field_name] = df[self._symbol_field_name].str.upper()
+        return df.sort_values(self._date_field_name)
+
+    def _get_calendar_list(self):
+        return []
+
+
+class TestNormalizeToBin(unittest.TestCase):
+    FIELDS = "open,close,volume".split(",")
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = Path(tempfile.mkdtemp())
+        dates = pd.bdate_range("2020-01-01", periods=30)
+        cls.split_date = dates[19]
+        rng = np.random.default_rng(0)
+        cls.old_dir = cls.tmp_dir.joinpath("source_old")
+        cls.new_dir = cls.tmp_dir.joinpath("source_new")
+        cls.old_dir.mkdir()
+        cls.new_dir.mkdir()
+        for symbol, symbol_dates in (
+            ("sh600000", dates),
+            ("sh600001", dates.delete([20, 21])),
+            ("sz000001", dates[5:]),
+        ):
+            df = pd.DataFrame({"symbol": symbol, "date": symbol_dates.strftime("%Y-%m-%d")})
+            for field in cls.FIELDS:
+                df[field] = rng.random(len(df))
+            # unsorted, with a duplicated date and a row without a close price
+            df = pd.concat([df.iloc[::-1], df.iloc[[3]]], ignore_index=True)
+            df.loc[7, "close"] = np.nan
+            df.to_csv(cls.new_dir.joinpath(f"{symbol}.csv"), index=False)
+            df[pd.to_datetime(df["date"]) <= cls.split_date].to_csv(cls.old_dir.joinpath(f"{symbol}.csv"), index=False)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def _normalize(self, source_dir: Path, target_dir: Path) -> Normalize:
+        return Normalize(source_dir, target_dir, SortNormalize, max_workers=2)
+
+    def _dump_csv(self, source_dir: Path, name: str) -> Path:
+        """normalize() + DumpDataAll"""
+        normalize_dir = self.tmp_dir.joinpath(f"{name}_normalize")
+        qlib_dir = self.tmp_dir.joinpath(f"{name}_qlib")
+        self._normalize(source_dir, normalize_dir).normalize()
+        DumpDataAll(csv_path=normalize_dir, qlib_dir=qlib_dir, include_fields=self.FIELDS, max_workers=2).dump()
+        return qlib_dir
+
+    def assert_same_qlib_data(self, expected_dir: Path, qlib_dir: Path, instruments: bool = True):
+        meta_files = [Path("calendars", "day.txt")] + ([Path("instruments", "all.txt")] if instruments else [])
+        for meta_file in meta_files:
+            self.assertEqual(expected_dir.joinpath(meta_file).read_text(), qlib_dir.joinpath(meta_file).read_text())
+        expected_bins = sorted(p.relative_to(expected_dir) for p in expected_dir.joinpath("features").rglob("*.bin"))
+        bins = sorted(p.relative_to(qlib_dir) for p in qlib_dir.joinpath("features").rglob("*.bin"))
+        self.assertEqual(expected_bins, bins)
+        self.assertEqual(len(bins), 3 * len(self.FIELDS))
+        for bin_path in bins:
+            self.assertEqual(
+                expected_dir.joinpath(bin_path).read_bytes(), qlib_dir.joinpath(bin_path).read_bytes(), str(bin_path)
+            )
+
+    def test_without_csv(self):
+        expected_dir = self._dump_csv(self.new_dir, "all_csv")
+        normalize_dir = self.tmp_dir.joinpath("no_csv_normalize")
+        qlib_dir = self.tmp_dir.joinpath("no_csv_qlib")
+        self._normalize(self.new_dir, normalize_dir).normalize_to_bin(
+            qlib_dir, keep_csv=False, include_fields=self.FIELDS
+        )
+
+        self.assert_same_qlib_data(expected_dir, qlib_dir)
+        # no csv files, and the temporary feather directory is removed
+        self.assertEqual(list(normalize_dir.iterdir()), [])
+
+    def test_keep_csv(self):
+        expected_dir = self._dump_csv(self.new_dir, "keep_csv")
+        normalize_dir = self.tmp_dir.joinpath("keep_csv_bin_normalize")
+        qlib_dir = self.tmp_dir.joinpath("keep_csv_bin_qlib")
+        self._normalize(self.new_dir, normalize_dir).normalize_to_bin(qlib_dir, include_fields=self.FIELDS)
+
+        self.assert_same_qlib_data(expected_dir, qlib_dir)
+        csv_files = sorted(p.name for p in normalize_dir.iterdir())
+        self.assertEqual(csv_files, sorted(p.name for p in self.new_dir.glob("*.csv")))
+        for name in csv_files:
+            self.assertEqual(
+                self.tmp_dir.joinpath("keep_csv_normalize", name).read_text(), normalize_dir.joinpath(name).read_text()
+            )
+
+    def test_update(self):
+        expected_dir = self._dump_csv(self.new_dir, "update_csv")
+        qlib_dir = self.tmp_dir.joinpath("update_qlib")
+        self._normalize(self.old_dir, self.tmp_dir.joinpath("update_old_normalize")).normalize_to_bin(
+            qlib_dir, include_fields=self.FIELDS
+        )
+        normalize_dir = self.tmp_dir.joinpath("update_new_normalize")
+        self._normalize(self.new_dir, normalize_dir).normalize_to_bin(
+            qlib_dir, update=True, keep_csv=False, include_fields=self.FIELDS
+        )
+
+        self.assert_same_qlib_data(expected_dir, qlib_dir, instruments=False)
+        self.assertEqual(list(normalize_dir.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
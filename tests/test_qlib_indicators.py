@@ -0,0 +1,107 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from qlib_indicators import QlibIndicatorsEnhancedCalculator
+
+
+class TestQlibIndicators(unittest.TestCase):
+    # recursive indicators (EMA-style smoothing, KAMA, Hilbert transform) keep an infinite memory,
+    # a chunk only sees LOOKBACK_ROWS rows of warmup
+    RECURSIVE_PREFIXES = (
+        "EMA", "DEMA", "TEMA", "T3", "KAMA", "MAMA", "FAMA", "HT_", "MACD", "APO", "PPO", "TRIX",
+        "RSI", "STOCHRSI", "CMO", "ADX", "DX", "PLUS_D", "MINUS_D", "ATR", "NATR",
+    )  # fmt: skip
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.calculator = QlibIndicatorsEnhancedCalculator(
+            data_dir=str(self.tmp_dir), cache_dir=str(self.tmp_dir.joinpath("cache")), enable_parallel=False
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_merge_with_existing_output(self):
+        output_file = self.tmp_dir.joinpath("indicators.csv")
+        # the output file has a field-name row followed by a label row; dates are plain strings
+        output_file.write_text(
+            "Symbol,Date,RSI\n股票代码,日期,相对强弱\n"
+            "AAA,2020-01-02,10.0\nAAA,2020-01-03,11.0\nBBB,2020-01-02,20.0\n",
+            encoding="utf-8-sig",
+        )
+        # freshly computed rows carry Timestamp objects rather than strings
+        new_data = pd.DataFrame(
+            {
+                "Symbol": ["AAA", "AAA"],
+                "Date": pd.Series([pd.Timestamp("2020-01-03"), pd.Timestamp("2020-01-06")], dtype=object),
+                "RSI": [12.0, 13.0],
+            }
+        )
+
+        merged = self.calculator._merge_with_existing_output(new_data, str(output_file))
+
+        keys = (
+            merged["Symbol"].astype(str) + "_" + pd.to_datetime(merged["Date"], format="mixed").dt.strftime("%Y-%m-%d")
+        )
+        self.assertFalse(keys.duplicated().any(), "merge must not duplicate Symbol/Date rows")
+        self.assertEqual(len(merged), 4)
+        overlapped = merged[keys == "AAA_2020-01-03"]
+        self.assertEqual(overlapped["RSI"].tolist(), [12.0], "new data must replace existing rows")
+
+    def _write_bins(self, rows: int = 1200, start: int = 100):
+        calendar = pd.bdate_range("2015-01-01", periods=start + rows)
+        self.tmp_dir.joinpath("calendars").mkdir()
+        self.tmp_dir.joinpath("calendars", "day.txt").write_text("\n".join(calendar.strftime("%Y-%m-%d")) + "\n")
+        rng = np.random.default_rng(1)
+        close = 10 + np.cumsum(rng.normal(0, 0.1, rows))
+        fields = {
+            "open": close + rng.normal(0, 0.05, rows),
+            "close": close,
+            "high": close + 0.2 + rng.random(rows) * 0.1,
+            "low": close - 0.2 - rng.random(rows) * 0.1,
+            "volume": rng.integers(1000, 5000, rows).astype(float),
+        }
+        features_dir = self.tmp_dir.joinpath("features", "s000")
+        features_dir.mkdir(parents=True)
+        for field, values in fields.items():
+            np.hstack([start, values]).astype("<f").tofile(features_dir.joinpath(f"{field}.day.bin"))
+        self.tmp_dir.joinpath("instruments").mkdir()
+        self.tmp_dir.joinpath("instruments", "all.txt").write_text(
+            f"S000\t{calendar[start]:%Y-%m-%d}\t{calendar[-1]:%Y-%m-%d}\n"
+        )
+
+    def test_chunked_matches_unchunked(self):
+        self._write_bins()
+        results = {}
+        for chunk_rows in (None, 300):
+            calculator = QlibIndicatorsEnhancedCalculator(
+                data_dir=str(self.tmp_dir), enable_parallel=False, chunk_rows=chunk_rows
+            )
+            results[chunk_rows] = calculator.calculate_all_indicators_for_stock("s000")
+        full, chunked = results[None], results[300]
+
+        self.assertEqual(list(full.columns), list(chunked.columns))
+        self.assertEqual(full["Date"].astype(str).tolist(), chunked["Date"].astype(str).tolist())
+        for column in full.columns.drop(["Date", "Symbol"], errors="ignore"):
+            tolerance = 1e-5 if column.startswith(self.RECURSIVE_PREFIXES) else 1e-9
+            np.testing.assert_allclose(
+                pd.to_numeric(chunked[column], errors="coerce").astype(float),
+                pd.to_numeric(full[column], errors="coerce").astype(float),
+                rtol=tolerance,
+                atol=tolerance,
+                err_msg=f"{column} differs between chunked and unchunked runs",
+            )
+        # references before the first row are missing, not wrapped around from the end of the data
+        self.assertTrue(full["ALPHA360_CLOSE59"].iloc[:59].isna().all())
+        self.assertTrue(full["ALPHA158_ROC60"].iloc[:60].isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()